@@ -0,0 +1,5 @@
+"""
+Local benchmarks for the PDF detection service.
+
+Run from the python-service directory, e.g. `python -m benchmarks.page_parallel`.
+"""
@@ -0,0 +1,152 @@
+"""
+Synthetic form PDFs generated locally with PyMuPDF for benchmarking
+"""
+import fitz  # PyMuPDF
+
+LABELS = ["Name", "Address", "City", "Phone", "Email", "Date", "Signature", "Employer"]
+
+def underline_form_page(document: fitz.Document, page_index: int = 0) -> fitz.Page:
+    """
+    Append a Letter-size page of "Label: ________" rows
+    """
+    page = document.new_page(width=612, height=792)
+    page.insert_text((72, 60), f"Application Form - Page {page_index + 1}", fontsize=16)
+    y = 110
+    row = 0
+    while y < 740:
+        label = LABELS[row % len(LABELS)]
+        page.insert_text((72, y), f"{label}:", fontsize=11)
+        page.draw_line((150, y + 2), (540, y + 2), color=(0, 0, 0), width=1)
+        y += 36
+        row += 1
+    return page
+
+def underline_form(pages: int) -> bytes:
+    """
+    Build an underline form document with the given number of pages
+    """
+    document = fitz.open()
+    for page_index in range(pages):
+        underline_form_page(document, page_index)
+    data = document.tobytes()
+    document.close()
+    return data
+
+def checkbox_form_page(document: fitz.Document, page_index: int = 0) -> fitz.Page:
+    """
+    Append a Letter-size questionnaire page: checkbox rows, short answer lines and a signature line
+    """
+    page = document.new_page(width=612, height=792)
+    page.insert_text((72, 60), f"Questionnaire - Page {page_index + 1}", fontsize=16)
+    y = 110
+    row = 0
+    while y < 640:
+        page.insert_text((72, y), f"{row + 1}. {LABELS[row % len(LABELS)]} on file?", fontsize=11)
+        for offset, answer in enumerate(("Yes", "No")):
+            x = 330 + offset * 80
+            page.draw_rect(fitz.Rect(x, y - 9, x + 10, y + 1), color=(0, 0, 0), width=0.8)
+            page.insert_text((x + 14, y), answer, fontsize=10)
+        page.insert_text((72, y + 24), "Details:", fontsize=11)
+        page.draw_line((125, y + 26), (540, y + 26), color=(0, 0, 0), width=1)
+        y += 60
+        row += 1
+    page.insert_text((72, 720), "Signature:", fontsize=11)
+    page.draw_line((140, 722), (360, 722), color=(0, 0, 0), width=1)
+    page.insert_text((380, 720), "Date:", fontsize=11)
+    page.draw_line((415, 722), (540, 722), color=(0, 0, 0), width=1)
+    return page
+
+def mixed_form(pages: int) -> bytes:
+    """
+    Build a document alternating underline form and questionnaire pages
+    """
+    document = fitz.open()
+    for page_index in range(pages):
+        if page_index % 2:
+            checkbox_form_page(document, page_index)
+        else:
+            underline_form_page(document, page_index)
+    data = document.tobytes()
+    document.close()
+    return data
+
+def grid_table_page(document: fitz.Document, page_index: int = 0, rows: int = 18, columns: int = 4) -> fitz.Page:
+    """
+    Append a Letter-size page holding a ruled table with a header row and empty cells
+    """
+    page = document.new_page(width=612, height=792)
+    page.insert_text((72, 60), f"Schedule - Page {page_index + 1}", fontsize=16)
+    left, top, right, row_height = 72, 90, 540, 34
+    column_width = (right - left) / columns
+    for row in range(rows + 1):
+        for column in range(columns):
+            x = left + column * column_width
+            y = top + row * row_height
+            page.draw_rect(fitz.Rect(x, y, x + column_width, y + row_height), color=(0, 0, 0), width=0.8)
+            if row == 0:
+                page.insert_text((x + 6, y + 21), LABELS[column % len(LABELS)], fontsize=10)
+    return page
+
+DENSE_TEXT = (
+    "The undersigned certifies that the information provided in this application is true and "
+    "complete to the best of their knowledge, and authorizes verification of every statement "
+    "made herein, including employment history, references and any other records on file. "
+)
+
+def dense_text_page(document: fitz.Document, page_index: int = 0) -> fitz.Page:
+    """
+    Append a Letter-size page filled with small body text and no fields
+    """
+    page = document.new_page(width=612, height=792)
+    page.insert_text((72, 60), f"Terms and Conditions - Page {page_index + 1}", fontsize=16)
+    page.insert_textbox(fitz.Rect(72, 80, 540, 740), DENSE_TEXT * 22, fontsize=8)
+    return page
+
+def scanned_page(document: fitz.Document, page_index: int = 0, dpi: int = 150) -> fitz.Page:
+    """
+    Append an image-only page: an underline form page rendered to a grayscale bitmap, like a scan
+    """
+    with fitz.open() as original:
+        underline_form_page(original, page_index)
+        pixmap = original[0].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    page = document.new_page(width=612, height=792)
+    page.insert_image(page.rect, pixmap=pixmap)
+    return page
+
+def rotated_page(document: fitz.Document, page_index: int = 0) -> fitz.Page:
+    """
+    Append an underline form page stored with a /Rotate of 90 or 270 degrees
+    """
+    page = underline_form_page(document, page_index)
+    page.set_rotation(90 if page_index % 2 == 0 else 270)
+    return page
+
+def _build(page_builder, pages: int) -> bytes:
+    document = fitz.open()
+    for page_index in range(pages):
+        page_builder(document, page_index)
+    data = document.tobytes(garbage=3, deflate=True)
+    document.close()
+    return data
+
+def grid_tables(pages: int) -> bytes:
+    return _build(grid_table_page, pages)
+
+def dense_text(pages: int) -> bytes:
+    return _build(dense_text_page, pages)
+
+def scanned(pages: int) -> bytes:
+    return _build(scanned_page, pages)
+
+def rotated(pages: int) -> bytes:
+    return _build(rotated_page, pages)
+
+# Document generators by corpus name; each takes a page count and returns PDF bytes
+CORPORA = {
+    "underline": underline_form,
+    "grid": grid_tables,
+    "dense-text": dense_text,
+    "scanned": scanned,
+    "rotated": rotated,
+    "mixed": mixed_form,
+}
@@ -0,0 +1,168 @@
+"""
+Benchmark /generate-filled-pdf rendering on pages with heavy freehand annotation.
+
+Compares the original per-call drawing (one page.draw_line per pair of pen
+points, three per arrow, one insert_text per fill, each its own Shape commit)
+with drawing.PageCanvas, which writes each page as a single commit with pen
+strokes as polylines grouped by color and width. Reports render + save time,
+output size, content streams added per page, and how many pixels differ
+between the two renders (pen joins are rounded now, so a small difference is
+expected).
+
+Usage:
+    python -m benchmarks.drawing [--pages 5] [--strokes 20] [--points 500] [--repeat 3]
+"""
+import argparse
+import math
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+import coordinates
+import drawing
+from benchmarks.corpus import underline_form
+
+COLORS = ["#000000", "#1e40af", "#dc2626"]
+
+def freehand_elements(pages: int, strokes: int, points: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """
+    Signature-like pen strokes (random walks) plus a few arrows, lines and boxes per page, in detection pixels
+    """
+    rng = random.Random(seed)
+    elements: List[Dict[str, Any]] = []
+    for page in range(1, pages + 1):
+        for stroke in range(strokes):
+            x, y = rng.uniform(150, 1000), rng.uniform(150, 1400)
+            heading = rng.uniform(0, 2 * math.pi)
+            stroke_points = []
+            for _ in range(points):
+                heading += rng.uniform(-0.6, 0.6)
+                x = min(1200, max(20, x + 3 * math.cos(heading)))
+                y = min(1560, max(20, y + 3 * math.sin(heading)))
+                stroke_points.append({"x": round(x, 1), "y": round(y, 1)})
+            elements.append({
+                "type": "pen", "page": page, "x": stroke_points[0]["x"], "y": stroke_points[0]["y"],
+                "points": stroke_points, "color": COLORS[stroke % len(COLORS)], "strokeWidth": 1 + stroke % 2
+            })
+        for index in range(5):
+            elements.append({"type": "arrow", "page": page, "x": 100, "y": 200 + index * 200, "endX": 400, "endY": 260 + index * 200, "color": "#dc2626", "strokeWidth": 2})
+            elements.append({"type": "line", "page": page, "x": 600, "y": 200 + index * 200, "endX": 900, "endY": 200 + index * 200, "color": "#000000", "strokeWidth": 1})
+            elements.append({"type": "rectangle", "page": page, "x": 950, "y": 200 + index * 200, "width": 150, "height": 60, "color": "#1e40af", "strokeWidth": 2})
+    return elements
+
+def fills(pages: int) -> List[Dict[str, Any]]:
+    return [
+        {"page": page, "x": 300, "y": 224 + row * 72, "value": f"Value {row}", "fontSize": 12}
+        for page in range(1, pages + 1) for row in range(10)
+    ]
+
+def per_call(page: fitz.Page, transform: coordinates.PageTransform, page_fills: List[Dict], page_elements: List[Dict]) -> None:
+    """
+    The original drawing loop, one Shape commit per call, kept as the reference
+    """
+    for fill in page_fills:
+        x = transform.to_points(fill['x'])
+        y = transform.to_points(fill['y'])
+        page.insert_text(transform.point(x - 3, y - 2), fill['value'], fontsize=fill['fontSize'],
+                         color=drawing.FILL_COLOR, rotate=transform.rotation, fontname='helv')
+    for element in page_elements:
+        color = drawing.hex_color(element['color'])
+        width = element['strokeWidth']
+        x = transform.to_points(element['x'])
+        y = transform.to_points(element['y'])
+        if element['type'] == 'rectangle':
+            rect = transform.rect(x, y, x + transform.to_points(element['width']), y + transform.to_points(element['height']))
+            page.draw_rect(rect, color=color, width=width)
+        elif element['type'] in ('line', 'arrow'):
+            end_x = transform.to_points(element['endX'])
+            end_y = transform.to_points(element['endY'])
+            page.draw_line(transform.point(x, y), transform.point(end_x, end_y), color=color, width=width)
+            if element['type'] == 'arrow':
+                angle = math.atan2(end_y - y, end_x - x)
+                for side in (-1, 1):
+                    barb_x = end_x - 10 * math.cos(angle + side * math.pi / 6)
+                    barb_y = end_y - 10 * math.sin(angle + side * math.pi / 6)
+                    page.draw_line(transform.point(end_x, end_y), transform.point(barb_x, barb_y), color=color, width=width)
+        elif element['type'] == 'pen':
+            points = element['points']
+            for p1, p2 in zip(points, points[1:]):
+                page.draw_line(
+                    transform.point(transform.to_points(p1['x']), transform.to_points(p1['y'])),
+                    transform.point(transform.to_points(p2['x']), transform.to_points(p2['y'])),
+                    color=color,
+                    width=width
+                )
+
+def batched(page: fitz.Page, transform: coordinates.PageTransform, page_fills: List[Dict], page_elements: List[Dict]) -> None:
+    canvas = drawing.PageCanvas(page, transform)
+    for fill in page_fills:
+        canvas.add_fill(fill)
+    for element in page_elements:
+        canvas.add_element(element)
+    canvas.commit()
+
+def render(base: bytes, draw: Callable, page_fills: Dict[int, List], page_elements: Dict[int, List]) -> Tuple[float, bytes, float]:
+    """
+    Draw every page and save as the service does; returns (seconds, PDF bytes, content streams added per page)
+    """
+    with fitz.open(stream=base, filetype="pdf") as document:
+        base_streams = sum(len(page.get_contents()) for page in document)
+
+    start = time.perf_counter()
+    document = fitz.open(stream=base, filetype="pdf")
+    for page_num in range(len(document)):
+        page = document[page_num]
+        transform = coordinates.PageTransform(page)
+        coordinates.isolate_contents(page)
+        draw(page, transform, page_fills.get(page_num + 1, []), page_elements.get(page_num + 1, []))
+    data = document.tobytes()
+    seconds = time.perf_counter() - start
+    added = (sum(len(page.get_contents()) for page in document) - base_streams) / len(document)
+    document.close()
+    return seconds, data, added
+
+def differing_pixels(a: bytes, b: bytes, dpi: int = 72) -> float:
+    """
+    Fraction of pixels that differ noticeably between the first pages of two PDFs
+    """
+    with fitz.open(stream=a, filetype="pdf") as doc_a, fitz.open(stream=b, filetype="pdf") as doc_b:
+        pix_a = doc_a[0].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        pix_b = doc_b[0].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    differing = sum(1 for p, q in zip(pix_a.samples, pix_b.samples) if abs(p - q) > 64)
+    return differing / len(pix_a.samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--strokes", type=int, default=20, help="Pen strokes per page")
+    parser.add_argument("--points", type=int, default=500, help="Points per pen stroke")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    base = underline_form(args.pages)
+    page_fills: Dict[int, List] = {}
+    for fill in fills(args.pages):
+        page_fills.setdefault(fill["page"], []).append(fill)
+    page_elements: Dict[int, List] = {}
+    for element in freehand_elements(args.pages, args.strokes, args.points):
+        page_elements.setdefault(element["page"], []).append(element)
+
+    print(f"{args.pages} pages, {args.strokes} strokes x {args.points} points per page, input {len(base) / 1024:.0f} KiB")
+    print(f"{'method':>10} {'ms':>9} {'output KiB':>11} {'new streams/page':>17}")
+    outputs = {}
+    for name, draw in (("per-call", per_call), ("PageCanvas", batched)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            seconds, data, streams = render(base, draw, page_fills, page_elements)
+            best = min(best, seconds)
+        outputs[name] = (best, data)
+        print(f"{name:>10} {best * 1000:>9.1f} {len(data) / 1024:>11.0f} {streams:>17.0f}")
+
+    (old_seconds, old_data), (new_seconds, new_data) = outputs["per-call"], outputs["PageCanvas"]
+    print(f"speedup {old_seconds / new_seconds:.1f}x, output {len(new_data) / len(old_data):.0%} of per-call size, "
+          f"{differing_pixels(old_data, new_data):.3%} of page 1 pixels differ")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+End-to-end endpoint benchmark over the synthetic corpus.
+
+Starts the service with uvicorn and a local HTTP server standing in for R2,
+generates each corpus document (see benchmarks.corpus) at each page count,
+and calls every endpoint against it. For each (endpoint, corpus, pages) case
+it records:
+
+- request latency (mean, p50, p95, min, max) and throughput (requests/s, pages/s)
+  at the requested concurrency;
+- per-stage time per request, from the pdf_stage_seconds histograms on
+  /metrics (so the server must run the default thread worker pool);
+- peak RSS of the server and its page pool processes during the case
+  (Linux only; the high-water mark is reset between cases via clear_refs);
+- response size.
+
+One untimed request per case warms the download cache and page pool first.
+By default (--cache cold) the detection result cache and the rendered PDF
+cache are disabled, so that warm-up can't turn the timed requests into cache
+hits; --cache warm leaves both on and measures repeat requests for the same
+document instead. Each run uses fresh cache directories. Results are written
+as JSON; pass --compare with an earlier results file to print p50 latency
+changes against it.
+
+Usage:
+    python -m benchmarks.endpoints [--corpus underline,grid,dense-text,scanned,rotated]
+        [--pages 1,20,200] [--endpoints detect-fillable-areas,...] [--requests 3]
+        [--concurrency 1] [--cache cold|warm] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.corpus import CORPORA
+from benchmarks.startup import free_port, wait_for
+
+ENDPOINTS = [
+    "detect-fillable-areas",
+    "detect-table-cells",
+    "detect-text",
+    "annotate-pdf",
+    "generate-filled-pdf",
+]
+
+# Fields and drawing elements per page in annotate/generate payloads, in detection pixels
+FIELD_ROWS = 10
+PEN_POINTS = 50
+
+class DocumentServer:
+    """
+    Serves generated PDFs over HTTP with ETag revalidation, like R2 does
+    """
+
+    def __init__(self):
+        self.documents: Dict[str, bytes] = {}
+        documents = self.documents
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                data = documents.get(self.path)
+                if data is None:
+                    self.send_error(404)
+                    return
+                etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def publish(self, name: str, data: bytes) -> str:
+        path = f"/{name}.pdf"
+        self.documents[path] = data
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+def _process_tree(pid: int) -> List[int]:
+    pids = [pid]
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                for child in f.read().split():
+                    pids.extend(_process_tree(int(child)))
+        except OSError:
+            pass
+    return pids
+
+def reset_peak_rss(pid: int) -> None:
+    """
+    Reset VmHWM for the server and its children so the next reading covers one case
+    """
+    try:
+        for process in _process_tree(pid):
+            with open(f"/proc/{process}/clear_refs", "w") as f:
+                f.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """
+    Summed VmHWM of the server and its children, or None without /proc
+    """
+    try:
+        total_kb = 0
+        for process in _process_tree(pid):
+            with open(f"/proc/{process}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+        return total_kb / 1024
+    except OSError:
+        return None
+
+def stage_totals(client: httpx.Client, endpoint: str) -> Dict[str, List[float]]:
+    """
+    [seconds, observations] per stage from /metrics for one endpoint label
+    """
+    totals: Dict[str, List[float]] = {}
+    for family in text_string_to_metric_families(client.get("/metrics").text):
+        if family.name != "pdf_stage_seconds":
+            continue
+        for sample in family.samples:
+            if sample.labels.get("endpoint") != endpoint:
+                continue
+            entry = totals.setdefault(sample.labels["stage"], [0.0, 0.0])
+            if sample.name.endswith("_sum"):
+                entry[0] = sample.value
+            elif sample.name.endswith("_count"):
+                entry[1] = sample.value
+    return totals
+
+def synthetic_fields(pages: int) -> List[Dict[str, Any]]:
+    """
+    One column of line fields per page, where an underline form's lines are
+    """
+    return [
+        {"type": "line", "page": page, "x": 300, "y": 224 + row * 72, "width": 780, "height": 20}
+        for page in range(1, pages + 1)
+        for row in range(FIELD_ROWS)
+    ]
+
+def synthetic_drawing_elements(pages: int) -> List[Dict[str, Any]]:
+    """
+    One of each drawing element type per page, with a PEN_POINTS point pen stroke
+    """
+    elements = []
+    for page in range(1, pages + 1):
+        elements.extend([
+            {"type": "text", "page": page, "x": 150, "y": 150, "text": "Reviewed", "fontSize": 14, "color": "#1e40af"},
+            {"type": "rectangle", "page": page, "x": 140, "y": 300, "width": 400, "height": 80, "color": "#dc2626"},
+            {"type": "circle", "page": page, "x": 700, "y": 300, "width": 120, "height": 120, "color": "#16a34a"},
+            {"type": "line", "page": page, "x": 140, "y": 500, "endX": 1000, "endY": 500, "color": "#000000"},
+            {"type": "arrow", "page": page, "x": 900, "y": 700, "endX": 700, "endY": 600, "color": "#000000"},
+            {
+                "type": "pen",
+                "page": page,
+                "x": 300,
+                "y": 1400,
+                "color": "#000000",
+                "strokeWidth": 2,
+                "points": [{"x": 300 + i * 8, "y": 1400 + (i % 7) * 6} for i in range(PEN_POINTS)],
+            },
+        ])
+    return elements
+
+def payload(endpoint: str, url: str, pages: int, output: str) -> Dict[str, Any]:
+    if endpoint == "annotate-pdf":
+        return {"pdfUrl": url, "fields": synthetic_fields(pages), "output": output}
+    if endpoint == "generate-filled-pdf":
+        return {
+            "pdfUrl": url,
+            "suggestedFills": [{**field, "value": "Jane Doe"} for field in synthetic_fields(pages)],
+            "drawingElements": synthetic_drawing_elements(pages),
+            "output": output,
+        }
+    return {"pdfUrl": url}
+
+def run_case(
+    client: httpx.Client,
+    server_pid: int,
+    endpoint: str,
+    body: Dict[str, Any],
+    pages: int,
+    requests: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    path = f"/{endpoint}"
+
+    def call(_: int) -> Dict[str, Any]:
+        start = time.perf_counter()
+        response = client.post(path, json=body)
+        return {"seconds": time.perf_counter() - start, "status": response.status_code, "bytes": len(response.content)}
+
+    call(0)
+    reset_peak_rss(server_pid)
+    before = stage_totals(client, path)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        calls = list(pool.map(call, range(requests)))
+    wall = time.perf_counter() - start
+    after = stage_totals(client, path)
+
+    latencies = sorted(c["seconds"] * 1000 for c in calls)
+    stages = {}
+    for name, (seconds, count) in after.items():
+        seconds -= before.get(name, [0.0, 0.0])[0]
+        count -= before.get(name, [0.0, 0.0])[1]
+        if count:
+            stages[name] = {"msPerRequest": seconds * 1000 / requests, "observations": int(count)}
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for c in calls if c["status"] != 200),
+        "latencyMs": {
+            "mean": statistics.mean(latencies),
+            "p50": statistics.median(latencies),
+            "p95": latencies[max(0, int(round(len(latencies) * 0.95)) - 1)],
+            "min": latencies[0],
+            "max": latencies[-1],
+        },
+        "throughput": {"requestsPerSec": requests / wall, "pagesPerSec": requests * pages / wall},
+        "responseBytes": statistics.mean(c["bytes"] for c in calls),
+        "peakRssMb": peak_rss_mb(server_pid),
+        "stages": stages,
+    }
+
+def start_service(env: Dict[str, str], timeout: float) -> Tuple[subprocess.Popen, str]:
+    """
+    Launch uvicorn with env and wait for /ready; returns the process and its base URL
+    """
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    if wait_for(f"{base_url}/ready", start, start + timeout) is None:
+        process.terminate()
+        raise RuntimeError(f"Service wasn't ready within {timeout:.0f}s")
+    return process, base_url
+
+# Service settings per --cache mode; cache directories are added per run
+CACHE_MODES = {
+    "cold": {"RESULT_CACHE_ENABLED": "0", "RENDERED_PDF_CACHE_TTL": "0"},
+    "warm": {"RESULT_CACHE_ENABLED": "1", "RENDERED_PDF_CACHE_TTL": "600"},
+}
+
+def environment(service_env: Dict[str, str], cache_mode: str) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "pymupdf": fitz.VersionBind,
+        "commit": commit,
+        "serviceEnv": service_env,
+        "caches": {
+            "mode": cache_mode,
+            "resultCacheEnabled": service_env["RESULT_CACHE_ENABLED"] == "1",
+            "renderedPdfCacheTtl": float(service_env["RENDERED_PDF_CACHE_TTL"]),
+            # Downloads stay cached: the untimed warm-up request fills it in both modes
+            "downloadCache": True,
+        },
+    }
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, cache_mode: str) -> None:
+    with open(baseline_path) as f:
+        report = json.load(f)
+    baseline = {
+        (r["endpoint"], r["corpus"], r["pages"]): r
+        for r in report["results"]
+    }
+    print(file=sys.stderr)
+    baseline_mode = report.get("config", {}).get("cache")
+    if baseline_mode != cache_mode:
+        print(f"warning: baseline cache mode is {baseline_mode or 'unrecorded'}, this run is {cache_mode}", file=sys.stderr)
+    print(f"{'endpoint':>22} {'corpus':>10} {'pages':>5} {'base p50':>9} {'p50':>9} {'change':>7}", file=sys.stderr)
+    for r in results:
+        old = baseline.get((r["endpoint"], r["corpus"], r["pages"]))
+        if old is None:
+            continue
+        before, after = old["latencyMs"]["p50"], r["latencyMs"]["p50"]
+        print(f"{r['endpoint']:>22} {r['corpus']:>10} {r['pages']:>5} {before:>9.0f} {after:>9.0f} {(after / before - 1) * 100:>+6.0f}%", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default="underline,grid,dense-text,scanned,rotated", help=f"Comma-separated from: {', '.join(CORPORA)}")
+    parser.add_argument("--pages", default="1,20,200", help="Comma-separated page counts")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=3, help="Timed requests per case")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--output-format", choices=["json", "pdf"], default="json", help="`output` for annotate/generate")
+    parser.add_argument("--prewarm", default="pdf,detection,ocr", help="PREWARM for the service")
+    parser.add_argument("--cache", choices=list(CACHE_MODES), default="cold",
+                        help="cold: result and rendered PDF caches off; warm: on, so timed requests repeat cached work")
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--output", help="Write results JSON here instead of stdout")
+    parser.add_argument("--compare", help="Earlier results JSON to compare p50 latency against")
+    args = parser.parse_args()
+
+    corpora = args.corpus.split(",")
+    page_counts = [int(p) for p in args.pages.split(",")]
+    endpoints = args.endpoints.split(",")
+    # /ready only waits for engines that can't fail for lack of system packages (e.g. tesseract)
+    cache_dir = tempfile.mkdtemp(prefix="endpoint-bench-")
+    service_env = {
+        "PREWARM": args.prewarm,
+        "READY_ENGINES": "pdf,detection",
+        "WORKER_POOL_KIND": "thread",
+        **CACHE_MODES[args.cache],
+        # Fresh per run, so nothing cached by an earlier run (or the live service) is reused
+        "RESULT_CACHE_DIR": os.path.join(cache_dir, "results"),
+        "DOWNLOAD_CACHE_DIR": os.path.join(cache_dir, "downloads"),
+    }
+
+    documents = DocumentServer()
+    service, base_url = start_service(service_env, args.ready_timeout)
+    results = []
+    try:
+        with httpx.Client(base_url=base_url, timeout=None) as client:
+            for corpus in corpora:
+                for pages in page_counts:
+                    data = CORPORA[corpus](pages)
+                    url = documents.publish(f"{corpus}-{pages}", data)
+                    for endpoint in endpoints:
+                        case = run_case(
+                            client,
+                            service.pid,
+                            endpoint,
+                            payload(endpoint, url, pages, args.output_format),
+                            pages,
+                            args.requests,
+                            args.concurrency
+                        )
+                        results.append({"endpoint": endpoint, "corpus": corpus, "pages": pages, "documentBytes": len(data), **case})
+                        print(
+                            f"{endpoint:>22} {corpus:>10} {pages:>4}p  p50 {case['latencyMs']['p50']:>8.0f} ms"
+                            f"  {case['throughput']['pagesPerSec']:>7.1f} pages/s  peak {case['peakRssMb'] or 0:>7.0f} MB  errors {case['errors']}",
+                            file=sys.stderr
+                        )
+    finally:
+        service.terminate()
+        service.wait()
+        documents.close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    report = {
+        "schemaVersion": 1,
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": environment(service_env, args.cache),
+        "config": {
+            "cache": args.cache,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "outputFormat": args.output_format,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(results, args.compare, args.cache)
+
+if __name__ == "__main__":
+    main()
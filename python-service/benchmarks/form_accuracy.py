@@ -0,0 +1,136 @@
+"""
+Compare form detector inference modes on a fixed document set.
+
+Every document is run through each mode on a freshly loaded detector. The
+first mode is the reference: the others are scored by how well their widgets
+agree with it (same widget type, IoU of the normalized boxes at or above
+--iou, matched greedily by IoU), alongside their load time and per-page
+latency.
+
+The default set is a deterministic synthetic corpus of underline and
+questionnaire pages. Pass --pdf-dir to score a folder of real forms instead.
+
+Needs the full CommonForms install (torch and the model weights).
+
+Usage:
+    python -m benchmarks.form_accuracy [--modes standard,fast] [--pdf-dir DIR] [--documents 4] [--pages 4] [--iou 0.5]
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.corpus import mixed_form
+from document_io import PdfSource
+from form_detector import INFERENCE_MODES, FormDetector
+
+def load_documents(pdf_dir: str, documents: int, pages: int) -> List[Tuple[str, bytes]]:
+    if pdf_dir:
+        paths = sorted(glob.glob(os.path.join(pdf_dir, "*.pdf")))
+        if not paths:
+            raise SystemExit(f"No PDFs found in {pdf_dir}")
+        result = []
+        for path in paths:
+            with open(path, "rb") as f:
+                result.append((os.path.basename(path), f.read()))
+        return result
+    # Vary length so batches aren't always full
+    return [(f"synthetic-{index}", mixed_form(pages + index % 3)) for index in range(documents)]
+
+def iou(a: Dict[str, float], b: Dict[str, float]) -> float:
+    width = min(a["x1"], b["x1"]) - max(a["x0"], b["x0"])
+    height = min(a["y1"], b["y1"]) - max(a["y0"], b["y0"])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    area_a = (a["x1"] - a["x0"]) * (a["y1"] - a["y0"])
+    area_b = (b["x1"] - b["x0"]) * (b["y1"] - b["y0"])
+    return intersection / (area_a + area_b - intersection)
+
+def match_page(reference: List[Dict[str, Any]], candidate: List[Dict[str, Any]], threshold: float) -> List[float]:
+    """
+    Greedy one-to-one matching by IoU; returns the IoU of each matched pair
+    """
+    pairs = sorted(
+        (
+            (iou(ref["box"], cand["box"]), i, j)
+            for i, ref in enumerate(reference)
+            for j, cand in enumerate(candidate)
+            if ref["widgetType"] == cand["widgetType"]
+        ),
+        reverse=True
+    )
+    used_ref, used_cand, matched = set(), set(), []
+    for overlap, i, j in pairs:
+        if overlap < threshold:
+            break
+        if i in used_ref or j in used_cand:
+            continue
+        used_ref.add(i)
+        used_cand.add(j)
+        matched.append(overlap)
+    return matched
+
+def run_mode(mode: str, documents: List[Tuple[str, bytes]]) -> Dict[str, Any]:
+    detector = FormDetector(**INFERENCE_MODES[mode])
+    start = time.perf_counter()
+    detector.load()
+    load_seconds = time.perf_counter() - start
+
+    # One untimed document so lazy allocations don't land on the first timing
+    with PdfSource(data=documents[0][1]) as source:
+        detector.detect(source)
+
+    per_page, fields = [], []
+    for _, data in documents:
+        with PdfSource(data=data) as source:
+            start = time.perf_counter()
+            total_pages, page_fields = detector.detect(source)
+            per_page.append((time.perf_counter() - start) / max(1, total_pages))
+        fields.append(page_fields)
+    return {"load": load_seconds, "perPage": per_page, "fields": fields}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="standard,fast", help="Comma-separated modes; the first is the reference")
+    parser.add_argument("--pdf-dir", default="", help="Score every PDF in this folder instead of the synthetic set")
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    for mode in modes:
+        if mode not in INFERENCE_MODES:
+            raise SystemExit(f"Unknown mode {mode}; choose from {', '.join(INFERENCE_MODES)}")
+    documents = load_documents(args.pdf_dir, args.documents, args.pages)
+    results = {mode: run_mode(mode, documents) for mode in modes}
+
+    reference = results[modes[0]]
+    total_pages = sum(len(doc_fields) for doc_fields in reference["fields"])
+    print(f"{len(documents)} documents, {total_pages} pages, reference mode '{modes[0]}', IoU >= {args.iou}")
+    print(f"{'mode':>10} {'load s':>7} {'ms/page':>8} {'speedup':>8} {'fields':>7} {'precision':>9} {'recall':>7} {'F1':>6} {'mean IoU':>9}")
+    reference_ms = statistics.median(reference["perPage"]) * 1000
+    for mode in modes:
+        result = results[mode]
+        ref_count = cand_count = 0
+        matched: List[float] = []
+        for ref_doc, cand_doc in zip(reference["fields"], result["fields"]):
+            for ref_page, cand_page in zip(ref_doc, cand_doc):
+                ref_count += len(ref_page)
+                cand_count += len(cand_page)
+                matched.extend(match_page(ref_page, cand_page, args.iou))
+        precision = len(matched) / cand_count if cand_count else 1.0
+        recall = len(matched) / ref_count if ref_count else 1.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        ms = statistics.median(result["perPage"]) * 1000
+        mean_iou = statistics.mean(matched) if matched else 0.0
+        print(
+            f"{mode:>10} {result['load']:>7.2f} {ms:>8.0f} {reference_ms / ms:>7.2f}x {cand_count:>7}"
+            f" {precision:>9.3f} {recall:>7.3f} {f1:>6.3f} {mean_iou:>9.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
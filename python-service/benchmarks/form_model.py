@@ -0,0 +1,86 @@
+"""
+Benchmark CommonForms detection latency, cold vs warm.
+
+Cold runs pay for everything a request used to: commonforms.prepare_form()
+loads the model, renders the document and writes a form PDF on every call.
+Warm runs reuse one resident FormDetector, so a request only renders pages
+and runs batched inference. The concurrent run sends several documents at
+once to show pages from different requests sharing inference batches.
+
+Needs the full CommonForms install (torch and the model weights, which are
+downloaded from the Hugging Face hub on first use).
+
+Usage:
+    python -m benchmarks.form_model [--pages 4] [--requests 3] [--concurrency 4] [--threads N]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import underline_form
+from document_io import PdfSource
+from form_detector import FORM_TORCH_THREADS, FormDetector
+
+def time_prepare_form(data: bytes) -> float:
+    """
+    One request the old way: a fresh prepare_form() over a temp file
+    """
+    from commonforms import prepare_form
+
+    with tempfile.TemporaryDirectory() as scratch:
+        input_path = os.path.join(scratch, "input.pdf")
+        with open(input_path, "wb") as f:
+            f.write(data)
+        start = time.perf_counter()
+        prepare_form(input_path, os.path.join(scratch, "output.pdf"))
+        return time.perf_counter() - start
+
+def time_detect(detector: FormDetector, data: bytes) -> float:
+    start = time.perf_counter()
+    with PdfSource(data=data) as source:
+        detector.detect(source)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=3, help="Timed requests per mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="Simultaneous documents in the concurrent run")
+    parser.add_argument("--threads", type=int, default=FORM_TORCH_THREADS, help="torch.set_num_threads for the warm detector")
+    args = parser.parse_args()
+
+    data = underline_form(args.pages)
+    rows = []
+
+    cold = [time_prepare_form(data) for _ in range(args.requests)]
+    rows.append(("cold prepare_form", cold))
+
+    detector = FormDetector(torch_threads=args.threads)
+    start = time.perf_counter()
+    detector.load()
+    load_seconds = time.perf_counter() - start
+    time_detect(detector, data)  # first inference initializes lazily allocated buffers
+    warm = [time_detect(detector, data) for _ in range(args.requests)]
+    rows.append(("warm", warm))
+
+    before = detector.stats()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        concurrent = list(pool.map(lambda _: time_detect(detector, data), range(args.concurrency)))
+    rows.append((f"warm x{args.concurrency} concurrent", concurrent))
+    after = detector.stats()
+    batches = after["batches"] - before["batches"]
+    pages = after["pages"] - before["pages"]
+
+    print(f"{args.pages} pages per document, {args.threads} torch threads, model load {load_seconds:.2f}s")
+    print(f"{'mode':>24} {'median ms':>10} {'ms/page':>8}")
+    for name, seconds in rows:
+        median = statistics.median(seconds)
+        print(f"{name:>24} {median * 1000:>10.0f} {median * 1000 / args.pages:>8.0f}")
+    print(f"concurrent run: {pages} pages in {batches} batches (mean batch {pages / max(1, batches):.1f})")
+    print(f"warm speedup {statistics.median(cold) / statistics.median(warm):.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark label association on a dense synthetic page.
+
+Compares the original per-field scan over every text element with the
+y-sorted LabelIndex that associate_labels_with_fields now uses, and checks
+that both assign identical labels.
+
+Usage:
+    python -m benchmarks.labels [--words 5000] [--fields 1000] [--repeat 3]
+"""
+import argparse
+import copy
+import random
+import time
+from typing import Dict, List
+
+from detection import LABEL_MAX_Y_DISTANCE, associate_labels_with_fields
+
+def linear_scan(text_elements: List[Dict], fields: List[Dict]) -> List[Dict]:
+    """
+    The original O(fields x words) association, kept as the reference
+    """
+    for field in fields:
+        nearby_text = []
+        for text_elem in text_elements:
+            if (text_elem['x'] < field['x'] and
+                abs(text_elem['y'] - field['y']) < LABEL_MAX_Y_DISTANCE):
+                nearby_text.append(text_elem)
+
+        if nearby_text:
+            nearby_text.sort(key=lambda t: field['x'] - (t['x'] + t['width']))
+            field['label'] = ' '.join([t['text'] for t in nearby_text[:5]])
+        else:
+            field['label'] = ""
+
+    return fields
+
+def synthetic_page(words: int, fields: int, seed: int = 0):
+    """
+    Random words and fields on a tall 2x-pixel page, dense enough that many
+    fields have several candidate labels and some distances tie
+    """
+    rng = random.Random(seed)
+    width, height = 1224, 1584 * max(1, words // 500)
+    text_elements = [
+        {
+            "text": f"w{i}",
+            "x": rng.randrange(0, width - 100),
+            "y": rng.randrange(0, height),
+            "width": rng.choice([20, 40, 60, 80]),
+            "height": 22,
+            "confidence": 90.0
+        }
+        for i in range(words)
+    ]
+    field_list = [
+        {
+            "type": "line",
+            "x": rng.randrange(0, width - 200),
+            "y": rng.randrange(0, height),
+            "width": 200,
+            "height": 20
+        }
+        for _ in range(fields)
+    ]
+    return text_elements, field_list
+
+def best_of(fn, text_elements, fields, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        trial = copy.deepcopy(fields)
+        start = time.perf_counter()
+        result = fn(text_elements, trial)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--fields", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text_elements, fields = synthetic_page(args.words, args.fields)
+    scan_seconds, expected = best_of(linear_scan, text_elements, fields, args.repeat)
+    index_seconds, actual = best_of(associate_labels_with_fields, text_elements, fields, args.repeat)
+
+    mismatches = sum(1 for a, b in zip(expected, actual) if a['label'] != b['label'])
+    labelled = sum(1 for f in actual if f['label'])
+    print(f"{args.words} words, {args.fields} fields, {labelled} labelled")
+    print(f"{'method':>12} {'ms':>9}")
+    print(f"{'linear scan':>12} {scan_seconds * 1000:>9.1f}")
+    print(f"{'LabelIndex':>12} {index_seconds * 1000:>9.1f}")
+    print(f"speedup {scan_seconds / index_seconds:.1f}x, mismatched labels: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
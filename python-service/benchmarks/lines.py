@@ -0,0 +1,97 @@
+"""
+Benchmark overlap suppression for detected lines and check equivalence.
+
+Runs remove_overlapping_lines in each LINE_SUPPRESSION mode (the original
+pairwise scan, the y-sorted sweep, and auto, which picks one by candidate
+count) on random candidate sets of increasing size, best of --repeat runs.
+Small sizes show where the sweep starts paying off, which is what
+LINE_SWEEP_MIN_CANDIDATES should be set to. Then runs detect_horizontal_lines
+end to end in each mode on rendered form pages with permissive Hough
+settings. Exits non-zero if any output differs.
+
+Usage:
+    python -m benchmarks.lines [--sizes 10,25,50,100,200,1000,5000] [--pages 5] [--repeat 20]
+"""
+import argparse
+import random
+import time
+
+import fitz  # PyMuPDF
+
+import detection
+import raster
+from benchmarks.corpus import underline_form
+
+# Loose enough that Hough reports thousands of segments, including text strokes
+PERMISSIVE_HOUGH = {"canny_low": 50, "canny_high": 100, "hough_threshold": 20, "min_line_length": 20, "max_line_gap": 20, "min_width": 10}
+
+def random_lines(count: int, seed: int = 0):
+    """
+    Candidate lines clustered on form rows, with near duplicates and equal widths
+    """
+    rng = random.Random(seed)
+    rows = [rng.randrange(0, 1584) for _ in range(max(1, count // 20))]
+    return [
+        {
+            "type": "line",
+            "x": rng.randrange(0, 1000),
+            "y": rng.choice(rows) + rng.randrange(-12, 13),
+            "width": rng.choice([60, 80, 100, 150, 200, 400, rng.randrange(61, 800)]),
+            "height": 20
+        }
+        for _ in range(count)
+    ]
+
+MODES = ("pairwise", "sweep", "auto")
+
+def timed(fn, *args, repeat: int = 1, **kwargs):
+    """
+    Best of repeat runs in milliseconds, and the result
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,25,50,100,200,1000,5000")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    mismatches = 0
+    print(f"{'candidates':>10} {'kept':>6} {'pairwise ms':>12} {'sweep ms':>9} {'auto ms':>8} {'sweep speedup':>14}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        lines = random_lines(size)
+        times, outputs = {}, {}
+        for mode in MODES:
+            detection.LINE_SUPPRESSION = mode
+            times[mode], outputs[mode] = timed(detection.remove_overlapping_lines, lines, repeat=args.repeat)
+        mismatches += outputs["sweep"] != outputs["pairwise"] or outputs["auto"] != outputs["pairwise"]
+        print(f"{size:>10} {len(outputs['sweep']):>6} {times['pairwise']:>12.3f} {times['sweep']:>9.3f} {times['auto']:>8.3f} "
+              f"{times['pairwise'] / times['sweep']:>13.2f}x")
+
+    document = fitz.open(stream=underline_form(args.pages), filetype="pdf")
+    totals = {mode: 0.0 for mode in MODES}
+    for page in document:
+        # Hold the Raster: its array borrows the pixmap's memory
+        page_raster = raster.render(page)
+        image = page_raster.array
+        outputs = {}
+        for mode in totals:
+            detection.LINE_SUPPRESSION = mode
+            elapsed, outputs[mode] = timed(detection.detect_horizontal_lines, image, **PERMISSIVE_HOUGH)
+            totals[mode] += elapsed
+        mismatches += outputs["pairwise"] != outputs["sweep"] or outputs["pairwise"] != outputs["auto"]
+    print(f"detect_horizontal_lines over {args.pages} pages (permissive Hough): "
+          + ", ".join(f"{mode} {totals[mode]:.1f} ms" for mode in MODES))
+
+    print(f"mismatched outputs: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
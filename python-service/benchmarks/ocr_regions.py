@@ -0,0 +1,99 @@
+"""
+Benchmark ROI label OCR against full-page OCR and check the labels agree.
+
+Runs analyze_page on raster-engine pages with ocr_mode "full" and "roi" and
+compares every line and cell label between the two. The OCR pixel ratio is
+measured from the images actually handed to Tesseract, not estimated from
+the bands. Exits non-zero if any label differs, so OCR_REGION_MODE=roi
+should only become the default once this passes on representative forms
+(--pdf-dir) as well as the synthetic corpus.
+
+Needs a working Tesseract install.
+
+Usage:
+    python -m benchmarks.ocr_regions [--corpora underline,mixed,grid,scanned] [--pages 3]
+    python -m benchmarks.ocr_regions --pdf-dir ./sample-forms
+"""
+import argparse
+import os
+import time
+from typing import Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+import detection
+from benchmarks.corpus import CORPORA
+
+MODES = ("full", "roi")
+
+def documents(args) -> List[Tuple[str, bytes]]:
+    if args.pdf_dir:
+        return [
+            (name, open(os.path.join(args.pdf_dir, name), "rb").read())
+            for name in sorted(os.listdir(args.pdf_dir)) if name.lower().endswith(".pdf")
+        ]
+    return [(name, CORPORA[name](args.pages)) for name in args.corpora.split(",")]
+
+def run(data: bytes, mode: str) -> Tuple[List[Dict], float, int]:
+    """
+    analyze_page over every page in one OCR mode; returns (page results, seconds, pixels handed to OCR)
+    """
+    recognize = detection._recognize
+    ocr_pixels = 0
+
+    def counting(image):
+        nonlocal ocr_pixels
+        ocr_pixels += image.shape[0] * image.shape[1]
+        return recognize(image)
+
+    params = {"engine": "raster", "ocr_mode": mode, "include": ["lines", "cells"]}
+    results = []
+    detection._recognize = counting
+    try:
+        with fitz.open(stream=data, filetype="pdf") as document:
+            start = time.perf_counter()
+            for page_num, page in enumerate(document):
+                results.append(detection.analyze_page(page, page_num, params))
+            seconds = time.perf_counter() - start
+    finally:
+        detection._recognize = recognize
+    return results, seconds, ocr_pixels
+
+def label_mismatches(expected: List[Dict], actual: List[Dict]) -> int:
+    """
+    Fields whose label differs, plus any field found in only one of the runs
+    """
+    mismatches = 0
+    for expected_page, actual_page in zip(expected, actual):
+        for result_set in ("lines", "cells"):
+            expected_labels = {(f["x"], f["y"], f["width"]): f["label"] for f in expected_page[result_set]}
+            actual_labels = {(f["x"], f["y"], f["width"]): f["label"] for f in actual_page[result_set]}
+            keys = expected_labels.keys() | actual_labels.keys()
+            mismatches += sum(1 for key in keys if expected_labels.get(key) != actual_labels.get(key))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpora", default="underline,mixed,grid,scanned")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--pdf-dir", help="Benchmark these PDFs instead of the synthetic corpus")
+    args = parser.parse_args()
+
+    total_mismatches = 0
+    print(f"{'document':>20} {'pages':>6} {'fields':>7} {'full ms':>9} {'roi ms':>9} {'roi OCR px':>11} {'mismatches':>11}")
+    for name, data in documents(args):
+        runs = {mode: run(data, mode) for mode in MODES}
+        # Full mode OCRs each page's text raster whole, so its pixel count is the denominator
+        (full_results, full_seconds, full_pixels), (roi_results, roi_seconds, roi_pixels) = runs["full"], runs["roi"]
+        fields = sum(len(page["lines"]) + len(page["cells"]) for page in full_results)
+        mismatches = label_mismatches(full_results, roi_results)
+        total_mismatches += mismatches
+        print(f"{name:>20} {len(full_results):>6} {fields:>7} {full_seconds * 1000:>9.1f} {roi_seconds * 1000:>9.1f} "
+              f"{roi_pixels / max(1, full_pixels):>11.1%} {mismatches:>11}")
+
+    print(f"label mismatches: {total_mismatches}")
+    if total_mismatches:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
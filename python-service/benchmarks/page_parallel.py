@@ -0,0 +1,58 @@
+"""
+Benchmark page fan-out scaling across worker counts on a 50-page PDF.
+
+The underline form corpus is born-digital, so pages are forced through the
+raster engine by default; with the vector engine there is too little work
+per page to measure fan-out.
+
+Usage:
+    python -m benchmarks.page_parallel [--pages 50] [--task fillable] [--engine raster] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import page_pool
+from benchmarks.corpus import underline_form
+
+def run(pages: int, task: str, engine: str, worker_counts):
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:
+        temp_pdf.write(underline_form(pages))
+        pdf_path = temp_pdf.name
+
+    params = {"engine": engine}
+    try:
+        baseline = None
+        print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+        for workers in worker_counts:
+            # Warm the pool so process start-up isn't counted against the run
+            page_pool.map_pages(pdf_path, task, params, workers=workers)
+
+            start = time.perf_counter()
+            total_pages, results = page_pool.map_pages(pdf_path, task, params, workers=workers)
+            elapsed = time.perf_counter() - start
+
+            assert len(results) == total_pages == pages
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>9.2f} {pages / elapsed:>9.1f} {baseline / elapsed:>7.2f}x")
+    finally:
+        page_pool.shutdown()
+        os.unlink(pdf_path)
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, 8, cpu_count} & set(range(1, cpu_count + 1)))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--task", choices=["fillable", "cells", "text"], default="fillable")
+    parser.add_argument("--engine", choices=["raster", "vector", "auto"], default="raster")
+    parser.add_argument("--workers", default=",".join(str(w) for w in default_workers),
+                        help="Comma-separated worker counts to compare")
+    args = parser.parse_args()
+
+    run(args.pages, args.task, args.engine, [int(w) for w in args.workers.split(",")])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Microbenchmark page render-to-array latency and peak RSS.
+
+Compares the legacy path (RGB pixmap -> PNG -> cv2.imdecode -> BGR2GRAY)
+with raster.render (grayscale pixmap wrapped as a zero-copy NumPy view).
+Each path runs in its own subprocess so peak RSS isn't shared between them.
+
+Usage:
+    python -m benchmarks.raster [--pages 20] [--dpi 144]
+"""
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+import raster
+from benchmarks.corpus import underline_form
+
+def legacy_render(page: fitz.Page, dpi: int) -> np.ndarray:
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    image = cv2.imdecode(np.frombuffer(pix.tobytes("png"), np.uint8), cv2.IMREAD_COLOR)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def zero_copy_render(page: fitz.Page, dpi: int) -> np.ndarray:
+    page_raster = raster.render(page, dpi)
+    # Touch the pixels so both paths end with a usable array
+    page_raster.array.sum()
+    return page_raster.array
+
+def measure(mode: str, pages: int, dpi: int) -> dict:
+    render_fn = legacy_render if mode == "legacy" else zero_copy_render
+    document = fitz.open(stream=underline_form(pages), filetype="pdf")
+    rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    timings = []
+    for page in document:
+        start = time.perf_counter()
+        render_fn(page, dpi)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "mode": mode,
+        "pages": pages,
+        "dpi": dpi,
+        "meanMs": statistics.mean(timings),
+        "p95Ms": sorted(timings)[int(len(timings) * 0.95) - 1],
+        "peakRssMb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rssGrowthMb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before_kb) / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--dpi", type=int, default=raster.DETECTION_DPI)
+    parser.add_argument("--mode", choices=["legacy", "zero-copy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.pages, args.dpi)))
+        return
+
+    results = []
+    for mode in ("legacy", "zero-copy"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.raster", "--mode", mode,
+             "--pages", str(args.pages), "--dpi", str(args.dpi)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':>10} {'mean ms':>9} {'p95 ms':>9} {'peak RSS MB':>12} {'RSS growth MB':>14}")
+    for r in results:
+        print(f"{r['mode']:>10} {r['meanMs']:>9.1f} {r['p95Ms']:>9.1f} {r['peakRssMb']:>12.1f} {r['rssGrowthMb']:>14.1f}")
+
+if __name__ == "__main__":
+    main()
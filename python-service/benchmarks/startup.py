@@ -0,0 +1,117 @@
+"""
+Benchmark service cold start.
+
+Measures, in fresh interpreters:
+
+- importing main, and which heavy modules that import pulls in;
+- loading every engine eagerly after that import, i.e. what a process
+  that imported everything up front paid before it could serve anything;
+- starting uvicorn with each PREWARM setting, and the time until /health
+  first answers (liveness) and until /ready returns 200.
+
+Usage:
+    python -m benchmarks.startup [--prewarm none,all] [--runs 3] [--timeout 300]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Optional
+
+HEAVY_MODULES = ["fitz", "cv2", "numpy", "pytesseract", "tesserocr", "torch", "commonforms"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+loaded = [name for name in {heavy!r} if name in sys.modules]
+engines_seconds = None
+if {eager!r}:
+    import engines
+    start = time.perf_counter()
+    for name in engines.ENGINES:
+        engines.require(name)
+    engines_seconds = time.perf_counter() - start
+print(json.dumps({{"import": imported, "heavy": loaded, "engines": engines_seconds}}))
+"""
+
+def probe_import(eager: bool) -> dict:
+    script = IMPORT_PROBE.format(heavy=HEAVY_MODULES, eager=eager)
+    env = {**os.environ, "PREWARM": "none"}
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, check=True).stdout
+    # Engine loads print progress; the JSON summary is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for(url: str, start: float, deadline: float) -> Optional[float]:
+    """
+    Poll url until it returns 200; seconds since start, or None at the deadline
+    """
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.02)
+    return None
+
+def time_server(prewarm: str, timeout: float) -> dict:
+    """
+    Start uvicorn with PREWARM=prewarm; seconds from launch until /health and /ready answer 200
+    """
+    port = free_port()
+    # /ready waits for every pre-warmed engine, optional ones included, so it times the whole warm-up
+    env = {**os.environ, "PREWARM": prewarm, "READY_ENGINES": prewarm}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + timeout
+        live = wait_for(f"http://127.0.0.1:{port}/health", start, deadline)
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", start, deadline)
+        return {"live": live, "ready": ready}
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prewarm", default="none,all", help="Comma-separated PREWARM values; use + inside one value, e.g. pdf+detection")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    lazy = probe_import(eager=False)
+    eager = probe_import(eager=True)
+    print(f"import main: {lazy['import'] * 1000:.0f} ms, heavy modules loaded: {', '.join(lazy['heavy']) or 'none'}")
+    print(f"loading every engine after import: {eager['engines']:.2f} s")
+    print()
+    print(f"{'PREWARM':>20} {'/health s':>10} {'/ready s':>9}")
+    for prewarm in args.prewarm.split(","):
+        prewarm = prewarm.replace("+", ",")
+        runs = [time_server(prewarm, args.timeout) for _ in range(args.runs)]
+        columns = []
+        for key in ("live", "ready"):
+            seconds = [run[key] for run in runs if run[key] is not None]
+            columns.append(f"{statistics.median(seconds):.2f}" if seconds else "timeout")
+        print(f"{prewarm or 'none':>20} {columns[0]:>10} {columns[1]:>9}")
+
+if __name__ == "__main__":
+    main()
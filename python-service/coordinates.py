@@ -0,0 +1,69 @@
+"""
+Coordinate spaces shared by detection and drawing.
+
+Detection results (and the frontend's fills and drawings) are in detection
+pixels: the page as displayed, i.e. after its /Rotate, at DETECTION_DPI.
+PyMuPDF's text extraction and drawing calls instead work in points on the
+unrotated page. PageTransform converts between the two from the page's
+rotation_matrix and the DPI scale alone, so callers never need to render a
+pixmap to find the scale or rewrite the content stream with clean_contents()
+to line things up.
+"""
+import fitz  # PyMuPDF
+
+# Detection coordinates are always expressed at this DPI (PDF points at 2x)
+DETECTION_DPI = 144
+
+def to_detection_matrix(page: fitz.Page, dpi: int = DETECTION_DPI) -> fitz.Matrix:
+    """
+    Unrotated page points -> detection pixels; rendering applies rotation, then scale
+    """
+    scale = dpi / 72
+    return page.rotation_matrix * fitz.Matrix(scale, scale)
+
+class PageTransform:
+    """
+    Maps detection pixels on a page to the unrotated page points drawing calls expect.
+
+    Positions are converted in two steps so callers can keep offsets in
+    points: to_points() scales detection pixels to points on the displayed
+    page, and point()/rect() derotate displayed-page points. Text drawn at
+    point() should pass rotate=transform.rotation to read upright.
+    """
+
+    def __init__(self, page: fitz.Page, dpi: int = DETECTION_DPI):
+        self.rotation = page.rotation
+        self.scale = 72 / dpi
+        self._derotate = page.derotation_matrix
+        # Detection pixels straight to unrotated page points
+        self.matrix = ~to_detection_matrix(page, dpi)
+
+    def to_points(self, value: float) -> float:
+        """
+        A detection-pixel coordinate or length in points on the displayed page
+        """
+        return value * self.scale
+
+    def point(self, x: float, y: float) -> fitz.Point:
+        """
+        A displayed-page point on the unrotated page
+        """
+        return fitz.Point(x, y) * self._derotate
+
+    def rect(self, x0: float, y0: float, x1: float, y1: float) -> fitz.Rect:
+        """
+        A displayed-page rectangle on the unrotated page
+        """
+        return (fitz.Rect(x0, y0, x1, y1) * self._derotate).normalize()
+
+def isolate_contents(page: fitz.Page) -> None:
+    """
+    Wrap the page's existing content in q/Q before drawing on it.
+
+    Content that leaves a transformation or color set would otherwise leak
+    into what is appended after it. This adds two tiny streams around the
+    existing ones instead of parsing and rewriting them like clean_contents().
+    """
+    # PyMuPDF can't wrap a page that has no content streams yet (nor does it need to)
+    if page.get_contents():
+        page.wrap_contents()
@@ -0,0 +1,573 @@
+"""
+Computer vision and OCR detection used by the detection endpoints.
+
+Kept separate from main.py so page worker processes (see page_pool.py) can
+import it without loading FastAPI or CommonForms.
+"""
+import cv2
+import numpy as np
+import fitz  # PyMuPDF
+from typing import List, Dict, Any, Optional, Tuple
+import bisect
+import math
+import os
+
+import engines
+import metrics
+import ocr
+import raster
+import tuning
+import vector_engine
+
+# "auto" picks the vector engine for born-digital pages and raster (CV + OCR) for scans
+DEFAULT_ENGINE = os.environ.get("DETECTION_ENGINE", "auto")
+
+# "roi" OCRs only label bands when no full-page text is requested; "full" always OCRs the page.
+# Check label agreement and OCR'd pixels with benchmarks.ocr_regions before switching the default.
+DEFAULT_OCR_MODE = os.environ.get("OCR_REGION_MODE", "full")
+
+# Labels are text left of a field whose top is within this many pixels of the field's y
+LABEL_MAX_Y_DISTANCE = 30
+# ROI band padding: room below the search window for glyph height
+LABEL_BAND_TEXT_HEIGHT = 60
+
+# Overlap suppression for detected lines: "sweep" (y-sorted, array based), the original
+# "pairwise" scan, or "auto", which picks by candidate count. The sweep only pays off from
+# LINE_SWEEP_MIN_CANDIDATES up (benchmarks.lines); typical pages have fewer. Outputs are identical.
+LINE_SUPPRESSION = os.environ.get("LINE_SUPPRESSION", "auto")
+LINE_SWEEP_MIN_CANDIDATES = int(os.environ.get("LINE_SWEEP_MIN_CANDIDATES", 64))
+
+# Result sets analyze_page can produce
+ANALYSIS_RESULTS = ("lines", "cells", "text")
+
+# Bump whenever a change alters what analyze_page returns, so cached page results are recomputed
+DETECTION_VERSION = 3
+
+# Marks an analyze_page result whose OCR failed (or timed out), so it isn't cached as a page without text
+OCR_FAILED_KEY = "ocrFailed"
+
+# detect_horizontal_lines tuning parameters accepted through page task params
+LINE_PARAM_NAMES = (
+    "canny_low",
+    "canny_high",
+    "hough_threshold",
+    "min_line_length",
+    "max_line_gap",
+    "min_width",
+)
+
+# Line parameters measured in pixels (or pixel votes), rescaled when rendering at another DPI
+SCALED_LINE_PARAMS = ("hough_threshold", "min_line_length", "max_line_gap", "min_width")
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """
+    Return a single-channel view of a grayscale raster or BGR image
+    """
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def detect_horizontal_lines(
+    image: np.ndarray,
+    canny_low: int = 115,
+    canny_high: int = 175,
+    hough_threshold: int = 150,
+    min_line_length: int = 100,
+    max_line_gap: int = 7,
+    min_width: int = 60
+) -> List[Dict[str, Any]]:
+    """
+    Detect horizontal lines that could be fillable underscores
+    Parameters can be adjusted for tuning detection sensitivity
+    """
+    return lines_from_edges(
+        edge_map(image, canny_low, canny_high),
+        hough_threshold=hough_threshold,
+        min_line_length=min_line_length,
+        max_line_gap=max_line_gap,
+        min_width=min_width
+    )
+
+def edge_map(image: np.ndarray, canny_low: int = 115, canny_high: int = 175) -> np.ndarray:
+    """
+    Canny edges of a page raster, the input detect_horizontal_lines searches for lines
+    """
+    # Canny edge detection with configurable thresholds
+    return cv2.Canny(to_gray(image), canny_low, canny_high, apertureSize=3)
+
+def lines_from_edges(
+    edges: np.ndarray,
+    hough_threshold: int = 150,
+    min_line_length: int = 100,
+    max_line_gap: int = 7,
+    min_width: int = 60
+) -> List[Dict[str, Any]]:
+    """
+    The Hough and filtering half of detect_horizontal_lines, for callers that
+    reuse one edge map across several parameter sets
+    """
+    # Detect lines using HoughLinesP with configurable parameters
+    lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=hough_threshold,
+                           minLineLength=min_line_length, maxLineGap=max_line_gap)
+
+    if LINE_SUPPRESSION == "pairwise":
+        horizontal_lines = []
+        if lines is not None:
+            for line in lines:
+                x1, y1, x2, y2 = line[0]
+                # Check if line is roughly horizontal and meets minimum width
+                if abs(y2 - y1) < 10 and abs(x2 - x1) > min_width:
+                    horizontal_lines.append({
+                        "type": "line",
+                        "x": int(min(x1, x2)),
+                        "y": int(min(y1, y2)),
+                        "width": int(abs(x2 - x1)),
+                        "height": 20
+                    })
+
+        # Apply collision detection to remove overlapping lines
+        return _remove_overlapping_lines_pairwise(horizontal_lines)
+
+    if lines is None:
+        return []
+
+    # Filter and measure every Hough segment at once; dicts are only built for survivors
+    segments = lines.reshape(-1, 4).astype(np.int64)
+    x1, y1, x2, y2 = segments.T
+    keep = (np.abs(y2 - y1) < 10) & (np.abs(x2 - x1) > min_width)
+    xs = np.minimum(x1, x2)[keep]
+    ys = np.minimum(y1, y2)[keep]
+    widths = np.abs(x2 - x1)[keep]
+
+    def line(i: int) -> Dict[str, Any]:
+        return {"type": "line", "x": int(xs[i]), "y": int(ys[i]), "width": int(widths[i]), "height": 20}
+
+    if not _use_sweep(len(xs)):
+        return _remove_overlapping_lines_pairwise([line(i) for i in range(len(xs))])
+    return [line(i) for i in _sweep_overlaps(xs, ys, widths)]
+
+def _use_sweep(candidates: int) -> bool:
+    """
+    Whether overlap suppression over this many candidate lines should use the sweep
+    """
+    if LINE_SUPPRESSION == "auto":
+        return candidates >= LINE_SWEEP_MIN_CANDIDATES
+    return LINE_SUPPRESSION == "sweep"
+
+def _sweep_overlaps(xs: np.ndarray, ys: np.ndarray, widths: np.ndarray, y_threshold: int = 15, x_overlap_threshold: float = 0.5) -> List[int]:
+    """
+    Indices of the lines remove_overlapping_lines keeps, in its output order.
+
+    Lines are still accepted longest first, but accepted lines are kept sorted
+    by y so each candidate is only compared with those within y_threshold
+    instead of with every accepted line.
+    """
+    # Stable, so equal widths keep their input order as sorted(reverse=True) does
+    order = np.argsort(-widths, kind="stable").tolist()
+    xs, ys, widths = xs.tolist(), ys.tolist(), widths.tolist()
+
+    accepted_ys: List[int] = []
+    accepted_spans: List[Tuple[int, int, int]] = []
+    kept: List[int] = []
+    for i in order:
+        y, x1, width = ys[i], xs[i], widths[i]
+        x2 = x1 + width
+        has_collision = False
+        for j in range(bisect.bisect_left(accepted_ys, y - y_threshold), bisect.bisect_right(accepted_ys, y + y_threshold)):
+            accepted_x1, accepted_x2, accepted_width = accepted_spans[j]
+            overlap_width = max(0, min(x2, accepted_x2) - max(x1, accepted_x1))
+            # Overlap ratio relative to the smaller line
+            smaller_width = min(width, accepted_width)
+            overlap_ratio = overlap_width / smaller_width if smaller_width > 0 else 0
+            if overlap_ratio >= x_overlap_threshold:
+                has_collision = True
+                break
+
+        if not has_collision:
+            position = bisect.bisect_right(accepted_ys, y)
+            accepted_ys.insert(position, y)
+            accepted_spans.insert(position, (x1, x2, width))
+            kept.append(i)
+
+    # Sort back by Y position for consistent ordering
+    kept.sort(key=lambda i: (ys[i], xs[i]))
+    return kept
+
+def remove_overlapping_lines(lines: List[Dict[str, Any]], y_threshold: int = 15, x_overlap_threshold: float = 0.5) -> List[Dict[str, Any]]:
+    """
+    Remove overlapping lines, keeping the longest line when there's a collision.
+
+    Args:
+        lines: List of detected lines
+        y_threshold: Maximum vertical distance to consider lines as overlapping (pixels)
+        x_overlap_threshold: Minimum horizontal overlap ratio to consider collision (0.0-1.0)
+
+    Returns:
+        Filtered list of non-overlapping lines
+    """
+    if not lines or not _use_sweep(len(lines)):
+        return _remove_overlapping_lines_pairwise(lines, y_threshold, x_overlap_threshold)
+
+    kept = _sweep_overlaps(
+        np.array([line['x'] for line in lines]),
+        np.array([line['y'] for line in lines]),
+        np.array([line['width'] for line in lines]),
+        y_threshold,
+        x_overlap_threshold
+    )
+    return [lines[i] for i in kept]
+
+def _remove_overlapping_lines_pairwise(lines: List[Dict[str, Any]], y_threshold: int = 15, x_overlap_threshold: float = 0.5) -> List[Dict[str, Any]]:
+    """
+    Original collision removal comparing each line with every accepted line
+    """
+    if not lines:
+        return lines
+
+    # Sort by width (longest first) so we keep longer lines in case of collision
+    sorted_lines = sorted(lines, key=lambda l: l['width'], reverse=True)
+
+    filtered_lines = []
+
+    for line in sorted_lines:
+        # Check if this line overlaps with any already-accepted line
+        has_collision = False
+
+        for accepted_line in filtered_lines:
+            # Check vertical proximity (are they at similar Y positions?)
+            y_distance = abs(line['y'] - accepted_line['y'])
+            if y_distance > y_threshold:
+                continue  # Too far apart vertically, no collision
+
+            # Check horizontal overlap
+            line_x1 = line['x']
+            line_x2 = line['x'] + line['width']
+            accepted_x1 = accepted_line['x']
+            accepted_x2 = accepted_line['x'] + accepted_line['width']
+
+            # Calculate overlap
+            overlap_start = max(line_x1, accepted_x1)
+            overlap_end = min(line_x2, accepted_x2)
+            overlap_width = max(0, overlap_end - overlap_start)
+
+            # Calculate overlap ratio (relative to smaller line)
+            min_width = min(line['width'], accepted_line['width'])
+            overlap_ratio = overlap_width / min_width if min_width > 0 else 0
+
+            if overlap_ratio >= x_overlap_threshold:
+                has_collision = True
+                break
+
+        if not has_collision:
+            filtered_lines.append(line)
+
+    # Sort back by Y position for consistent ordering
+    filtered_lines.sort(key=lambda l: (l['y'], l['x']))
+
+    return filtered_lines
+
+def detect_table_cells(image: np.ndarray, min_cell_width: int = 50, min_cell_height: int = 15) -> List[Dict[str, Any]]:
+    """
+    Detect table structure and cells
+    """
+    gray = to_gray(image)
+    thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)[1]
+
+    # Find contours
+    contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+
+    cells = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        # Filter for rectangular shapes that could be table cells
+        if w > min_cell_width and h > min_cell_height and w < image.shape[1] * 0.9:
+            cells.append({
+                "type": "cell",
+                "x": int(x),
+                "y": int(y),
+                "width": int(w),
+                "height": int(h)
+            })
+
+    return cells
+
+def _recognize(image: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+    """
+    OCR words in image, or None when OCR failed
+    """
+    try:
+        # Tesseract is only loaded once a raster page needs OCR, so vector pages
+        # keep working without it; a missing or broken install degrades to no text
+        engines.require("ocr")
+        # Reuses this worker's warm Tesseract engine when tesserocr is available
+        return ocr.recognize_words(image)
+    except Exception as e:
+        print(f"OCR failed: {str(e)}")
+        return None
+
+def extract_text_with_positions(image: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Extract text and their positions using OCR
+    """
+    words = _recognize(image)
+    return words if words is not None else []
+
+class LabelIndex:
+    """
+    Text elements sorted by y, so the words within LABEL_MAX_Y_DISTANCE of a
+    field are found by binary search instead of scanning the whole page.
+    Build once per page and reuse it for every field.
+    """
+
+    def __init__(self, text_elements: List[Dict]):
+        # Keep the original position so ties sort exactly as the linear scan did
+        self.entries = sorted(
+            ((text_elem['y'], order, text_elem) for order, text_elem in enumerate(text_elements)),
+            key=lambda entry: (entry[0], entry[1])
+        )
+        self.ys = [entry[0] for entry in self.entries]
+
+    def label_for(self, field: Dict) -> str:
+        """
+        Up to five nearest words left of the field and roughly on its line
+        """
+        start = bisect.bisect_right(self.ys, field['y'] - LABEL_MAX_Y_DISTANCE)
+        end = bisect.bisect_left(self.ys, field['y'] + LABEL_MAX_Y_DISTANCE)
+        nearby_text = [
+            (field['x'] - (text_elem['x'] + text_elem['width']), order, text_elem)
+            for _, order, text_elem in self.entries[start:end]
+            if text_elem['x'] < field['x']
+        ]
+        # Sort by distance and take the closest
+        nearby_text.sort(key=lambda candidate: (candidate[0], candidate[1]))
+        return ' '.join([text_elem['text'] for _, _, text_elem in nearby_text[:5]])
+
+def associate_labels_with_fields(text_elements: List[Dict], fields: List[Dict], index: Optional[LabelIndex] = None) -> List[Dict]:
+    """
+    Associate text labels with detected fillable fields
+    """
+    if index is None:
+        index = LabelIndex(text_elements)
+    for field in fields:
+        field['label'] = index.label_for(field)
+
+    return fields
+
+def label_bands(fields: List[Dict], page_width: int, page_height: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Page regions (x0, y0, x1, y1 in detection pixels) that can hold a label for
+    any of the fields, merged where they overlap.
+
+    A label is text starting left of the field whose top is within
+    LABEL_MAX_Y_DISTANCE of the field's y, so each band spans that window
+    plus room for glyph height. Bands run the full page width: a word that
+    starts left of the field can end anywhere, and cutting it would change
+    what Tesseract reads.
+    """
+    bands = sorted(
+        (
+            max(0, field['y'] - LABEL_MAX_Y_DISTANCE),
+            min(page_height, field['y'] + LABEL_MAX_Y_DISTANCE + LABEL_BAND_TEXT_HEIGHT)
+        )
+        for field in fields
+    )
+
+    merged: List[List[int]] = []
+    for y0, y1 in bands:
+        if merged and y0 <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], y1)
+        else:
+            merged.append([y0, y1])
+
+    return [(0, y0, page_width, y1) for y0, y1 in merged]
+
+def extract_label_text(text_raster: raster.Raster, fields: List[Dict], page_num: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    OCR only the label bands around fields instead of the whole page.
+
+    Returns (text elements in detection pixels, like a full-page OCR pass would
+    for the regions associate_labels_with_fields looks at, whether OCR failed on any band).
+    """
+    to_raster = 1 / text_raster.to_detection
+    raster_height, raster_width = text_raster.array.shape[:2]
+    bands = label_bands(
+        fields,
+        int(raster_width * text_raster.to_detection),
+        int(raster_height * text_raster.to_detection)
+    )
+
+    text_elements = []
+    ocr_failed = False
+    ocr_pixels = 0
+    for x0, y0, x1, y1 in bands:
+        rx0, ry0 = int(x0 * to_raster), int(y0 * to_raster)
+        rx1, ry1 = int(math.ceil(x1 * to_raster)), int(math.ceil(y1 * to_raster))
+        crop = text_raster.array[ry0:ry1, rx0:rx1]
+        ocr_pixels += crop.shape[0] * crop.shape[1]
+        words = _recognize(crop)
+        if words is None:
+            ocr_failed = True
+            continue
+        for word in words:
+            word['x'] += rx0
+            word['y'] += ry0
+            text_elements.append(word)
+
+    print(f"Page {page_num + 1}: ROI OCR over {len(bands)} bands, {ocr_pixels / (raster_width * raster_height):.1%} of page pixels")
+    return raster.to_detection_space(text_elements, text_raster), ocr_failed
+
+def line_kwargs(params: Dict[str, Any], scale: float = 1) -> Dict[str, Any]:
+    """
+    detect_horizontal_lines keyword arguments from page task params.
+
+    Length and vote thresholds are given in detection pixels; scale converts them to the raster's DPI.
+    """
+    return {
+        name: (int(round(params[name] * scale)) if name in SCALED_LINE_PARAMS else params[name])
+        for name in LINE_PARAM_NAMES if name in params
+    }
+
+def _tag_page(items: List[Dict[str, Any]], page_num: int) -> List[Dict[str, Any]]:
+    # Add page number to each field/text element
+    for item in items:
+        item['page'] = page_num + 1
+    return items
+
+def analyze_page(page: fitz.Page, page_num: int, params: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Run the requested detectors on one page, sharing a single render and OCR pass.
+
+    params["include"] selects which of "lines", "cells" and "text" to return
+    (default: all). Lines and cells are labelled from the same text elements
+    that "text" returns. A page whose OCR failed still gets its fields (without
+    labels), marked with OCR_FAILED_KEY.
+    """
+    include = params.get("include", ANALYSIS_RESULTS)
+    if not include:
+        return {}
+    engine = vector_engine.select_engine(page, params.get("engine", DEFAULT_ENGINE))
+    lines: List[Dict[str, Any]] = []
+    cells: List[Dict[str, Any]] = []
+    ocr_failed = False
+
+    if engine == "vector":
+        with metrics.stage("vector_extract"):
+            if "lines" in include:
+                lines = remove_overlapping_lines(vector_engine.detect_horizontal_lines(page, **line_kwargs(params)))
+            if "cells" in include:
+                cells = vector_engine.detect_table_cells(page)
+            text_elements = vector_engine.extract_text_with_positions(page)
+    else:
+        # Each detector reads a grayscale raster at its configured DPI; equal DPIs share one render
+        rasters = raster.PageRasters(page)
+        if "lines" in include:
+            lines_raster = rasters.for_detector("lines")
+            # Detect horizontal lines (underscore fields) with configurable parameters
+            with metrics.stage("canny_hough"):
+                lines = detect_horizontal_lines(
+                    lines_raster.array,
+                    **line_kwargs(params, 1 / lines_raster.to_detection)
+                )
+            lines = raster.to_detection_space(lines, lines_raster, keys=("x", "y", "width"))
+        if "cells" in include:
+            cells_raster = rasters.for_detector("cells")
+            scale = 1 / cells_raster.to_detection
+            with metrics.stage("contours"):
+                cells = detect_table_cells(
+                    cells_raster.array,
+                    min_cell_width=int(round(50 * scale)),
+                    min_cell_height=int(round(15 * scale))
+                )
+            cells = raster.to_detection_space(cells, cells_raster)
+        # Every result set needs the text, either as output or for labels
+        text_raster = rasters.for_detector("text")
+        if "text" in include or params.get("ocr_mode", DEFAULT_OCR_MODE) == "full":
+            words = _recognize(text_raster.array)
+            ocr_failed = words is None
+            text_elements = raster.to_detection_space(words or [], text_raster)
+        else:
+            # Labels are all that's needed, so only OCR the bands next to detected fields
+            text_elements, ocr_failed = extract_label_text(text_raster, lines + cells, page_num)
+
+    result: Dict[str, List[Dict[str, Any]]] = {}
+    with metrics.stage("label_association"):
+        label_index = LabelIndex(text_elements)
+        if "lines" in include:
+            lines = associate_labels_with_fields(text_elements, lines, label_index)
+        if "cells" in include:
+            cells = associate_labels_with_fields(text_elements, cells, label_index)
+    if "lines" in include:
+        print(f"Page {page_num + 1}: Found {len(lines)} horizontal lines via {engine} engine (params: canny={params.get('canny_low')}/{params.get('canny_high')}, hough={params.get('hough_threshold')}, minLen={params.get('min_line_length')}, gap={params.get('max_line_gap')}, minWidth={params.get('min_width')})")
+        result["lines"] = _tag_page(lines, page_num)
+    if "cells" in include:
+        print(f"Page {page_num + 1}: Found {len(cells)} table cells via {engine} engine")
+        result["cells"] = _tag_page(cells, page_num)
+    print(f"Page {page_num + 1}: Extracted {len(text_elements)} text elements via {engine} engine")
+    if "text" in include:
+        result["text"] = _tag_page(text_elements, page_num)
+    if ocr_failed:
+        result[OCR_FAILED_KEY] = True
+
+    return result
+
+def pop_ocr_failed(result: Dict[str, Any]) -> bool:
+    """
+    Whether OCR failed on an analyze_page result, removing the marker so it stays out of responses
+    """
+    return bool(result.pop(OCR_FAILED_KEY, False))
+
+def process_fillable_page(page: fitz.Page, page_num: int, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Detect labelled underline fields on a single page (/detect-fillable-areas)
+    """
+    return analyze_page(page, page_num, {**params, "include": ["lines"]})["lines"]
+
+def process_table_cells_page(page: fitz.Page, page_num: int, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Detect labelled table cells on a single page (/detect-table-cells)
+    """
+    return analyze_page(page, page_num, {**params, "include": ["cells"]})["cells"]
+
+def process_text_page(page: fitz.Page, page_num: int, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Extract positioned text from a single page (/detect-text)
+    """
+    return analyze_page(page, page_num, {**params, "include": ["text"]})["text"]
+
+def result_settings() -> Dict[str, Any]:
+    """
+    Service-wide settings that change page task output, for result cache keys
+    """
+    return {
+        "version": DETECTION_VERSION,
+        "engine": DEFAULT_ENGINE,
+        "ocrMode": DEFAULT_OCR_MODE,
+        "lineSuppression": LINE_SUPPRESSION,
+        "renderDpi": raster.DETECTOR_DPI,
+        "ocr": [ocr.backend(), ocr.OCR_LANG, ocr.OCR_PSM, ocr.OCR_OEM],
+    }
+
+def result_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The analyze_page params that can change its output, for result cache keys.
+
+    include is order-insensitive, line parameters only matter when lines are
+    returned, and ocr_mode doesn't matter when text is (the page is OCR'd whole).
+    """
+    include = sorted(params.get("include", ANALYSIS_RESULTS))
+    key = {name: value for name, value in params.items() if name != "include"}
+    if "lines" not in include:
+        key = {name: value for name, value in key.items() if name not in LINE_PARAM_NAMES}
+    if "text" in include:
+        key.pop("ocr_mode", None)
+    key["include"] = include
+    return key
+
+# Per-page processors addressable by name, so they can be dispatched to worker processes
+PAGE_TASKS = {
+    "analyze": analyze_page,
+    "fillable": process_fillable_page,
+    "cells": process_table_cells_page,
+    "text": process_text_page,
+    "sweep": tuning.sweep_page,
+}
@@ -0,0 +1,187 @@
+"""
+In-memory PDF handling with spill-to-disk for large documents.
+
+Downloaded PDFs are kept as bytes and opened with fitz.open(stream=...), so a
+typical request never touches the filesystem. Documents larger than the spill
+threshold are spooled to a private file instead and opened from it, which lets
+MuPDF read pages lazily rather than holding the whole document in memory.
+
+Callers that genuinely need a path (CommonForms, page worker processes) ask
+for one and get a file written on demand. Every file a PdfSource creates is
+removed when it is closed, when it is garbage collected (e.g. a cancelled
+request dropped it without closing), or at interpreter exit.
+
+Configuration (environment variables):
+    DOCUMENT_SPILL_BYTES   Documents larger than this are spooled to disk (default: 32 MiB)
+    DOCUMENT_SPILL_DIR     Directory for spooled documents (default: system temp dir)
+"""
+import contextlib
+import hashlib
+import os
+import tempfile
+import weakref
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import fitz  # PyMuPDF
+
+DOCUMENT_SPILL_BYTES = int(os.environ.get("DOCUMENT_SPILL_BYTES", 32 * 1024 * 1024))
+DOCUMENT_SPILL_DIR = os.environ.get("DOCUMENT_SPILL_DIR") or tempfile.gettempdir()
+
+def _remove_files(paths: List[str]) -> None:
+    while paths:
+        try:
+            os.unlink(paths.pop())
+        except FileNotFoundError:
+            pass
+
+def _spill_file():
+    return tempfile.NamedTemporaryFile(dir=DOCUMENT_SPILL_DIR, prefix="pdf-", suffix=".pdf", delete=False)
+
+class PdfSource:
+    """
+    A PDF held either as bytes or as a file on disk that this object owns
+    """
+
+    def __init__(self, data: Optional[bytes] = None, path: Optional[str] = None, owned: bool = True, digest: Optional[str] = None):
+        if (data is None) == (path is None):
+            raise ValueError("PdfSource needs exactly one of data or path")
+        self.data = data
+        self._path = path
+        self._digest = digest
+        # Files to delete on close; the finalizer holds the list, not self, so it can't keep us alive
+        self._owned_files: List[str] = [path] if path is not None and owned else []
+        self._finalizer = weakref.finalize(self, _remove_files, self._owned_files)
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[bytes], spill_threshold: Optional[int] = None) -> "PdfSource":
+        """
+        Collect a downloaded body, switching to a spool file once it grows past spill_threshold
+        """
+        writer = SpoolWriter(spill_threshold)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.discard()
+            raise
+        return writer.finish()
+
+    @classmethod
+    def from_file(cls, path: str, spill_threshold: Optional[int] = None, owned: bool = False) -> "PdfSource":
+        """
+        Load a small file into memory, or keep a large one on disk
+        """
+        spill_threshold = DOCUMENT_SPILL_BYTES if spill_threshold is None else spill_threshold
+        if os.path.getsize(path) > spill_threshold:
+            return cls(path=path, owned=owned)
+        with open(path, "rb") as f:
+            data = f.read()
+        if owned:
+            os.unlink(path)
+        return cls(data=data)
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else os.path.getsize(self._path)
+
+    def digest(self) -> str:
+        """
+        SHA-256 hex digest of the document bytes, hashed on first use unless the download cache supplied it
+        """
+        if self._digest is None:
+            digest_hash = hashlib.sha256()
+            if self.data is not None:
+                digest_hash.update(self.data)
+            else:
+                with open(self._path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest_hash.update(chunk)
+            self._digest = digest_hash.hexdigest()
+        return self._digest
+
+    def open(self) -> "fitz.Document":
+        """
+        Open the document: parsed straight from memory, or lazily from the spool file
+        """
+        import fitz  # PyMuPDF
+
+        if self.data is not None:
+            return fitz.open(stream=self.data, filetype="pdf")
+        return fitz.open(self._path)
+
+    def path(self) -> str:
+        """
+        A file holding the document, written on first use for in-memory sources
+        """
+        if self._path is None:
+            with _spill_file() as f:
+                self._owned_files.append(f.name)
+                f.write(self.data)
+            self._path = f.name
+        return self._path
+
+    def close(self) -> None:
+        self._finalizer()
+
+    def __enter__(self) -> "PdfSource":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class SpoolWriter:
+    """
+    Incrementally builds a PdfSource, buffering in memory until spill_threshold
+    and continuing in a spool file after that
+    """
+
+    def __init__(self, spill_threshold: Optional[int] = None):
+        self.spill_threshold = DOCUMENT_SPILL_BYTES if spill_threshold is None else spill_threshold
+        self.size = 0
+        self._buffered: List[bytes] = []
+        self._spill = None
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self._spill is not None:
+            self._spill.write(chunk)
+            return
+        self._buffered.append(chunk)
+        if self.size > self.spill_threshold:
+            self._spill = _spill_file()
+            self._spill.writelines(self._buffered)
+            self._buffered.clear()
+
+    def finish(self) -> PdfSource:
+        if self._spill is None:
+            return PdfSource(data=b"".join(self._buffered))
+        self._spill.close()
+        return PdfSource(path=self._spill.name)
+
+    def discard(self) -> None:
+        """
+        Drop everything written so far (e.g. before retrying a failed download)
+        """
+        self._buffered.clear()
+        self.size = 0
+        if self._spill is not None:
+            self._spill.close()
+            _remove_files([self._spill.name])
+            self._spill = None
+
+@contextlib.contextmanager
+def scratch_path(suffix: str = ".pdf") -> Iterator[str]:
+    """
+    Path for a tool that insists on writing its output to a file; removed on exit
+    """
+    fd, path = tempfile.mkstemp(dir=DOCUMENT_SPILL_DIR, prefix="pdf-", suffix=suffix)
+    os.close(fd)
+    try:
+        yield path
+    finally:
+        _remove_files([path])
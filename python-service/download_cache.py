@@ -0,0 +1,284 @@
+"""
+Shared on-disk cache for PDFs downloaded from R2.
+
+The frontend calls several endpoints back to back on the same pdfUrl, so
+downloads go through a content-addressed cache:
+
+- Blobs are stored once per SHA-256 of their bytes, so identical documents
+  fetched from different URLs share one file on disk.
+- URLs map to a blob plus the ETag/Last-Modified the origin returned, and
+  repeat fetches revalidate with If-None-Match/If-Modified-Since.
+- Total blob size is capped; least recently used blobs are evicted first.
+
+Downloads go through the pooled http_fetch client, which applies the
+timeout, size limit and retry policy.
+
+Documents are handed to callers as document_io.PdfSource objects: small
+ones are read into memory, larger ones get a hard link to the cached blob
+that the source owns and deletes when closed, so eviction never pulls a file
+out from under an in-flight request.
+
+Configuration (environment variables):
+    DOWNLOAD_CACHE_ENABLED     "0" to disable caching (default: enabled)
+    DOWNLOAD_CACHE_DIR         Cache directory (default: <tmp>/pdf-download-cache)
+    DOWNLOAD_CACHE_MAX_BYTES   Size cap for cached blobs (default: 512 MiB)
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import metrics
+from document_io import DOCUMENT_SPILL_BYTES, PdfSource, SpoolWriter
+from http_fetch import get_fetcher
+
+class _PartFile:
+    """
+    Fetch sink that streams into a .part file in the blob directory while hashing
+    """
+
+    def __init__(self, blob_dir: str):
+        self.digest_hash = hashlib.sha256()
+        self.file = tempfile.NamedTemporaryFile(dir=blob_dir, suffix='.part', delete=False)
+
+    def write(self, chunk: bytes) -> None:
+        self.digest_hash.update(chunk)
+        self.file.write(chunk)
+
+    def discard(self) -> None:
+        self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+class DownloadCache:
+    """
+    Content-addressed PDF cache with conditional revalidation and LRU eviction
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.checkout_dir = os.path.join(cache_dir, "checkout")
+        self.index_path = os.path.join(cache_dir, "index.sqlite3")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.checkout_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "dedupHits": 0,
+            "evictions": 0,
+            "bytesDownloaded": 0,
+            "bytesServedFromCache": 0,
+        }
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                " digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                " url TEXT PRIMARY KEY, digest TEXT NOT NULL, etag TEXT, last_modified TEXT)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, f"{digest}.pdf")
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def fetch(self, url: str, revalidate: bool = True) -> str:
+        """
+        Return the path of the cached blob for url, downloading or revalidating as needed.
+
+        With revalidate=False the cached validators aren't sent, so the origin always returns the bytes.
+        """
+        row = None
+        if revalidate:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT digest, etag, last_modified FROM urls WHERE url = ?", (url,)
+                ).fetchone()
+
+        headers = {}
+        cached_digest = None
+        if row is not None and os.path.exists(self._blob_path(row[0])):
+            cached_digest = row[0]
+            if row[1]:
+                headers['If-None-Match'] = row[1]
+            if row[2]:
+                headers['If-Modified-Since'] = row[2]
+
+        # Streamed into the cache directory while hashing so the bytes are never held in memory
+        result = get_fetcher().fetch_sync(url, lambda: _PartFile(self.blob_dir), headers)
+        if result.status == 304:
+            if cached_digest is not None:
+                blob_path = self._hit(url, cached_digest)
+                if blob_path is not None:
+                    return blob_path
+                # Evicted by another worker since the lookup, so the 304 has nothing to point at
+                return self.fetch(url, revalidate=False)
+            raise RuntimeError(f"Unexpected 304 for uncached {url}")
+
+        part = result.sink
+        part.file.close()
+        size = result.size
+        etag = result.headers.get('ETag')
+        last_modified = result.headers.get('Last-Modified')
+
+        digest = part.digest_hash.hexdigest()
+        blob_path = self._blob_path(digest)
+        self._count("misses")
+        self._count("bytesDownloaded", size)
+        if os.path.exists(blob_path):
+            # Same bytes already cached under another URL (or unchanged without validators)
+            part.discard()
+            self._count("dedupHits")
+        else:
+            os.replace(part.file.name, blob_path)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (digest, size, last_used) VALUES (?, ?, ?)",
+                (digest, size, time.time())
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (url, digest, etag, last_modified) VALUES (?, ?, ?, ?)",
+                (url, digest, etag, last_modified)
+            )
+
+        self._evict(keep=digest)
+        return blob_path
+
+    def _hit(self, url: str, digest: str) -> Optional[str]:
+        """
+        Mark url's blob as used and return its path, or None (dropping the stale url row) if it was evicted
+        """
+        blob_path = self._blob_path(digest)
+        try:
+            size = os.path.getsize(blob_path)
+        except FileNotFoundError:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM urls WHERE url = ? AND digest = ?", (url, digest))
+            return None
+        with self._connect() as conn:
+            conn.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), digest))
+        self._count("hits")
+        self._count("bytesServedFromCache", size)
+        return blob_path
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """
+        Remove least recently used blobs until the cache fits under max_bytes
+        """
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for digest, size in conn.execute(
+                "SELECT digest, size FROM blobs ORDER BY last_used ASC"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                if digest == keep:
+                    continue
+                conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+                try:
+                    os.unlink(self._blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self._count("evictions")
+
+    def checkout(self, url: str) -> str:
+        """
+        Fetch url and return a private path to its bytes that the caller must unlink
+        """
+        return self._checkout_blob(self.fetch(url))
+
+    def _checkout_blob(self, blob_path: str) -> str:
+        fd, checkout_path = tempfile.mkstemp(dir=self.checkout_dir, suffix='.pdf')
+        os.close(fd)
+        os.unlink(checkout_path)
+        try:
+            # A hard link keeps the bytes alive even if the blob is evicted meanwhile
+            os.link(blob_path, checkout_path)
+        except OSError:
+            shutil.copyfile(blob_path, checkout_path)
+        return checkout_path
+
+    def load(self, url: str) -> PdfSource:
+        """
+        Fetch url as a PdfSource, in memory unless it exceeds the spill threshold
+        """
+        blob_path = self.fetch(url)
+        # Blobs are named by their SHA-256, so sources don't need hashing again
+        digest = os.path.basename(blob_path)[:-len(".pdf")]
+        try:
+            if os.path.getsize(blob_path) <= DOCUMENT_SPILL_BYTES:
+                with open(blob_path, 'rb') as f:
+                    return PdfSource(data=f.read(), digest=digest)
+            return PdfSource(path=self._checkout_blob(blob_path), digest=digest)
+        except FileNotFoundError:
+            # Evicted by a concurrent fetch; checkout downloads it again
+            return PdfSource(path=self.checkout(url))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters plus current cache occupancy
+        """
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, "entries": entries, "sizeBytes": size, "maxBytes": self.max_bytes}
+
+_cache: Optional[DownloadCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Optional[DownloadCache]:
+    """
+    Return the process-wide download cache, or None when caching is disabled
+    """
+    global _cache
+    if os.environ.get("DOWNLOAD_CACHE_ENABLED", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = DownloadCache(
+                cache_dir=os.environ.get(
+                    "DOWNLOAD_CACHE_DIR",
+                    os.path.join(tempfile.gettempdir(), "pdf-download-cache")
+                ),
+                max_bytes=int(os.environ.get("DOWNLOAD_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+            )
+        return _cache
+
+def download_document(url: str) -> PdfSource:
+    """
+    Download url into a PdfSource the caller closes when done
+    """
+    cache = get_cache()
+    with metrics.stage("download"):
+        if cache is not None:
+            source = cache.load(url)
+        else:
+            source = get_fetcher().fetch_sync(url, SpoolWriter).sink.finish()
+    metrics.record_bytes_in(source.size)
+    return source
@@ -0,0 +1,167 @@
+"""
+Batched rendering of suggested fills and drawing elements onto PDF pages.
+
+page.draw_line(), draw_rect() and insert_text() each build their own Shape
+and commit it, which appends another content stream to the page with its own
+q/Q, color and width operators. A freehand signature drawn one segment at a
+time became thousands of commits and a bloated PDF. PageCanvas instead
+collects a page's fills and elements and commits them as a single Shape:
+
+- pen strokes are polylines rather than one line per pair of points,
+- strokes and outlines are grouped by color and width, so each group sets
+  its style once,
+- arrows (shaft and head) and lines join the same groups.
+
+Text is written after the strokes in the same commit, so it sits on top of
+any drawing it overlaps.
+"""
+import math
+from typing import Any, Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+from coordinates import PageTransform
+
+FONT_MAP = {
+    'Arial':            {'fontname': 'helv'},
+    'Times New Roman':  {'fontname': 'tibo'},
+    'Courier New':      {'fontname': 'cour'},
+    'Georgia':          {'fontname': 'tibo'},
+    'Lucida Handwriting': {'fontfile': '/app/fonts/DancingScript-Regular.ttf'},
+}
+
+# Suggested fills are drawn in #1e40af
+FILL_COLOR = (0.11764706, 0.25098039, 0.69019608)
+
+Color = Tuple[float, ...]
+
+def hex_color(value: str) -> Color:
+    """
+    "#rrggbb" as an RGB tuple in the 0-1 range
+    """
+    value = value.lstrip('#')
+    return tuple(int(value[i:i+2], 16) / 255.0 for i in (0, 2, 4))
+
+class PageCanvas:
+    """
+    Everything drawn on one page, written with a single Shape commit
+    """
+
+    def __init__(self, page: fitz.Page, transform: PageTransform):
+        self.transform = transform
+        self.shape = page.new_shape()
+        # (color, width, pen) -> paths drawn with that style; pen strokes get round caps and joins
+        self._groups: Dict[Tuple[Color, float, bool], List[Tuple[str, Any]]] = {}
+
+    def _add_path(self, color: Color, width: float, path: Tuple[str, Any], pen: bool = False) -> None:
+        self._groups.setdefault((color, width, pen), []).append(path)
+
+    def add_fill(self, fill: Dict[str, Any]) -> None:
+        """
+        An AI suggested fill: its value written just above the detected line
+        """
+        # Convert from detection coordinates to PDF points
+        x = self.transform.to_points(fill['x'])
+        y = self.transform.to_points(fill['y'])
+        font_size = fill.get('fontSize', 12)
+
+        # Position text ABOVE the detected line (matching frontend behavior)
+        # Frontend: y = canvasY - textHeight - padding
+        # We need to position text above the line, not on/below it
+        # PyMuPDF insert_text uses baseline, so we need to:
+        # 1. Subtract to move up from the line
+        # 2. Account for text height
+        y_padding = 2  # Small padding above the line
+        x_offset = 3  # Remove inherent left padding from PyMuPDF rendering
+
+        text_x = x - x_offset  # Remove left padding
+        text_y = y - y_padding  # Position baseline just above the line
+
+        font_kwargs = FONT_MAP.get(fill.get('font', 'Arial'), FONT_MAP['Arial'])
+        self.shape.insert_text(
+            self.transform.point(text_x, text_y),
+            fill.get('value', ''),
+            fontsize=font_size,
+            color=FILL_COLOR,
+            rotate=self.transform.rotation,
+            **font_kwargs
+        )
+
+    def add_element(self, element: Dict[str, Any]) -> None:
+        """
+        A manual drawing element: text, rectangle, circle, line, arrow or pen stroke
+        """
+        transform = self.transform
+        element_type = element.get('type')
+        color = hex_color(element.get('color', '#000000'))
+        stroke_width = element.get('strokeWidth', 2)
+
+        # Drawing elements are in the same coordinate space as detection
+        x = transform.to_points(element['x'])
+        y = transform.to_points(element['y'])
+
+        if element_type == 'text':
+            font_size = element.get('fontSize', 14)
+            self.shape.insert_text(
+                transform.point(x, y + font_size),  # Adjust for baseline
+                element.get('text', ''),
+                fontsize=font_size,
+                color=color,
+                rotate=transform.rotation
+            )
+
+        elif element_type in ('rectangle', 'circle'):
+            width = transform.to_points(element.get('width', 0))
+            height = transform.to_points(element.get('height', 0))
+            rect = transform.rect(x, y, x + width, y + height)
+            # Circles are drawn as the oval inscribed in their box
+            self._add_path(color, stroke_width, ("rect" if element_type == 'rectangle' else "oval", rect))
+
+        elif element_type in ('line', 'arrow'):
+            end_x = transform.to_points(element.get('endX', element['x']))
+            end_y = transform.to_points(element.get('endY', element['y']))
+            self._add_path(color, stroke_width, ("polyline", [transform.point(x, y), transform.point(end_x, end_y)]))
+            if element_type == 'arrow':
+                # Arrowhead: two 10pt barbs at 30 degrees either side of the shaft
+                arrow_length = 10
+                angle = math.atan2(end_y - y, end_x - x)
+                arrow_angle = math.pi / 6
+                barbs = [
+                    transform.point(
+                        end_x - arrow_length * math.cos(angle + side * arrow_angle),
+                        end_y - arrow_length * math.sin(angle + side * arrow_angle)
+                    )
+                    for side in (-1, 1)
+                ]
+                self._add_path(color, stroke_width, ("polyline", [barbs[0], transform.point(end_x, end_y), barbs[1]]))
+
+        elif element_type == 'pen':
+            points = element.get('points', [])
+            if len(points) > 1:
+                self._add_path(color, stroke_width, ("polyline", [
+                    transform.point(transform.to_points(point['x']), transform.to_points(point['y']))
+                    for point in points
+                ]), pen=True)
+
+    def commit(self) -> None:
+        """
+        Write the page's strokes, one style change per group, then its text, in one commit
+        """
+        shape = self.shape
+        for (color, width, pen), paths in self._groups.items():
+            for kind, path in paths:
+                if kind == "polyline":
+                    shape.draw_polyline(path)
+                elif kind == "rect":
+                    shape.draw_rect(path)
+                else:
+                    shape.draw_oval(path)
+            # Round caps and joins keep freehand strokes smooth where segments meet
+            shape.finish(
+                color=color,
+                width=width,
+                lineCap=1 if pen else 0,
+                lineJoin=1 if pen else 0,
+                closePath=False
+            )
+        shape.commit()
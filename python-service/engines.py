@@ -0,0 +1,156 @@
+"""
+Heavy subsystems, loaded lazily and optionally pre-warmed in the background.
+
+Importing torch for CommonForms takes seconds, and OpenCV, PyMuPDF and the
+Tesseract bindings add more. None of that is needed to answer /health, and
+most traffic never reaches /detect-fields, so main.py imports none of them at
+module load. Jobs call require() for the engines they use, and startup kicks
+off prewarm() on a background thread so the usual engines are hot by the time
+traffic arrives without holding up the liveness probe.
+
+Engines:
+    pdf         PyMuPDF
+    detection   OpenCV line/cell detection, the vector engine and the page pool
+    ocr         Tesseract bindings and language data
+    forms       torch and the resident CommonForms model (default inference mode)
+
+ocr and forms are optional: detection degrades to no OCR text without
+Tesseract, and only /detect-fields needs the forms model, so neither holds up
+/ready unless READY_ENGINES names it.
+
+Configuration (environment variables):
+    PREWARM         Engines to load in the background at startup, comma-separated,
+                    or "all"/"none" (default: pdf,detection,ocr)
+    READY_ENGINES   Engines /ready waits for (default: the PREWARM engines that
+                    aren't optional)
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+def _load_pdf() -> None:
+    import fitz
+
+def _load_detection() -> None:
+    import cv2
+    import detection
+    import page_pool
+
+def _load_ocr() -> None:
+    import ocr
+    if ocr.tesserocr is not None:
+        # Initializes this thread's engine, which fails fast on missing language data
+        ocr.get_engine()
+    else:
+        ocr.pytesseract.get_tesseract_version()
+
+def _load_forms() -> None:
+    import form_detector
+    form_detector.get_detector().load()
+
+class Engine:
+    """
+    One lazily loaded subsystem and its load state
+    """
+
+    def __init__(self, name: str, loader: Callable[[], None]):
+        self.name = name
+        self.loader = loader
+        self.state = "unloaded"
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def require(self) -> None:
+        """
+        Load the engine if it isn't loaded yet, waiting out a load already in progress
+        """
+        if self.state == "ready":
+            return
+        with self._lock:
+            if self.state == "ready":
+                return
+            self.state = "loading"
+            start = time.perf_counter()
+            try:
+                self.loader()
+            except Exception as e:
+                # Left retryable: the next require() tries again
+                self.state = "failed"
+                self.error = f"{type(e).__name__}: {str(e)}"
+                raise
+            self.seconds = time.perf_counter() - start
+            self.state = "ready"
+            self.error = None
+            print(f"[engines] {self.name} ready in {self.seconds:.2f}s")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "loadSeconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "error": self.error,
+        }
+
+ENGINES: Dict[str, Engine] = {
+    "pdf": Engine("pdf", _load_pdf),
+    "detection": Engine("detection", _load_detection),
+    "ocr": Engine("ocr", _load_ocr),
+    "forms": Engine("forms", _load_forms),
+}
+
+def parse_engines(value: str) -> List[str]:
+    """
+    Engine names from a comma-separated setting; "all" and "none" are shorthands
+    """
+    value = value.strip().lower()
+    if value == "all":
+        return list(ENGINES)
+    if value in ("", "none"):
+        return []
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown engine(s): {', '.join(unknown)}")
+    return names
+
+# Engines the service can answer without; see the module docstring
+OPTIONAL_ENGINES = ("ocr", "forms")
+
+PREWARM = parse_engines(os.environ.get("PREWARM", "pdf,detection,ocr"))
+READY_ENGINES = parse_engines(os.environ.get(
+    "READY_ENGINES", ",".join(name for name in PREWARM if name not in OPTIONAL_ENGINES)
+))
+
+def require(name: str) -> None:
+    """
+    Make sure an engine is loaded before using it
+    """
+    ENGINES[name].require()
+
+def prewarm(names: Optional[List[str]] = None) -> threading.Thread:
+    """
+    Load engines one after another on a background thread
+    """
+    names = PREWARM if names is None else names
+
+    def run() -> None:
+        for name in names:
+            try:
+                ENGINES[name].require()
+            except Exception as e:
+                print(f"[engines] Pre-warming {name} failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name="engine-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+def status() -> Dict[str, Any]:
+    """
+    Readiness: whether every READY_ENGINES engine is loaded, plus each engine's state
+    """
+    return {
+        "ready": all(ENGINES[name].state == "ready" for name in READY_ENGINES),
+        "required": READY_ENGINES,
+        "engines": {name: engine.status() for name, engine in ENGINES.items()},
+    }
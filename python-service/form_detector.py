@@ -0,0 +1,382 @@
+"""
+CommonForms widget detection with a resident, batched model.
+
+commonforms.prepare_form() constructs a new detector (loading the model
+weights) on every call and only writes a new PDF. Here the detector is loaded
+once per process and kept warm, pages are rendered with PyMuPDF straight from
+the PdfSource, and every inference goes through one batching thread: pages
+queued within FORM_BATCH_WINDOW_MS of each other, whether from one document or
+several concurrent requests, run through the model together in batches of up
+to FORM_BATCH_SIZE.
+
+Detected widgets are returned as dicts in the 144 DPI pixel space used by the
+other detectors, with normalized boxes kept alongside for writing form fields.
+
+Two inference modes can be resident side by side, each with its own model
+instance and batching thread:
+
+- "standard": the model as CommonForms ships it, pages rendered at FORM_RENDER_DPI.
+- "fast": reduced-precision CPU inference, which is its only real saving.
+  FFDetr's linear layers (most of its transformer compute) get int8 dynamic
+  quantization, and loading fails if they can't be quantized; FFDNet models
+  use their ONNX CPU export. Pages are rendered at FORM_FAST_RENDER_DPI,
+  which makes rendering cheaper but not inference: every model resizes its
+  input to a fixed size.
+
+Model input size is out of our hands except for FFDNet in standard mode,
+which is fed at FORM_IMAGE_SIZE. CommonForms runs FFDNet's ONNX export at
+1216 whatever it is given, and FFDetr discards the size it is given and
+RF-DETR resizes every page to its own resolution.
+
+Use benchmarks/form_accuracy.py to measure what "fast" costs in agreement
+with "standard" before switching a deployment over.
+
+Configuration (environment variables):
+    FORM_MODEL             CommonForms model name or weights path (default: FFDetr)
+    FORM_INFERENCE_MODE    Default mode, "standard" or "fast" (default: standard);
+                           requests can override it with inferenceMode
+    FORM_RENDER_DPI        Render DPI in standard mode (default: 144, as CommonForms renders)
+    FORM_FAST_RENDER_DPI   Render DPI in fast mode (default: 96)
+    FORM_DEVICE            Device for inference (default: cpu)
+    FORM_CONFIDENCE        Detection confidence threshold (default: 0.4)
+    FORM_IMAGE_SIZE        FFDNet model input size in standard mode (default: 1024;
+                           fast mode and FFDetr ignore it)
+    FORM_BATCH_SIZE        Maximum pages per inference batch (default: 4)
+    FORM_BATCH_WINDOW_MS   Wait for more pages before running a partial batch (default: 10)
+    FORM_TORCH_THREADS     torch.set_num_threads for inference (default: CPU count)
+"""
+import collections
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+import metrics
+from document_io import PdfSource
+
+FORM_MODEL = os.environ.get("FORM_MODEL", "FFDetr")
+FORM_INFERENCE_MODE = os.environ.get("FORM_INFERENCE_MODE", "standard").lower()
+FORM_RENDER_DPI = int(os.environ.get("FORM_RENDER_DPI", 144))
+FORM_FAST_RENDER_DPI = int(os.environ.get("FORM_FAST_RENDER_DPI", 96))
+FORM_DEVICE = os.environ.get("FORM_DEVICE", "cpu")
+FORM_CONFIDENCE = float(os.environ.get("FORM_CONFIDENCE", 0.4))
+FORM_IMAGE_SIZE = int(os.environ.get("FORM_IMAGE_SIZE", 1024))
+
+# Input size CommonForms hard-codes for FFDNet's ONNX export (fast mode)
+FFDNET_ONNX_IMAGE_SIZE = 1216
+FORM_BATCH_SIZE = int(os.environ.get("FORM_BATCH_SIZE", 4))
+FORM_BATCH_WINDOW_MS = float(os.environ.get("FORM_BATCH_WINDOW_MS", 10))
+FORM_TORCH_THREADS = int(os.environ.get("FORM_TORCH_THREADS", os.cpu_count() or 1))
+
+# CommonForms widget classes and the field type each is reported as
+WIDGET_TYPES = {
+    "TextBox": "text",
+    "ChoiceButton": "checkbox",
+    "Signature": "signature",
+}
+
+class FormDetector:
+    """
+    A CommonForms detector loaded once and fed by a single batching thread
+    """
+
+    def __init__(
+        self,
+        model: str = FORM_MODEL,
+        fast: bool = False,
+        quantize: bool = False,
+        render_dpi: int = FORM_RENDER_DPI,
+        device: str = FORM_DEVICE,
+        confidence: float = FORM_CONFIDENCE,
+        image_size: int = FORM_IMAGE_SIZE,
+        batch_size: int = FORM_BATCH_SIZE,
+        batch_window_ms: float = FORM_BATCH_WINDOW_MS,
+        torch_threads: int = FORM_TORCH_THREADS
+    ):
+        self.model = model
+        self.fast = fast
+        self.quantize = quantize
+        self.render_dpi = render_dpi
+        self.device = device
+        self.confidence = confidence
+        self.image_size = image_size
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window_ms / 1000
+        self.torch_threads = max(1, torch_threads)
+
+        self._detector: Any = None
+        self._load_lock = threading.Lock()
+        self._load_seconds: Optional[float] = None
+        self._precision = "fp32"
+
+        self._queue: "queue.Queue[Tuple[Image.Image, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+        self._batches = 0
+        self._pages = 0
+        self._inference_seconds = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._detector is not None
+
+    @property
+    def effective_image_size(self) -> Optional[int]:
+        """
+        The input size the model is actually fed, or None when it resizes to its own resolution (FFDetr)
+        """
+        if "FFDNET" not in self.model.upper():
+            return None
+        return FFDNET_ONNX_IMAGE_SIZE if self.fast else self.image_size
+
+    def load(self) -> Any:
+        """
+        Load the model if it isn't resident yet and return the detector
+        """
+        with self._load_lock:
+            if self._detector is None:
+                start = time.perf_counter()
+                import torch
+                from commonforms.inference import FFDetrDetector, FFDNetDetector
+
+                torch.set_num_threads(self.torch_threads)
+                if "FFDNET" in self.model.upper():
+                    self._detector = FFDNetDetector(self.model, device=self.device, fast=self.fast)
+                    if self.fast:
+                        self._precision = "onnx"
+                else:
+                    self._detector = FFDetrDetector(self.model, device=self.device)
+                    if "FORM_IMAGE_SIZE" in os.environ:
+                        print(f"[form-detector] {self.model} ignores FORM_IMAGE_SIZE; pages are fed at the model's own resolution")
+                    if self.quantize:
+                        _quantize_ffdetr(self._detector)
+                        self._precision = "int8-dynamic"
+                self._load_seconds = time.perf_counter() - start
+                print(f"[form-detector] Loaded {self.model} ({self._precision}) in {self._load_seconds:.2f}s ({self.torch_threads} torch threads)")
+            return self._detector
+
+    def _infer(self, images: List[Image.Image]) -> List[List[Any]]:
+        """
+        Run one batch through the model, returning CommonForms widgets per image
+        """
+        from commonforms.inference import FFDetrDetector
+        from commonforms.utils import Page
+
+        detector = self.load()
+        pages = [Page(image=image, width=image.width, height=image.height) for image in images]
+        if isinstance(detector, FFDetrDetector):
+            # A batch_size equal to the page count keeps predict() returning one result per page
+            widgets = detector.extract_widgets(
+                pages, confidence=self.confidence, image_size=self.image_size, batch_size=len(pages)
+            )
+        else:
+            widgets = detector.extract_widgets(pages, confidence=self.confidence, image_size=self.image_size)
+        # Pages without detections may be missing from the result
+        return [widgets.get(index, []) for index in range(len(pages))]
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        # Window is over, but pages already queued still join this batch
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Skip pages whose request already went away
+            batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                start = time.perf_counter()
+                results = self._infer([image for image, _ in batch])
+                self._inference_seconds += time.perf_counter() - start
+                self._batches += 1
+                self._pages += len(batch)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), widgets in zip(batch, results):
+                future.set_result(widgets)
+
+    def submit(self, image: Image.Image) -> Future:
+        """
+        Queue a page image for batched inference; the future resolves to its widgets
+        """
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._batch_loop, name="form-detector", daemon=True)
+                self._thread.start()
+        future: Future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def detect(self, source: PdfSource) -> Tuple[int, List[List[Dict[str, Any]]]]:
+        """
+        Detect form widgets on every page of a document.
+
+        Pages are rendered and queued a couple of batches ahead of inference,
+        so memory stays bounded on long documents.
+
+        Returns:
+            (total_pages, widgets) where widgets[i] lists the fields found on page i
+        """
+        import raster
+
+        lookahead = self.batch_size * 2
+        results: List[List[Dict[str, Any]]] = []
+        pending: Deque[Tuple[Future, Tuple[int, int]]] = collections.deque()
+
+        def collect() -> None:
+            future, page_size = pending.popleft()
+            # Batches are shared across requests, so this is the time this request waited on inference
+            with metrics.stage("form_detection"):
+                widgets = future.result()
+            results.append(self._to_fields(widgets, len(results), page_size))
+
+        # Field pixels are reported at 144 DPI whatever the model was fed
+        to_detection = raster.DETECTION_DPI / self.render_dpi
+
+        with source.open() as document:
+            total_pages = len(document)
+            try:
+                for page_num in range(total_pages):
+                    pixmap = raster.render(document[page_num], self.render_dpi, "rgb").pixmap
+                    image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+                    pending.append((self.submit(image), (image.width * to_detection, image.height * to_detection)))
+                    if len(pending) >= lookahead:
+                        collect()
+                while pending:
+                    collect()
+            finally:
+                for future, _ in pending:
+                    future.cancel()
+        metrics.record_pages(total_pages)
+        return total_pages, results
+
+    @staticmethod
+    def _to_fields(widgets: List[Any], page_num: int, page_size: Tuple[float, float]) -> List[Dict[str, Any]]:
+        width, height = page_size
+        fields = []
+        for index, widget in enumerate(widgets):
+            box = widget.bounding_box
+            fields.append({
+                "type": WIDGET_TYPES.get(widget.widget_type, widget.widget_type),
+                "widgetType": widget.widget_type,
+                # Same naming prepare_form uses for the AcroForm fields it writes
+                "name": f"{widget.widget_type.lower()}_{page_num}_{index}",
+                "page": page_num + 1,
+                "x": int(round(box.x0 * width)),
+                "y": int(round(box.y0 * height)),
+                "width": int(round((box.x1 - box.x0) * width)),
+                "height": int(round((box.y1 - box.y0) * height)),
+                # Fractions of the page, as CommonForms uses for writing fields
+                "box": {"x0": float(box.x0), "y0": float(box.y0), "x1": float(box.x1), "y1": float(box.y1)},
+            })
+        return fields
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Model residency and batching counters for health reporting
+        """
+        return {
+            "model": self.model,
+            "precision": self._precision,
+            "renderDpi": self.render_dpi,
+            "imageSize": self.effective_image_size,
+            "loaded": self.loaded,
+            "loadSeconds": round(self._load_seconds, 3) if self._load_seconds is not None else None,
+            "torchThreads": self.torch_threads,
+            "batchSize": self.batch_size,
+            "batches": self._batches,
+            "pages": self._pages,
+            "meanBatchSize": self._pages / self._batches if self._batches else 0.0,
+            "inferenceSeconds": round(self._inference_seconds, 3),
+        }
+
+def write_form(input_path: str, output_path: str, fields_by_page: List[List[Dict[str, Any]]], multiline: bool = False) -> None:
+    """
+    Write detected widgets into input_path as AcroForm fields, as prepare_form does
+    """
+    from commonforms.form_creator import PyPdfFormCreator
+    from commonforms.utils import BoundingBox
+
+    writer = PyPdfFormCreator(input_path)
+    writer.clear_existing_fields()
+    for page_num, fields in enumerate(fields_by_page):
+        for field in fields:
+            bounding_box = BoundingBox(**field["box"])
+            if field["widgetType"] == "ChoiceButton":
+                writer.add_checkbox(field["name"], page_num, bounding_box)
+            elif field["widgetType"] == "TextBox":
+                writer.add_text_box(field["name"], page_num, bounding_box, multiline=multiline)
+            else:
+                writer.add_text_box(field["name"], page_num, bounding_box)
+    writer.save(output_path)
+    writer.close()
+
+def _quantize_ffdetr(detector: Any) -> None:
+    """
+    Swap FFDetr's torch module for an int8 dynamically quantized copy.
+
+    Raises RuntimeError if the module or its linear layers can't be found, so
+    fast mode never runs at full precision while reporting int8.
+    """
+    import torch
+
+    # FFDetrDetector.model is an RF-DETR wrapper whose .model.model is the nn.Module predict() runs
+    wrapper = getattr(getattr(detector, "model", None), "model", None)
+    module = getattr(wrapper, "model", None)
+    if not isinstance(module, torch.nn.Module):
+        raise RuntimeError(f"Can't quantize FFDetr: expected a torch module at detector.model.model.model, found {type(module).__name__}")
+    quantized = torch.ao.quantization.quantize_dynamic(module.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    converted = sum(1 for layer in quantized.modules() if isinstance(layer, torch.ao.nn.quantized.dynamic.Linear))
+    if not converted:
+        raise RuntimeError("Can't quantize FFDetr: no linear layers were converted to int8")
+    wrapper.model = quantized
+    print(f"[form-detector] Quantized {converted} linear layers to int8")
+
+# Constructor arguments for each inference mode
+INFERENCE_MODES: Dict[str, Dict[str, Any]] = {
+    "standard": {},
+    "fast": {
+        "fast": True,
+        "quantize": True,
+        "render_dpi": FORM_FAST_RENDER_DPI,
+    },
+}
+
+_detectors: Dict[str, FormDetector] = {}
+_detector_lock = threading.Lock()
+
+def get_detector(mode: Optional[str] = None) -> FormDetector:
+    """
+    Return the process-wide form detector for an inference mode (default: FORM_INFERENCE_MODE)
+    """
+    mode = mode or FORM_INFERENCE_MODE
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown form inference mode: {mode}")
+    with _detector_lock:
+        if mode not in _detectors:
+            _detectors[mode] = FormDetector(**INFERENCE_MODES[mode])
+        return _detectors[mode]
+
+def stats() -> Dict[str, Any]:
+    """
+    Per-mode detector stats for the modes that have been used
+    """
+    with _detector_lock:
+        detectors = dict(_detectors)
+    return {"defaultMode": FORM_INFERENCE_MODE, "modes": {mode: detector.stats() for mode, detector in detectors.items()}}
@@ -0,0 +1,278 @@
+"""
+Shared async HTTP client for downloading PDFs from R2.
+
+One httpx.AsyncClient keeps a pool of keep-alive connections to the R2 host,
+so back-to-back requests for the same or neighbouring documents skip the TCP
+and TLS handshakes. Bodies are streamed chunk by chunk into a caller-supplied
+sink (a spool buffer or cache file) and never read whole into memory.
+
+- Connect and read timeouts are configurable, and fetch_sync() also enforces
+  a total deadline so a server trickling the body can't hold a worker slot
+  indefinitely.
+- The maximum document size is enforced from Content-Length up front and
+  again while streaming, so an oversized or lying response is cut off early.
+- Connection errors, timeouts and 429/502/503/504 responses are retried with
+  exponential backoff and jitter. A failed attempt's partial body is discarded.
+- Per-fetch timing and byte counts are returned to the caller and rolled up
+  into counters for /health.
+
+The blocking download code runs on worker threads, so the client lives on its
+own event loop thread and fetch_sync() submits work to it.
+
+Configuration (environment variables):
+    FETCH_CONNECT_TIMEOUT    Seconds to establish a connection (default: 5)
+    FETCH_READ_TIMEOUT       Seconds to wait for each chunk of the body (default: 30)
+    FETCH_TOTAL_TIMEOUT      Seconds a whole fetch may take, retries included (default: 120)
+    FETCH_MAX_BYTES          Largest document accepted (default: 100 MiB)
+    FETCH_RETRIES            Retries after the first attempt (default: 2)
+    FETCH_BACKOFF            Base backoff in seconds, doubled per retry (default: 0.5)
+    FETCH_MAX_CONNECTIONS    Connection pool size (default: 20)
+"""
+import asyncio
+import concurrent.futures
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Protocol
+
+import httpx
+from fastapi import HTTPException
+
+# Browser User-Agent so R2/Cloudflare bot detection doesn't reject the download
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+CHUNK_SIZE = 1024 * 1024
+
+FETCH_CONNECT_TIMEOUT = float(os.environ.get("FETCH_CONNECT_TIMEOUT", 5))
+FETCH_READ_TIMEOUT = float(os.environ.get("FETCH_READ_TIMEOUT", 30))
+FETCH_TOTAL_TIMEOUT = float(os.environ.get("FETCH_TOTAL_TIMEOUT", 120))
+FETCH_MAX_BYTES = int(os.environ.get("FETCH_MAX_BYTES", 100 * 1024 * 1024))
+FETCH_RETRIES = int(os.environ.get("FETCH_RETRIES", 2))
+FETCH_BACKOFF = float(os.environ.get("FETCH_BACKOFF", 0.5))
+FETCH_MAX_CONNECTIONS = int(os.environ.get("FETCH_MAX_CONNECTIONS", 20))
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+class Sink(Protocol):
+    def write(self, chunk: bytes) -> None: ...
+    def discard(self) -> None: ...
+
+class DocumentTooLargeError(HTTPException):
+    def __init__(self, limit: int):
+        super().__init__(
+            status_code=413,
+            detail=f"Document exceeds the {limit}-byte download limit"
+        )
+
+class DownloadTimeoutError(HTTPException):
+    def __init__(self, timeout: float):
+        super().__init__(
+            status_code=504,
+            detail=f"Document download did not finish within {timeout:g}s"
+        )
+
+class FetchResult:
+    """
+    Outcome of one fetch: final status, response headers, the filled sink and timings
+    """
+
+    def __init__(self, status: int, headers: httpx.Headers, sink: Optional[Sink], size: int, elapsed: float, attempts: int):
+        self.status = status
+        self.headers = headers
+        self.sink = sink
+        self.size = size
+        self.elapsed = elapsed
+        self.attempts = attempts
+
+class _RetryableStatus(Exception):
+    pass
+
+class PdfFetcher:
+    """
+    Pooled, streaming, retrying HTTP GET client
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = FETCH_CONNECT_TIMEOUT,
+        read_timeout: float = FETCH_READ_TIMEOUT,
+        max_bytes: int = FETCH_MAX_BYTES,
+        retries: int = FETCH_RETRIES,
+        backoff: float = FETCH_BACKOFF,
+        max_connections: int = FETCH_MAX_CONNECTIONS,
+        total_timeout: float = FETCH_TOTAL_TIMEOUT
+    ):
+        self.max_bytes = max_bytes
+        self.total_timeout = total_timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+
+        self._counters_lock = threading.Lock()
+        self._counters = {
+            "fetches": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "tooLarge": 0,
+            "notModified": 0,
+            "bytes": 0,
+            "seconds": 0.0,
+        }
+
+    def _count(self, **amounts: Any) -> None:
+        with self._counters_lock:
+            for name, amount in amounts.items():
+                self._counters[name] += amount
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=self._limits,
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True
+            )
+        return self._client
+
+    async def fetch(
+        self,
+        url: str,
+        open_sink: Callable[[], Sink],
+        headers: Optional[Dict[str, str]] = None
+    ) -> FetchResult:
+        """
+        GET url and stream its body into a sink from open_sink().
+
+        A 304 response returns without opening a sink. Other non-2xx responses
+        raise httpx.HTTPStatusError; oversized bodies raise DocumentTooLargeError.
+        """
+        client = self._get_client()
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._count(attempts=1)
+            sink: Optional[Sink] = None
+            size = 0
+            try:
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code in RETRYABLE_STATUS and attempt <= self.retries:
+                        raise _RetryableStatus(f"HTTP {response.status_code}")
+                    if response.status_code == 304:
+                        self._count(fetches=1, notModified=1, seconds=time.perf_counter() - start)
+                        return FetchResult(304, response.headers, None, 0, time.perf_counter() - start, attempt)
+                    response.raise_for_status()
+
+                    declared = response.headers.get("Content-Length")
+                    if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+                        raise DocumentTooLargeError(self.max_bytes)
+
+                    sink = open_sink()
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise DocumentTooLargeError(self.max_bytes)
+                        sink.write(chunk)
+
+                elapsed = time.perf_counter() - start
+                self._count(fetches=1, bytes=size, seconds=elapsed)
+                print(f"[fetch] {size} bytes in {elapsed * 1000:.0f}ms ({attempt} attempt{'s' if attempt > 1 else ''})")
+                return FetchResult(response.status_code, response.headers, sink, size, elapsed, attempt)
+
+            except (httpx.TransportError, _RetryableStatus) as e:
+                if sink is not None:
+                    sink.discard()
+                if isinstance(e, httpx.TimeoutException):
+                    self._count(timeouts=1)
+                if attempt > self.retries:
+                    self._count(failures=1)
+                    raise
+                delay = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                print(f"[fetch] {type(e).__name__}: {str(e) or 'no detail'}; retry {attempt}/{self.retries} in {delay:.2f}s")
+                self._count(retries=1)
+                await asyncio.sleep(delay)
+
+            except BaseException as e:
+                if sink is not None:
+                    sink.discard()
+                if isinstance(e, DocumentTooLargeError):
+                    self._count(tooLarge=1)
+                self._count(failures=1)
+                raise
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        # Started lazily so importing this module doesn't spawn a thread
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="pdf-fetch-loop",
+                    daemon=True
+                )
+                self._loop_thread.start()
+            return self._loop
+
+    def fetch_sync(
+        self,
+        url: str,
+        open_sink: Callable[[], Sink],
+        headers: Optional[Dict[str, str]] = None
+    ) -> FetchResult:
+        """
+        Blocking fetch() for worker threads, run on the client's own event loop.
+
+        Raises DownloadTimeoutError (504) if the fetch, retries included, takes longer than total_timeout.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.fetch(url, open_sink, headers), self._get_loop())
+        try:
+            return future.result(timeout=self.total_timeout)
+        except concurrent.futures.TimeoutError:
+            # Cancelling the task discards its partial sink and counts the failure
+            future.cancel()
+            self._count(timeouts=1)
+            print(f"[fetch] Gave up after {self.total_timeout:g}s: {url}")
+            raise DownloadTimeoutError(self.total_timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters plus mean latency across completed fetches
+        """
+        with self._counters_lock:
+            counters = dict(self._counters)
+        fetches = counters["fetches"]
+        counters["meanMs"] = counters["seconds"] * 1000 / fetches if fetches else 0.0
+        counters["seconds"] = round(counters["seconds"], 3)
+        return counters
+
+    def shutdown(self) -> None:
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(timeout=5)
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+
+_fetcher: Optional[PdfFetcher] = None
+_fetcher_lock = threading.Lock()
+
+def get_fetcher() -> PdfFetcher:
+    """
+    Return the process-wide fetcher
+    """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = PdfFetcher()
+        return _fetcher
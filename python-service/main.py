@@ -1,18 +1,46 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
-import tempfile
 import os
-import urllib.request
-from commonforms import prepare_form
-import cv2
-import numpy as np
-import fitz  # PyMuPDF
-from typing import List, Dict, Any
-import pytesseract
-from PIL import Image
+import sys
+import json
+import base64
+import itertools
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Literal, Optional, Tuple
+# PyMuPDF, OpenCV, Tesseract and torch load on first use (see engines.py) so startup stays fast
+import engines
+import metrics
+import profiling
+from workers import pool_from_env
+from download_cache import download_document, get_cache
+from http_fetch import get_fetcher
+from document_io import PdfSource, scratch_path
+import result_cache
+import tuning
+import form_detector
+from pdf_response import get_rendered_cache, pdf_response
+
+if TYPE_CHECKING:
+    import fitz  # PyMuPDF
+
+class TimedJSONResponse(JSONResponse):
+    """
+    JSONResponse that records serialization time as the "json" metrics stage
+    """
+
+    def render(self, content: Any) -> bytes:
+        with metrics.stage("json"):
+            return super().render(content)
+
+app = FastAPI(title="CommonForms API", default_response_class=TimedJSONResponse)
 
-app = FastAPI(title="CommonForms API")
+# Blocking PDF/CV/OCR work runs here so the event loop (and /health) stays responsive
+worker_pool = pool_from_env()
+metrics.register_worker_pool(worker_pool.stats)
+
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Enable CORS for Vercel frontend
 app.add_middleware(
@@ -21,6 +49,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browsers read range and result metadata on binary PDF responses
+    expose_headers=[
+        "Accept-Ranges",
+        "Content-Range",
+        "Content-Length",
+        "ETag",
+        "X-Fields-Annotated",
+        "X-Fills-Rendered",
+        "X-Elements-Rendered",
+        "X-Profile-Id",
+        "X-Result-Cache",
+        "X-Result-Cache-Pages",
+    ],
 )
 
 class DetectFieldsRequest(BaseModel):
@@ -32,19 +73,78 @@ class DetectFieldsRequest(BaseModel):
     minLineLength: int = 100
     maxLineGap: int = 7
     minWidth: int = 60
+    # Detection engine: "auto" (vector for born-digital pages, raster for scans), "vector" or "raster"
+    engine: Optional[Literal["auto", "vector", "raster"]] = None
+    # Raster OCR scope when only labels are needed: "roi" (bands around fields) or "full" page
+    ocrMode: Optional[Literal["roi", "full"]] = None
+    # Stream per-page records as each page finishes instead of one JSON body:
+    # "ndjson" (application/x-ndjson) or "sse" (text/event-stream)
+    stream: Optional[Literal["ndjson", "sse"]] = None
+    # CommonForms inference for /detect-fields: "standard" or reduced-precision "fast"
+    inferenceMode: Optional[Literal["standard", "fast"]] = None
+
+class AnalyzeRequest(DetectFieldsRequest):
+    # Result sets to compute; every set shares one render and OCR pass per page
+    include: List[Literal["lines", "cells", "text"]] = ["lines", "cells", "text"]
+
+class TuningSessionRequest(BaseModel):
+    pdfUrl: str
+    # Detection engine: "auto" (vector for born-digital pages, raster for scans), "vector" or "raster"
+    engine: Optional[Literal["auto", "vector", "raster"]] = None
+
+class LineParams(BaseModel):
+    # Line detection parameters to try, as on DetectFieldsRequest
+    cannyLow: int = 115
+    cannyHigh: int = 175
+    houghThreshold: int = 150
+    minLineLength: int = 100
+    maxLineGap: int = 7
+    minWidth: int = 60
+
+class TuningRunRequest(LineParams):
+    # 1-based pages to run on (default: every page)
+    pages: Optional[List[int]] = None
+
+class LineParamGrid(BaseModel):
+    # Values to try per parameter; parameters left out stay at their defaults
+    cannyLow: Optional[List[int]] = None
+    cannyHigh: Optional[List[int]] = None
+    houghThreshold: Optional[List[int]] = None
+    minLineLength: Optional[List[int]] = None
+    maxLineGap: Optional[List[int]] = None
+    minWidth: Optional[List[int]] = None
+
+class LineSweepRequest(BaseModel):
+    pdfUrl: str
+    # Every combination of the grid's values, followed by any explicit paramSets
+    grid: Optional[LineParamGrid] = None
+    paramSets: List[LineParams] = []
+    # 1-based pages to sweep (default: every page)
+    pages: Optional[List[int]] = None
+    # Detection engine: "auto" (vector for born-digital pages, raster for scans), "vector" or "raster"
+    engine: Optional[Literal["auto", "vector", "raster"]] = None
+    # Label fields (OCRs raster pages once); counts don't need it
+    labels: bool = False
+    # Return each parameter set's fields, not just its counts
+    includeFields: bool = True
 
 class FillFormRequest(BaseModel):
     pdfUrl: str
     context: dict = {}
+    inferenceMode: Optional[Literal["standard", "fast"]] = None
 
 class AnnotatePdfRequest(BaseModel):
     pdfUrl: str
     fields: List[Dict[str, Any]]
+    # "json" returns the PDF base64-encoded in a JSON body; "pdf" streams application/pdf bytes
+    output: Literal["json", "pdf"] = "json"
 
 class GenerateFilledPdfRequest(BaseModel):
     pdfUrl: str
     suggestedFills: List[Dict[str, Any]] = []
     drawingElements: List[Dict[str, Any]] = []
+    # "json" returns the PDF base64-encoded in a JSON body; "pdf" streams application/pdf bytes
+    output: Literal["json", "pdf"] = "json"
 
 @app.get("/")
 async def root():
@@ -53,9 +153,12 @@ async def root():
         "status": "running",
         "endpoints": {
             "detect": "/detect-fields",
+            "analyze": "/analyze",
             "fill": "/fill-form",
             "detectFillableAreas": "/detect-fillable-areas",
             "detectTableCells": "/detect-table-cells",
+            "tuningSessions": "/tuning-sessions",
+            "lineSweep": "/detect-fillable-areas/sweep",
             "annotatePdf": "/annotate-pdf",
             "generateFilledPdf": "/generate-filled-pdf"
         }
@@ -63,300 +166,409 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    cache = get_cache()
+    results = result_cache.get_cache()
+    return {
+        "status": "healthy",
+        "workers": worker_pool.stats(),
+        "downloadCache": cache.stats() if cache is not None else None,
+        "resultCache": results.stats() if results is not None else None,
+        "tuningSessions": tuning.get_sessions().stats(),
+        "renderedPdfCache": get_rendered_cache().stats(),
+        "fetch": get_fetcher().stats(),
+        "formDetector": form_detector.stats(),
+    }
 
-@app.post("/detect-fields")
-async def detect_fields(request: DetectFieldsRequest):
+@app.get("/ready")
+async def ready():
     """
-    Detect form fields in a PDF using CommonForms
+    Readiness: 200 once the READY_ENGINES subsystems are loaded, 503 until then
     """
-    try:
-        print(f"[detect-fields] Attempting to download PDF from: {request.pdfUrl}")
-        # Download the PDF from R2 with proper headers to avoid Cloudflare bot detection
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_input:
-            try:
-                req = urllib.request.Request(
-                    request.pdfUrl,
-                    headers={
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                    }
-                )
-                with urllib.request.urlopen(req) as response:
-                    temp_input.write(response.read())
-            except Exception as download_error:
-                print(f"[detect-fields] Download failed: {type(download_error).__name__}: {str(download_error)}")
-                raise
-            temp_input_path = temp_input.name
-
-        # Create temporary output file
-        temp_output = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-        temp_output_path = temp_output.name
-        temp_output.close()
+    status = engines.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
 
-        try:
-            # Use CommonForms to detect and add form fields
-            # Using default parameters as per CommonForms 0.2.1 API
-            prepare_form(
-                temp_input_path,
-                temp_output_path
-            )
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, throughput, bytes, queue depth and errors
+    """
+    return Response(content=metrics.exposition(), media_type=metrics.CONTENT_TYPE)
 
-            # Read the output PDF
-            with open(temp_output_path, 'rb') as f:
-                output_pdf_data = f.read()
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: Literal["json", "pstats"] = "json"):
+    """
+    A stored request profile: the JSON summary, or the raw pstats dump with ?format=pstats
+    """
+    path = profiling.profile_path(profile_id, ".prof" if format == "pstats" else ".json") if profiling.PROFILING_ENABLED else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    return FileResponse(path, media_type="application/json")
+
+@app.on_event("startup")
+async def prewarm_engines():
+    # Background only: /health answers right away while torch and the models load
+    engines.prewarm()
+
+@app.on_event("shutdown")
+async def shutdown_worker_pool():
+    worker_pool.shutdown()
+    tuning.get_sessions().close_all()
+    # Only shut down the page pool if a job ever imported it
+    page_pool = sys.modules.get("page_pool")
+    if page_pool is not None:
+        page_pool.shutdown()
+    get_fetcher().shutdown()
+
+def _form_detector(mode: Optional[str]) -> "form_detector.FormDetector":
+    # The forms engine is the default mode's model; other modes load on their own first use
+    if (mode or form_detector.FORM_INFERENCE_MODE) == form_detector.FORM_INFERENCE_MODE:
+        engines.require("forms")
+    return form_detector.get_detector(mode)
+
+def _detect_fields_job(request: DetectFieldsRequest) -> Dict[str, Any]:
+    """
+    Blocking body of /detect-fields, run on the worker pool
+    """
+    print(f"[detect-fields] Attempting to download PDF from: {request.pdfUrl}")
+    # Download the PDF from R2 (served from the shared download cache when possible)
+    try:
+        source = download_document(request.pdfUrl)
+    except Exception as download_error:
+        print(f"[detect-fields] Download failed: {type(download_error).__name__}: {str(download_error)}")
+        raise
 
-            # TODO: Upload the processed PDF back to R2
-            # For now, return success with metadata
+    with source:
+        # CommonForms widget detection on the resident model, batched with other requests' pages
+        detector = _form_detector(request.inferenceMode)
+        total_pages, fields_by_page = detector.detect(source)
 
-            return {
-                "success": True,
-                "message": "Form fields detected successfully",
-                "outputSize": len(output_pdf_data),
-                "fieldsDetected": True
-            }
+    all_fields = [field for fields in fields_by_page for field in fields]
+    print(f"[detect-fields] Detected {len(all_fields)} widgets across {total_pages} pages")
 
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_input_path):
-                os.unlink(temp_input_path)
-            if os.path.exists(temp_output_path):
-                os.unlink(temp_output_path)
+    return {
+        "success": True,
+        "message": "Form fields detected successfully",
+        "inferenceMode": request.inferenceMode or form_detector.FORM_INFERENCE_MODE,
+        "totalPages": total_pages,
+        "fieldsDetected": len(all_fields),
+        "fields": all_fields,
+        "summary": {
+            "totalText": sum(1 for f in all_fields if f["type"] == "text"),
+            "totalCheckboxes": sum(1 for f in all_fields if f["type"] == "checkbox"),
+            "totalSignatures": sum(1 for f in all_fields if f["type"] == "signature"),
+        }
+    }
 
+@app.post("/detect-fields")
+async def detect_fields(request: DetectFieldsRequest):
+    """
+    Detect form fields in a PDF using CommonForms
+    """
+    try:
+        return await worker_pool.run(_detect_fields_job, request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Form field detection failed: {str(e)}"
         )
 
+def _fill_form_job(request: FillFormRequest) -> Dict[str, Any]:
+    """
+    Blocking body of /fill-form, run on the worker pool
+    """
+    # Download the PDF from R2 (served from the shared download cache when possible)
+    with download_document(request.pdfUrl) as source, scratch_path() as output_path:
+        # Use CommonForms to detect and add form fields
+        _, fields_by_page = _form_detector(request.inferenceMode).detect(source)
+        form_detector.write_form(source.path(), output_path, fields_by_page)
+
+        # TODO: Extract field names and use AI to generate values
+        # TODO: Fill the form with AI-generated values
+
+        return {
+            "success": True,
+            "message": "Form prepared with detected fields",
+            "outputSize": os.path.getsize(output_path),
+            "note": "AI-powered filling coming in next iteration"
+        }
+
 @app.post("/fill-form")
 async def fill_form(request: FillFormRequest):
     """
     Fill form fields in a PDF using AI
     """
     try:
-        # Download the PDF from R2 with proper headers
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_input:
-            req = urllib.request.Request(
-                request.pdfUrl,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                }
-            )
-            with urllib.request.urlopen(req) as response:
-                temp_input.write(response.read())
-            temp_input_path = temp_input.name
-
-        # Create temporary output file
-        temp_output = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-        temp_output_path = temp_output.name
-        temp_output.close()
-
-        try:
-            # Use CommonForms to detect and add form fields
-            prepare_form(
-                temp_input_path,
-                temp_output_path
-            )
-
-            # Read the output PDF
-            with open(temp_output_path, 'rb') as f:
-                output_pdf_data = f.read()
-
-            # TODO: Extract field names and use AI to generate values
-            # TODO: Fill the form with AI-generated values
-
-            return {
-                "success": True,
-                "message": "Form prepared with detected fields",
-                "outputSize": len(output_pdf_data),
-                "note": "AI-powered filling coming in next iteration"
-            }
-
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_input_path):
-                os.unlink(temp_input_path)
-            if os.path.exists(temp_output_path):
-                os.unlink(temp_output_path)
-
+        return await worker_pool.run(_fill_form_job, request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Form filling failed: {str(e)}"
         )
 
-def detect_horizontal_lines(
-    image: np.ndarray,
-    canny_low: int = 115,
-    canny_high: int = 175,
-    hough_threshold: int = 150,
-    min_line_length: int = 100,
-    max_line_gap: int = 7,
-    min_width: int = 60
-) -> List[Dict[str, Any]]:
+def _line_params(request: Any) -> Dict[str, Any]:
     """
-    Detect horizontal lines that could be fillable underscores
-    Parameters can be adjusted for tuning detection sensitivity
+    Map a request's line detection tuning fields onto page task parameters
     """
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    # Canny edge detection with configurable thresholds
-    edges = cv2.Canny(gray, canny_low, canny_high, apertureSize=3)
-
-    # Detect lines using HoughLinesP with configurable parameters
-    lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=hough_threshold,
-                           minLineLength=min_line_length, maxLineGap=max_line_gap)
-
-    horizontal_lines = []
-    if lines is not None:
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
-            # Check if line is roughly horizontal and meets minimum width
-            if abs(y2 - y1) < 10 and abs(x2 - x1) > min_width:
-                horizontal_lines.append({
-                    "type": "line",
-                    "x": int(min(x1, x2)),
-                    "y": int(min(y1, y2)),
-                    "width": int(abs(x2 - x1)),
-                    "height": 20
-                })
-
-    # Apply collision detection to remove overlapping lines
-    horizontal_lines = remove_overlapping_lines(horizontal_lines)
-
-    return horizontal_lines
+    return {
+        "canny_low": request.cannyLow,
+        "canny_high": request.cannyHigh,
+        "hough_threshold": request.houghThreshold,
+        "min_line_length": request.minLineLength,
+        "max_line_gap": request.maxLineGap,
+        "min_width": request.minWidth,
+    }
 
-def remove_overlapping_lines(lines: List[Dict[str, Any]], y_threshold: int = 15, x_overlap_threshold: float = 0.5) -> List[Dict[str, Any]]:
+def _page_params(request: DetectFieldsRequest) -> Dict[str, Any]:
+    """
+    Map request tuning fields onto page task parameters
+    """
+    params = _line_params(request)
+    if request.engine:
+        params["engine"] = request.engine
+    if request.ocrMode:
+        params["ocr_mode"] = request.ocrMode
+    return params
+
+def _stored_results(source: PdfSource, params: Dict[str, Any]) -> Optional[result_cache.DocumentResults]:
     """
-    Remove overlapping lines, keeping the longest line when there's a collision.
+    Cached analyze_page results for this document and params, or None when the result cache is off
+    """
+    import detection
 
-    Args:
-        lines: List of detected lines
-        y_threshold: Maximum vertical distance to consider lines as overlapping (pixels)
-        x_overlap_threshold: Minimum horizontal overlap ratio to consider collision (0.0-1.0)
+    return result_cache.open_results(
+        source.digest(), "analyze", detection.result_params(params), detection.result_settings()
+    )
 
-    Returns:
-        Filtered list of non-overlapping lines
+def _analyze_pdf(request: DetectFieldsRequest, include: List[str]) -> Tuple[int, List[Dict[str, List[Dict[str, Any]]]], Dict[str, str]]:
     """
-    if not lines:
-        return lines
-
-    # Sort by width (longest first) so we keep longer lines in case of collision
-    sorted_lines = sorted(lines, key=lambda l: l['width'], reverse=True)
+    Download a PDF and run analyze_page over every page, fanned out across worker processes.
 
-    filtered_lines = []
+    Pages already in the result cache are taken from it and only the rest are
+    computed. Pages whose OCR failed are returned but not cached.
 
-    for line in sorted_lines:
-        # Check if this line overlaps with any already-accepted line
-        has_collision = False
+    Returns (total_pages, per-page results keyed by the included result sets, result cache headers).
+    """
+    engines.require("detection")
+    import detection
+    import page_pool
+
+    params = {**_page_params(request), "include": include}
+    # Download the PDF from R2 (served from the shared download cache when possible)
+    with download_document(request.pdfUrl) as source:
+        stored = _stored_results(source, params)
+        cached = stored.cached if stored is not None else {}
+        total_pages, page_results = page_pool.map_pages(source, "analyze", params, skip=cached)
+
+    computed = [page_num for page_num in range(total_pages) if page_num not in cached]
+    ocr_failed = {page_num for page_num in computed if detection.pop_ocr_failed(page_results[page_num])}
+    if stored is None:
+        return total_pages, page_results, result_cache.status_headers(None, total_pages)
+    stored.record(total_pages)
+    stored.store({page_num: page_results[page_num] for page_num in computed if page_num not in ocr_failed})
+    for page_num, page_result in cached.items():
+        page_results[page_num] = page_result
+    return total_pages, page_results, result_cache.status_headers(len(cached), total_pages)
+
+# Summary counters for each analyze_page result set
+RESULT_TOTAL_KEYS = {"lines": "totalLines", "cells": "totalCells", "text": "totalTextElements"}
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def _analysis_records(request: DetectFieldsRequest, include: List[str], page_keys: Dict[str, str]) -> Iterator[Dict[str, Any]]:
+    """
+    Blocking generator behind streamed detection responses.
 
-        for accepted_line in filtered_lines:
-            # Check vertical proximity (are they at similar Y positions?)
-            y_distance = abs(line['y'] - accepted_line['y'])
-            if y_distance > y_threshold:
-                continue  # Too far apart vertically, no collision
+    Yields a "start" record once the PDF is downloaded, one "page" record per
+    page as soon as it finishes (result sets renamed through page_keys), then a
+    "summary" record. Only per-set counts are kept, so memory doesn't grow with
+    the document.
 
-            # Check horizontal overlap
-            line_x1 = line['x']
-            line_x2 = line['x'] + line['width']
-            accepted_x1 = accepted_line['x']
-            accepted_x2 = accepted_line['x'] + accepted_line['width']
+    Cached pages are yielded straight from the result cache, and each computed
+    page is stored as it finishes, so an abandoned stream still caches the
+    pages it got through. The start record's cachedPages is None when the
+    result cache is off. Pages whose OCR failed are yielded but not stored.
+    """
+    engines.require("detection")
+    import detection
+    import page_pool
 
-            # Calculate overlap
-            overlap_start = max(line_x1, accepted_x1)
-            overlap_end = min(line_x2, accepted_x2)
-            overlap_width = max(0, overlap_end - overlap_start)
+    params = {**_page_params(request), "include": include}
+    source = download_document(request.pdfUrl)
 
-            # Calculate overlap ratio (relative to smaller line)
-            min_width = min(line['width'], accepted_line['width'])
-            overlap_ratio = overlap_width / min_width if min_width > 0 else 0
+    try:
+        stored = _stored_results(source, params)
+        cached = stored.cached if stored is not None else {}
+        total_pages, pages = page_pool.iter_pages(source, "analyze", params, skip=cached)
+        if stored is not None:
+            stored.record(total_pages)
+        yield {"type": "start", "totalPages": total_pages, "cachedPages": len(cached) if stored is not None else None}
+
+        totals = {result_set: 0 for result_set in include}
+        try:
+            for page_num in range(total_pages):
+                if page_num in cached:
+                    page_result = cached[page_num]
+                else:
+                    page_num, page_result = next(pages)
+                    if not detection.pop_ocr_failed(page_result) and stored is not None:
+                        stored.store({page_num: page_result})
+                for result_set in include:
+                    totals[result_set] += len(page_result[result_set])
+                yield {
+                    "type": "page",
+                    "page": page_num + 1,
+                    **{page_keys.get(result_set, result_set): items for result_set, items in page_result.items()}
+                }
+        finally:
+            pages.close()
 
-            if overlap_ratio >= x_overlap_threshold:
-                has_collision = True
-                break
+        yield {
+            "type": "summary",
+            "success": True,
+            "totalPages": total_pages,
+            "summary": {RESULT_TOTAL_KEYS[result_set]: totals[result_set] for result_set in include},
+        }
+    finally:
+        source.close()
+
+def _encode_record(record: Dict[str, Any], stream: str) -> str:
+    with metrics.stage("json"):
+        data = json.dumps(record)
+    if stream == "sse":
+        return f"event: {record['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+async def _stream_response(
+    request: DetectFieldsRequest,
+    include: List[str],
+    page_keys: Dict[str, str],
+    log_tag: str
+) -> StreamingResponse:
+    """
+    Stream _analysis_records as NDJSON or SSE.
 
-        if not has_collision:
-            filtered_lines.append(line)
+    The first record is awaited before responding, so admission (503), download
+    and PDF open failures still surface as HTTP errors. Later failures end the
+    stream with an "error" record.
+    """
+    records = worker_pool.stream(_analysis_records, request, include, page_keys)
+    try:
+        first = await records.__anext__()
+    except BaseException:
+        await records.aclose()
+        raise
+    headers = result_cache.status_headers(first["cachedPages"], first["totalPages"])
 
-    # Sort back by Y position for consistent ordering
-    filtered_lines.sort(key=lambda l: (l['y'], l['x']))
+    async def body():
+        try:
+            yield _encode_record(first, request.stream)
+            async for record in records:
+                yield _encode_record(record, request.stream)
+        except Exception as e:
+            print(f"[{log_tag}] Error while streaming: {str(e)}")
+            metrics.record_stream_error()
+            yield _encode_record({"type": "error", "detail": str(e)}, request.stream)
+        finally:
+            # Runs on client disconnect too: cancels queued pages and removes the temp file
+            await records.aclose()
 
-    return filtered_lines
+    return StreamingResponse(body(), media_type=STREAM_MEDIA_TYPES[request.stream], headers=headers)
 
-def detect_table_cells(image: np.ndarray) -> List[Dict[str, Any]]:
+def _job_response(body: Dict[str, Any], headers: Dict[str, str]) -> TimedJSONResponse:
     """
-    Detect table structure and cells
+    JSON response for a detection job's (body, headers)
     """
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)[1]
+    return TimedJSONResponse(content=body, headers=headers)
 
-    # Find contours
-    contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-
-    cells = []
-    for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
-        # Filter for rectangular shapes that could be table cells
-        if w > 50 and h > 15 and w < image.shape[1] * 0.9:
-            cells.append({
-                "type": "cell",
-                "x": int(x),
-                "y": int(y),
-                "width": int(w),
-                "height": int(h)
-            })
+def _analyze_job(request: AnalyzeRequest) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Blocking body of /analyze, run on the worker pool; returns the response body and headers
+    """
+    print(f"[analyze] Downloading PDF from: {request.pdfUrl} (include: {', '.join(request.include)})")
+
+    total_pages, page_results, headers = _analyze_pdf(request, request.include)
+
+    response: Dict[str, Any] = {
+        "success": True,
+        "message": "Document analyzed successfully",
+        "totalPages": total_pages,
+        "pages": [
+            {"page": page_num + 1, **page_result}
+            for page_num, page_result in enumerate(page_results)
+        ],
+        "summary": {},
+    }
+    for result_set, key in (("lines", "lines"), ("cells", "cells"), ("text", "textElements")):
+        if result_set in request.include:
+            response[key] = [item for page_result in page_results for item in page_result[result_set]]
+            response["summary"][RESULT_TOTAL_KEYS[result_set]] = len(response[key])
 
-    return cells
+    return response, headers
 
-def extract_text_with_positions(image: np.ndarray) -> List[Dict[str, Any]]:
+@app.post("/analyze")
+async def analyze(request: AnalyzeRequest):
     """
-    Extract text and their positions using OCR
+    Detect lines, table cells and text in one pass, rendering and OCRing each page once
     """
     try:
-        # Convert to PIL Image for pytesseract
-        pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-
-        # Get detailed OCR data
-        ocr_data = pytesseract.image_to_data(pil_image, output_type=pytesseract.Output.DICT)
-
-        text_elements = []
-        for i in range(len(ocr_data['text'])):
-            text = ocr_data['text'][i].strip()
-            if text:  # Only include non-empty text
-                text_elements.append({
-                    "text": text,
-                    "x": int(ocr_data['left'][i]),
-                    "y": int(ocr_data['top'][i]),
-                    "width": int(ocr_data['width'][i]),
-                    "height": int(ocr_data['height'][i]),
-                    "confidence": float(ocr_data['conf'][i])
-                })
-
-        return text_elements
+        if request.stream:
+            return await _stream_response(request, request.include, {}, "analyze")
+        return _job_response(*await worker_pool.run(_analyze_job, request))
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"OCR failed: {str(e)}")
-        return []
+        print(f"[analyze] Error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Document analysis failed: {str(e)}"
+        )
 
-def associate_labels_with_fields(text_elements: List[Dict], fields: List[Dict]) -> List[Dict]:
+def _detect_fillable_areas_job(request: DetectFieldsRequest) -> Tuple[Dict[str, Any], Dict[str, str]]:
     """
-    Associate text labels with detected fillable fields
+    Blocking body of /detect-fillable-areas, run on the worker pool; returns the response body and headers
     """
-    for field in fields:
-        # Find text to the left of the field
-        nearby_text = []
-        for text_elem in text_elements:
-            # Check if text is to the left and roughly on the same line
-            if (text_elem['x'] < field['x'] and
-                abs(text_elem['y'] - field['y']) < 30):
-                nearby_text.append(text_elem)
+    print(f"[detect-fillable-areas] Downloading PDF from: {request.pdfUrl}")
+
+    total_pages, page_results, headers = _analyze_pdf(request, ["lines"])
+    all_fillable_areas = [field for page_result in page_results for field in page_result["lines"]]
+
+    # Group fields by page for better organization
+    fields_by_page = {}
+    for field in all_fillable_areas:
+        page = field.get('page', 1)
+        if page not in fields_by_page:
+            fields_by_page[page] = {
+                "lines": [],
+                "cells": [],
+                "all_fields": []
+            }
 
-        # Sort by distance and take the closest
-        if nearby_text:
-            nearby_text.sort(key=lambda t: field['x'] - (t['x'] + t['width']))
-            field['label'] = ' '.join([t['text'] for t in nearby_text[:5]])
-        else:
-            field['label'] = ""
+        fields_by_page[page]["all_fields"].append(field)
+        if field['type'] == 'line':
+            fields_by_page[page]["lines"].append(field)
+        elif field['type'] == 'cell':
+            fields_by_page[page]["cells"].append(field)
 
-    return fields
+    return {
+        "success": True,
+        "message": "Fillable areas detected successfully",
+        "totalPages": total_pages,
+        "fieldsDetected": len(all_fillable_areas),
+        "fields": all_fillable_areas,  # Return all fields
+        "fieldsByPage": fields_by_page,  # Organized by page
+        "summary": {
+            "totalLines": sum(1 for f in all_fillable_areas if f['type'] == 'line'),
+            "totalCells": sum(1 for f in all_fillable_areas if f['type'] == 'cell'),
+        }
+    }, headers
 
 @app.post("/detect-fillable-areas")
 async def detect_fillable_areas(request: DetectFieldsRequest):
@@ -364,106 +576,11 @@ async def detect_fillable_areas(request: DetectFieldsRequest):
     Detect fillable areas in a PDF using computer vision
     """
     try:
-        print(f"[detect-fillable-areas] Downloading PDF from: {request.pdfUrl}")
-
-        # Download the PDF from R2 with proper headers
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_input:
-            req = urllib.request.Request(
-                request.pdfUrl,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                }
-            )
-            with urllib.request.urlopen(req) as response:
-                temp_input.write(response.read())
-            temp_input_path = temp_input.name
-
-        try:
-            # Open PDF with PyMuPDF
-            pdf_document = fitz.open(temp_input_path)
-            all_fillable_areas = []
-            total_pages = len(pdf_document)
-
-            # Process each page
-            for page_num in range(total_pages):
-                page = pdf_document[page_num]
-
-                # Clean page contents to standardize orientation before detection
-                page.clean_contents()
-
-                # Convert page to image
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x scale for better quality
-                img_data = pix.tobytes("png")
-
-                # Convert to numpy array for OpenCV
-                nparr = np.frombuffer(img_data, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-                # Detect horizontal lines (underscore fields) with configurable parameters
-                lines = detect_horizontal_lines(
-                    image,
-                    canny_low=request.cannyLow,
-                    canny_high=request.cannyHigh,
-                    hough_threshold=request.houghThreshold,
-                    min_line_length=request.minLineLength,
-                    max_line_gap=request.maxLineGap,
-                    min_width=request.minWidth
-                )
-                print(f"Page {page_num + 1}: Found {len(lines)} horizontal lines (params: canny={request.cannyLow}/{request.cannyHigh}, hough={request.houghThreshold}, minLen={request.minLineLength}, gap={request.maxLineGap}, minWidth={request.minWidth})")
-
-                # Extract text with positions
-                text_elements = extract_text_with_positions(image)
-                print(f"Page {page_num + 1}: Extracted {len(text_elements)} text elements")
-
-                # Use only line fields for this endpoint
-                all_fields = lines
-
-                # Associate labels with fields
-                labeled_fields = associate_labels_with_fields(text_elements, all_fields)
-
-                # Add page number to each field
-                for field in labeled_fields:
-                    field['page'] = page_num + 1
-
-                all_fillable_areas.extend(labeled_fields)
-
-            pdf_document.close()
-
-            # Group fields by page for better organization
-            fields_by_page = {}
-            for field in all_fillable_areas:
-                page = field.get('page', 1)
-                if page not in fields_by_page:
-                    fields_by_page[page] = {
-                        "lines": [],
-                        "cells": [],
-                        "all_fields": []
-                    }
-
-                fields_by_page[page]["all_fields"].append(field)
-                if field['type'] == 'line':
-                    fields_by_page[page]["lines"].append(field)
-                elif field['type'] == 'cell':
-                    fields_by_page[page]["cells"].append(field)
-
-            return {
-                "success": True,
-                "message": "Fillable areas detected successfully",
-                "totalPages": total_pages,
-                "fieldsDetected": len(all_fillable_areas),
-                "fields": all_fillable_areas,  # Return all fields
-                "fieldsByPage": fields_by_page,  # Organized by page
-                "summary": {
-                    "totalLines": sum(1 for f in all_fillable_areas if f['type'] == 'line'),
-                    "totalCells": sum(1 for f in all_fillable_areas if f['type'] == 'cell'),
-                }
-            }
-
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_input_path):
-                os.unlink(temp_input_path)
-
+        if request.stream:
+            return await _stream_response(request, ["lines"], {"lines": "fields"}, "detect-fillable-areas")
+        return _job_response(*await worker_pool.run(_detect_fillable_areas_job, request))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[detect-fillable-areas] Error: {str(e)}")
         raise HTTPException(
@@ -471,6 +588,41 @@ async def detect_fillable_areas(request: DetectFieldsRequest):
             detail=f"Fillable area detection failed: {str(e)}"
         )
 
+def _detect_table_cells_job(request: DetectFieldsRequest) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Blocking body of /detect-table-cells, run on the worker pool; returns the response body and headers
+    """
+    print(f"[detect-table-cells] Downloading PDF from: {request.pdfUrl}")
+
+    total_pages, page_results, headers = _analyze_pdf(request, ["cells"])
+    all_fillable_areas = [field for page_result in page_results for field in page_result["cells"]]
+
+    # Group fields by page for better organization
+    fields_by_page = {}
+    for field in all_fillable_areas:
+        page = field.get('page', 1)
+        if page not in fields_by_page:
+            fields_by_page[page] = {
+                "cells": [],
+                "all_fields": []
+            }
+
+        fields_by_page[page]["all_fields"].append(field)
+        if field['type'] == 'cell':
+            fields_by_page[page]["cells"].append(field)
+
+    return {
+        "success": True,
+        "message": "Table cells detected successfully",
+        "totalPages": total_pages,
+        "fieldsDetected": len(all_fillable_areas),
+        "fields": all_fillable_areas,  # Return all fields
+        "fieldsByPage": fields_by_page,  # Organized by page
+        "summary": {
+            "totalCells": sum(1 for f in all_fillable_areas if f['type'] == 'cell'),
+        }
+    }, headers
+
 @app.post("/detect-table-cells")
 async def detect_table_cells_endpoint(request: DetectFieldsRequest):
     """
@@ -478,94 +630,11 @@ async def detect_table_cells_endpoint(request: DetectFieldsRequest):
     This is more aggressive and may find overlapping regions.
     """
     try:
-        print(f"[detect-table-cells] Downloading PDF from: {request.pdfUrl}")
-
-        # Download the PDF
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_input:
-            req = urllib.request.Request(
-                request.pdfUrl,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-            )
-            with urllib.request.urlopen(req) as response:
-                temp_input.write(response.read())
-            temp_input_path = temp_input.name
-
-        try:
-            # Open PDF with PyMuPDF
-            pdf_document = fitz.open(temp_input_path)
-            all_fillable_areas = []
-            total_pages = len(pdf_document)
-
-            # Process each page
-            for page_num in range(total_pages):
-                page = pdf_document[page_num]
-
-                # Clean page contents to standardize orientation before detection
-                page.clean_contents()
-
-                # Convert page to image
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x scale for better quality
-                img_data = pix.tobytes("png")
-
-                # Convert to numpy array for OpenCV
-                nparr = np.frombuffer(img_data, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-                # Detect table cells only
-                cells = detect_table_cells(image)
-                print(f"Page {page_num + 1}: Found {len(cells)} table cells")
-
-                # Extract text with positions
-                text_elements = extract_text_with_positions(image)
-                print(f"Page {page_num + 1}: Extracted {len(text_elements)} text elements")
-
-                # Use only cell fields for this endpoint
-                all_fields = cells
-
-                # Associate labels with fields
-                labeled_fields = associate_labels_with_fields(text_elements, all_fields)
-
-                # Add page number to each field
-                for field in labeled_fields:
-                    field['page'] = page_num + 1
-
-                all_fillable_areas.extend(labeled_fields)
-
-            pdf_document.close()
-
-            # Group fields by page for better organization
-            fields_by_page = {}
-            for field in all_fillable_areas:
-                page = field.get('page', 1)
-                if page not in fields_by_page:
-                    fields_by_page[page] = {
-                        "cells": [],
-                        "all_fields": []
-                    }
-
-                fields_by_page[page]["all_fields"].append(field)
-                if field['type'] == 'cell':
-                    fields_by_page[page]["cells"].append(field)
-
-            return {
-                "success": True,
-                "message": "Table cells detected successfully",
-                "totalPages": total_pages,
-                "fieldsDetected": len(all_fillable_areas),
-                "fields": all_fillable_areas,  # Return all fields
-                "fieldsByPage": fields_by_page,  # Organized by page
-                "summary": {
-                    "totalCells": sum(1 for f in all_fillable_areas if f['type'] == 'cell'),
-                }
-            }
-
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_input_path):
-                os.unlink(temp_input_path)
-
+        if request.stream:
+            return await _stream_response(request, ["cells"], {"cells": "fields"}, "detect-table-cells")
+        return _job_response(*await worker_pool.run(_detect_table_cells_job, request))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[detect-table-cells] Error: {str(e)}")
         raise HTTPException(
@@ -573,161 +642,281 @@ async def detect_table_cells_endpoint(request: DetectFieldsRequest):
             detail=f"Table cell detection failed: {str(e)}"
         )
 
+def _detect_text_job(request: DetectFieldsRequest) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Blocking body of /detect-text, run on the worker pool; returns the response body and headers
+    """
+    print(f"[detect-text] Downloading PDF from: {request.pdfUrl}")
+
+    total_pages, page_results, headers = _analyze_pdf(request, ["text"])
+    all_text_elements = [elem for page_result in page_results for elem in page_result["text"]]
+
+    # Group text by page for better organization
+    text_by_page = {}
+    for text_elem in all_text_elements:
+        page = text_elem.get('page', 1)
+        if page not in text_by_page:
+            text_by_page[page] = []
+        text_by_page[page].append(text_elem)
+
+    return {
+        "success": True,
+        "message": "Text detected successfully",
+        "totalPages": total_pages,
+        "textElementsDetected": len(all_text_elements),
+        "textElements": all_text_elements,  # Return all text elements
+        "textByPage": text_by_page,  # Organized by page
+    }, headers
+
 @app.post("/detect-text")
 async def detect_text(request: DetectFieldsRequest):
     """
     Detect all text in a PDF with coordinates using OCR
     """
     try:
-        print(f"[detect-text] Downloading PDF from: {request.pdfUrl}")
-
-        # Download the PDF
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_input:
-            req = urllib.request.Request(
-                request.pdfUrl,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-            )
-            with urllib.request.urlopen(req) as response:
-                temp_input.write(response.read())
-            temp_input_path = temp_input.name
+        if request.stream:
+            return await _stream_response(request, ["text"], {"text": "textElements"}, "detect-text")
+        return _job_response(*await worker_pool.run(_detect_text_job, request))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[detect-text] Error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Text detection failed: {str(e)}"
+        )
 
-        try:
-            # Open PDF with PyMuPDF
-            pdf_document = fitz.open(temp_input_path)
-            all_text_elements = []
-            total_pages = len(pdf_document)
+def _open_tuning_session_job(request: TuningSessionRequest) -> Dict[str, Any]:
+    """
+    Blocking body of POST /tuning-sessions, run on a worker thread of this process
+    """
+    print(f"[tuning-sessions] Opening session for: {request.pdfUrl}")
+    engines.require("pdf")
+    session = tuning.get_sessions().open(download_document(request.pdfUrl), request.engine)
+    return {
+        "success": True,
+        "sessionId": session.id,
+        "totalPages": session.total_pages,
+        "idleTimeoutSeconds": tuning.get_sessions().idle_timeout,
+    }
 
-            # Process each page
-            for page_num in range(total_pages):
-                page = pdf_document[page_num]
+@app.post("/tuning-sessions")
+async def open_tuning_session(request: TuningSessionRequest):
+    """
+    Open a document for interactive line detection tuning.
 
-                # Clean page contents to standardize orientation before detection
-                page.clean_contents()
+    The session keeps each page's raster, words and Canny edge maps between
+    runs, so POST /tuning-sessions/{id}/detect only redoes the cheap stages.
+    """
+    try:
+        return await worker_pool.run_local(_open_tuning_session_job, request)
+    except tuning.SessionLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(worker_pool.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[tuning-sessions] Error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Opening tuning session failed: {str(e)}"
+        )
 
-                # Convert page to image
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x scale for better quality
-                img_data = pix.tobytes("png")
+def _tuning_session(session_id: str) -> "tuning.TuningSession":
+    session = tuning.get_sessions().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Tuning session not found or expired")
+    return session
 
-                # Convert to numpy array for OpenCV
-                nparr = np.frombuffer(img_data, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+def _tuning_detect_job(session: "tuning.TuningSession", request: TuningRunRequest) -> Dict[str, Any]:
+    """
+    Blocking body of POST /tuning-sessions/{id}/detect, run on a worker thread of this process
+    """
+    engines.require("detection")
 
-                # Extract text with positions
-                text_elements = extract_text_with_positions(image)
-                print(f"Page {page_num + 1}: Extracted {len(text_elements)} text elements")
+    page_numbers = [page - 1 for page in request.pages] if request.pages is not None else None
+    fields, pages = session.run(_line_params(request), page_numbers)
+    return {
+        "success": True,
+        "sessionId": session.id,
+        "totalPages": session.total_pages,
+        "fieldsDetected": len(fields),
+        "fields": fields,
+        "pages": pages,
+    }
 
-                # Add page number to each text element
-                for text_elem in text_elements:
-                    text_elem['page'] = page_num + 1
+@app.post("/tuning-sessions/{session_id}/detect")
+async def tuning_detect(session_id: str, request: TuningRunRequest):
+    """
+    Re-run line detection on an open tuning session with new parameters
+    """
+    session = _tuning_session(session_id)
+    try:
+        return await worker_pool.run_local(_tuning_detect_job, session, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        # Closed while this run waited for it
+        raise HTTPException(status_code=404, detail="Tuning session not found or expired")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[tuning-sessions] Error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Tuning run failed: {str(e)}"
+        )
 
-                all_text_elements.extend(text_elements)
+@app.delete("/tuning-sessions/{session_id}")
+async def close_tuning_session(session_id: str):
+    """
+    Close a tuning session and release its rasters and edge maps
+    """
+    if not tuning.get_sessions().close(session_id):
+        raise HTTPException(status_code=404, detail="Tuning session not found or expired")
+    return {"success": True}
 
-            pdf_document.close()
+def _sweep_param_sets(request: LineSweepRequest) -> List[LineParams]:
+    """
+    The grid's combinations followed by the explicit parameter sets, without duplicates
+    """
+    param_sets = []
+    if request.grid is not None:
+        axes = request.grid.model_dump(exclude_none=True)
+        param_sets.extend(LineParams(**dict(zip(axes, values))) for values in itertools.product(*axes.values()))
+    param_sets.extend(request.paramSets)
+
+    unique: Dict[Tuple[int, ...], LineParams] = {}
+    for param_set in param_sets:
+        unique.setdefault(tuple(param_set.model_dump().values()), param_set)
+    return list(unique.values())
+
+def _line_sweep_job(request: LineSweepRequest) -> Dict[str, Any]:
+    """
+    Blocking body of /detect-fillable-areas/sweep, run on the worker pool
+    """
+    param_sets = _sweep_param_sets(request)
+    if not param_sets:
+        raise ValueError("Give a grid or paramSets to sweep")
+    if len(param_sets) > tuning.SWEEP_MAX_PARAM_SETS:
+        raise ValueError(f"{len(param_sets)} parameter sets requested; at most {tuning.SWEEP_MAX_PARAM_SETS} are allowed")
+
+    print(f"[detect-fillable-areas/sweep] Sweeping {len(param_sets)} parameter sets over: {request.pdfUrl}")
+    engines.require("detection")
+    import page_pool
+
+    with download_document(request.pdfUrl) as source:
+        with source.open() as document:
+            total_pages = len(document)
+        page_numbers = sorted({page - 1 for page in request.pages}) if request.pages is not None else list(range(total_pages))
+        for page_num in page_numbers:
+            if not 0 <= page_num < total_pages:
+                raise ValueError(f"Page {page_num + 1} is out of range (1-{total_pages})")
+        selected = set(page_numbers)
+        params = {
+            "param_sets": [_line_params(param_set) for param_set in param_sets],
+            "labels": request.labels,
+            "threads": tuning.sweep_threads(len(page_numbers)),
+        }
+        if request.engine:
+            params["engine"] = request.engine
+        _, page_results = page_pool.map_pages(
+            source,
+            "sweep",
+            params,
+            skip=[page_num for page_num in range(total_pages) if page_num not in selected]
+        )
 
-            # Group text by page for better organization
-            text_by_page = {}
-            for text_elem in all_text_elements:
-                page = text_elem.get('page', 1)
-                if page not in text_by_page:
-                    text_by_page[page] = []
-                text_by_page[page].append(text_elem)
+    results = []
+    for index, param_set in enumerate(param_sets):
+        fields = [field for page_num in page_numbers for field in page_results[page_num]["fields"][index]]
+        result = {
+            "params": param_set.model_dump(),
+            "fieldsDetected": len(fields),
+            "fieldsByPage": {page_num + 1: len(page_results[page_num]["fields"][index]) for page_num in page_numbers},
+        }
+        if request.includeFields:
+            result["fields"] = fields
+        results.append(result)
 
-            return {
-                "success": True,
-                "message": "Text detected successfully",
-                "totalPages": total_pages,
-                "textElementsDetected": len(all_text_elements),
-                "textElements": all_text_elements,  # Return all text elements
-                "textByPage": text_by_page,  # Organized by page
-            }
+    return {
+        "success": True,
+        "totalPages": total_pages,
+        "pagesSwept": len(page_numbers),
+        "paramSetsEvaluated": len(param_sets),
+        "edgeMapsComputed": sum(page_results[page_num]["edgeMaps"] for page_num in page_numbers),
+        "results": results,
+    }
 
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_input_path):
-                os.unlink(temp_input_path)
+@app.post("/detect-fillable-areas/sweep")
+async def line_sweep(request: LineSweepRequest):
+    """
+    Evaluate a grid or list of line detection parameter sets in one pass.
 
+    Each page is rendered once and each distinct Canny edge map computed once;
+    returns every parameter set's field counts (and fields).
+    """
+    try:
+        return await worker_pool.run(_line_sweep_job, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[detect-text] Error: {str(e)}")
+        print(f"[detect-fillable-areas/sweep] Error: {str(e)}")
         raise HTTPException(
             status_code=500,
-            detail=f"Text detection failed: {str(e)}"
+            detail=f"Parameter sweep failed: {str(e)}"
         )
 
-@app.post("/annotate-pdf")
-async def annotate_pdf(request: AnnotatePdfRequest):
+def _pdf_bytes(pdf_document: "fitz.Document", output: str) -> bytes:
     """
-    Create an annotated PDF with detected fields marked
+    Serialize an edited document without a round trip through a temp file
     """
-    try:
-        print(f"[annotate-pdf] Downloading PDF from: {request.pdfUrl}")
-
-        # Download the PDF
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_input:
-            req = urllib.request.Request(
-                request.pdfUrl,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-            )
-            with urllib.request.urlopen(req) as response:
-                temp_input.write(response.read())
-            temp_input_path = temp_input.name
-
-        # Create output file
-        temp_output = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-        temp_output_path = temp_output.name
-        temp_output.close()
+    # Binary responses keep the file /ID stable so repeated requests for byte ranges line up
+    with metrics.stage("pdf_save"):
+        return pdf_document.tobytes(no_new_id=output == "pdf")
 
-        try:
-            # Open PDF
-            pdf_document = fitz.open(temp_input_path)
-
-            # Group fields by page
-            fields_by_page = {}
-            for field in request.fields:
-                page = field.get('page', 1)
-                if page not in fields_by_page:
-                    fields_by_page[page] = []
-                fields_by_page[page].append(field)
-
-            # Annotate each page
-            for page_num in range(len(pdf_document)):
+def _render_annotated_pdf(request: AnnotatePdfRequest) -> bytes:
+    """
+    Blocking body of /annotate-pdf, run on the worker pool; returns the annotated PDF
+    """
+    print(f"[annotate-pdf] Downloading PDF from: {request.pdfUrl}")
+    engines.require("pdf")
+    import coordinates
+
+    # Download the PDF from R2 (served from the shared download cache when possible)
+    with download_document(request.pdfUrl) as source:
+        # Open PDF
+        pdf_document = source.open()
+
+        # Group fields by page
+        fields_by_page = {}
+        for field in request.fields:
+            page = field.get('page', 1)
+            if page not in fields_by_page:
+                fields_by_page[page] = []
+            fields_by_page[page].append(field)
+
+        # Annotate each page
+        for page_num in range(len(pdf_document)):
+            page_fields = fields_by_page.get(page_num + 1, [])
+            if not page_fields:
+                # Untouched pages are written out as they are
+                continue
+            with metrics.collect_stages() as stages, metrics.stage("page"):
                 page = pdf_document[page_num]
-                page_fields = fields_by_page.get(page_num + 1, [])
-
-                # Clean page contents to standardize orientation before drawing
-                page.clean_contents()
-
-                # Check for page rotation
-                page_rotation = page.rotation
-                print(f"[annotate-pdf] Page {page_num + 1} rotation: {page_rotation} degrees")
-
-                # Calculate actual scale factor used during detection
-                # Detection uses: pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                # Get actual page dimensions (unrotated)
-                page_rect = page.rect
-                page_width = page_rect.width
-                page_height = page_rect.height
 
-                # Get pixmap dimensions (what was used during detection)
-                detection_pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                pixmap_width = detection_pix.width
-                pixmap_height = detection_pix.height
-
-                # Calculate scale factors
-                scale_x = pixmap_width / page_width
-                scale_y = pixmap_height / page_height
+                # Map detection pixels to page points analytically (handles /Rotate) instead of rendering
+                transform = coordinates.PageTransform(page)
+                coordinates.isolate_contents(page)
+                print(f"[annotate-pdf] Page {page_num + 1} rotation: {transform.rotation} degrees")
 
                 for field in page_fields:
-                    # Scale coordinates back from detection resolution to PDF points
-                    # After page.clean_contents(), coordinate system is standardized
-                    # Use image coordinates directly without Y-axis flip
-                    x = field['x'] / scale_x
-                    y = field['y'] / scale_y
-                    width = field['width'] / scale_x
-                    height = field['height'] / scale_y
+                    # Scale coordinates back from detection resolution to points on the displayed page
+                    x = transform.to_points(field['x'])
+                    y = transform.to_points(field['y'])
+                    width = transform.to_points(field['width'])
+                    height = transform.to_points(field['height'])
 
                     # Draw X marker
                     # Use lighter red for transparency effect (RGB: 1.0, 0.3, 0.3)
@@ -735,21 +924,21 @@ async def annotate_pdf(request: AnnotatePdfRequest):
 
                     # Draw X from top-left to bottom-right
                     page.draw_line(
-                        fitz.Point(x, y),
-                        fitz.Point(x + width, y + height),
+                        transform.point(x, y),
+                        transform.point(x + width, y + height),
                         color=red,
                         width=2
                     )
                     # Draw X from top-right to bottom-left
                     page.draw_line(
-                        fitz.Point(x + width, y),
-                        fitz.Point(x, y + height),
+                        transform.point(x + width, y),
+                        transform.point(x, y + height),
                         color=red,
                         width=2
                     )
 
                     # Draw bounding box
-                    rect = fitz.Rect(x, y, x + width, y + height)
+                    rect = transform.rect(x, y, x + width, y + height)
                     page.draw_rect(rect, color=red, width=1)
 
                     # Add label with type and coordinates
@@ -762,35 +951,55 @@ async def annotate_pdf(request: AnnotatePdfRequest):
 
                     # Draw text directly on PDF (no background)
                     page.insert_text(
-                        fitz.Point(x, label_y),
+                        transform.point(x, label_y),
                         label,
                         fontsize=8,
-                        color=red
+                        color=red,
+                        rotate=transform.rotation
                     )
+            metrics.record_page(page_num, stages)
 
-            # Save annotated PDF
-            pdf_document.save(temp_output_path)
-            pdf_document.close()
+        # Serialize the annotated PDF straight from memory
+        pdf_bytes = _pdf_bytes(pdf_document, request.output)
+        pdf_document.close()
+        return pdf_bytes
 
-            # Read the annotated PDF
-            with open(temp_output_path, 'rb') as f:
-                import base64
-                pdf_data = base64.b64encode(f.read()).decode('utf-8')
-
-            return {
-                "success": True,
-                "message": "PDF annotated successfully",
-                "annotatedPdf": pdf_data,  # Base64 encoded PDF
-                "fieldsAnnotated": len(request.fields)
-            }
+def _annotate_pdf_job(request: AnnotatePdfRequest) -> Dict[str, Any]:
+    """
+    JSON form of /annotate-pdf with the PDF base64-encoded
+    """
+    pdf_data = base64.b64encode(_render_annotated_pdf(request)).decode('utf-8')
 
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_input_path):
-                os.unlink(temp_input_path)
-            if os.path.exists(temp_output_path):
-                os.unlink(temp_output_path)
+    return {
+        "success": True,
+        "message": "PDF annotated successfully",
+        "annotatedPdf": pdf_data,  # Base64 encoded PDF
+        "fieldsAnnotated": len(request.fields)
+    }
 
+@app.post("/annotate-pdf")
+async def annotate_pdf(request: AnnotatePdfRequest, http_request: Request):
+    """
+    Create an annotated PDF with detected fields marked
+    """
+    try:
+        if request.output == "pdf":
+            # Range requests for the same output reuse the bytes rendered moments ago
+            rendered = get_rendered_cache()
+            pdf_bytes = await rendered.get_or_render(
+                rendered.fingerprint("annotate-pdf", request.model_dump()),
+                lambda: worker_pool.run(_render_annotated_pdf, request)
+            )
+            return pdf_response(
+                pdf_bytes,
+                "annotated.pdf",
+                http_request.headers.get("range"),
+                http_request.headers.get("if-range"),
+                headers={"X-Fields-Annotated": str(len(request.fields))}
+            )
+        return await worker_pool.run(_annotate_pdf_job, request)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[annotate-pdf] Error: {str(e)}")
         raise HTTPException(
@@ -798,244 +1007,109 @@ async def annotate_pdf(request: AnnotatePdfRequest):
             detail=f"PDF annotation failed: {str(e)}"
         )
 
-# Font mapping for fill_form_field font names → PyMuPDF kwargs
-FONT_MAP = {
-    'Arial':            {'fontname': 'helv'},
-    'Times New Roman':  {'fontname': 'tibo'},
-    'Courier New':      {'fontname': 'cour'},
-    'Georgia':          {'fontname': 'tibo'},
-    'Lucida Handwriting': {'fontfile': '/app/fonts/DancingScript-Regular.ttf'},
-}
-
-@app.post("/generate-filled-pdf")
-async def generate_filled_pdf(request: GenerateFilledPdfRequest):
+def _render_filled_pdf(request: GenerateFilledPdfRequest) -> bytes:
     """
-    Generate a filled PDF with AI suggested fills and manual drawing annotations
+    Blocking body of /generate-filled-pdf, run on the worker pool; returns the filled PDF
     """
-    try:
-        print(f"[generate-filled-pdf] Downloading PDF from: {request.pdfUrl}")
-        print(f"[generate-filled-pdf] Suggested fills: {len(request.suggestedFills)}")
-        print(f"[generate-filled-pdf] Drawing elements: {len(request.drawingElements)}")
-
-        # Download the PDF
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_input:
-            req = urllib.request.Request(
-                request.pdfUrl,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-            )
-            with urllib.request.urlopen(req) as response:
-                temp_input.write(response.read())
-            temp_input_path = temp_input.name
-
-        # Create output file
-        temp_output = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-        temp_output_path = temp_output.name
-        temp_output.close()
-
-        try:
-            # Open PDF
-            pdf_document = fitz.open(temp_input_path)
-
-            # Group fills and elements by page
-            fills_by_page = {}
-            for fill in request.suggestedFills:
-                page = fill.get('page', 1)
-                if page not in fills_by_page:
-                    fills_by_page[page] = []
-                fills_by_page[page].append(fill)
-
-            elements_by_page = {}
-            for element in request.drawingElements:
-                page = element.get('page', 1)
-                if page not in elements_by_page:
-                    elements_by_page[page] = []
-                elements_by_page[page].append(element)
-
-            # Process each page
-            for page_num in range(len(pdf_document)):
+    print(f"[generate-filled-pdf] Downloading PDF from: {request.pdfUrl}")
+    print(f"[generate-filled-pdf] Suggested fills: {len(request.suggestedFills)}")
+    print(f"[generate-filled-pdf] Drawing elements: {len(request.drawingElements)}")
+    engines.require("pdf")
+    import coordinates
+    import drawing
+
+    # Download the PDF from R2 (served from the shared download cache when possible)
+    with download_document(request.pdfUrl) as source:
+        # Open PDF
+        pdf_document = source.open()
+
+        # Group fills and elements by page
+        fills_by_page = {}
+        for fill in request.suggestedFills:
+            page = fill.get('page', 1)
+            if page not in fills_by_page:
+                fills_by_page[page] = []
+            fills_by_page[page].append(fill)
+
+        elements_by_page = {}
+        for element in request.drawingElements:
+            page = element.get('page', 1)
+            if page not in elements_by_page:
+                elements_by_page[page] = []
+            elements_by_page[page].append(element)
+
+        # Process each page that has something to draw; the rest are written out as they are
+        for page_num in range(len(pdf_document)):
+            page_number = page_num + 1
+            page_fills = fills_by_page.get(page_number, [])
+            page_elements = elements_by_page.get(page_number, [])
+            if not page_fills and not page_elements:
+                continue
+            with metrics.collect_stages() as stages, metrics.stage("page"):
                 page = pdf_document[page_num]
-                page_number = page_num + 1
-                page_fills = fills_by_page.get(page_number, [])
-                page_elements = elements_by_page.get(page_number, [])
-
-                # Clean page contents to standardize orientation before drawing
-                page.clean_contents()
-
-                # Calculate scale factors (detection uses Matrix(2, 2))
-                page_rect = page.rect
-                page_width = page_rect.width
-                page_height = page_rect.height
-                detection_pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                pixmap_width = detection_pix.width
-                pixmap_height = detection_pix.height
-                scale_x = pixmap_width / page_width
-                scale_y = pixmap_height / page_height
+
+                # Map detection pixels to page points analytically (handles /Rotate) instead of rendering
+                transform = coordinates.PageTransform(page)
+                coordinates.isolate_contents(page)
 
                 print(f"[generate-filled-pdf] Page {page_number}: {len(page_fills)} fills, {len(page_elements)} elements")
 
-                # Render AI suggested fills
+                # Everything for the page goes into one Shape and a single commit
+                canvas = drawing.PageCanvas(page, transform)
                 for fill in page_fills:
-                    # Convert from detection coordinates to PDF points
-                    x = fill['x'] / scale_x
-                    y = fill['y'] / scale_y
-                    value = fill.get('value', '')
-                    font_size = fill.get('fontSize', 12)
-
-                    # Position text ABOVE the detected line (matching frontend behavior)
-                    # Frontend: y = canvasY - textHeight - padding
-                    # We need to position text above the line, not on/below it
-                    # PyMuPDF insert_text uses baseline, so we need to:
-                    # 1. Subtract to move up from the line
-                    # 2. Account for text height
-                    y_padding = 2  # Small padding above the line
-                    x_offset = 3  # Remove inherent left padding from PyMuPDF rendering
-                    text_height = font_size + 6  # Match frontend: aiFillsFontSize + 6
-
-                    text_x = x - x_offset  # Remove left padding
-                    text_y = y - y_padding  # Position baseline just above the line
-
-                    font_name = fill.get('font', 'Arial')
-                    font_kwargs = FONT_MAP.get(font_name, FONT_MAP['Arial'])
-                    page.insert_text(
-                        fitz.Point(text_x, text_y),
-                        value,
-                        fontsize=font_size,
-                        color=(0.11764706, 0.25098039, 0.69019608),  # #1e40af in RGB
-                        **font_kwargs
-                    )
-
-                # Render drawing elements
+                    canvas.add_fill(fill)
                 for element in page_elements:
-                    element_type = element.get('type')
-                    color_hex = element.get('color', '#000000')
-                    # Convert hex color to RGB tuple (0-1 range)
-                    color_hex = color_hex.lstrip('#')
-                    color_rgb = tuple(int(color_hex[i:i+2], 16) / 255.0 for i in (0, 2, 4))
-                    stroke_width = element.get('strokeWidth', 2)
-
-                    # Convert coordinates from canvas space to PDF points
-                    # Drawing elements are in canvas coordinates, need to convert similarly
-                    # Assuming drawing elements are in the same coordinate space as detection
-                    x = element['x'] / scale_x
-                    y = element['y'] / scale_y
-
-                    if element_type == 'text':
-                        text = element.get('text', '')
-                        font_size = element.get('fontSize', 14)
-                        text_y = y + font_size  # Adjust for baseline
-                        page.insert_text(
-                            fitz.Point(x, text_y),
-                            text,
-                            fontsize=font_size,
-                            color=color_rgb
-                        )
-
-                    elif element_type == 'rectangle':
-                        width = element.get('width', 0) / scale_x
-                        height = element.get('height', 0) / scale_y
-                        rect = fitz.Rect(x, y, x + width, y + height)
-                        page.draw_rect(rect, color=color_rgb, width=stroke_width)
-
-                    elif element_type == 'circle':
-                        width = element.get('width', 0) / scale_x
-                        height = element.get('height', 0) / scale_y
-                        # Draw circle using center and radius
-                        center_x = x + width / 2
-                        center_y = y + height / 2
-                        radius = min(width, height) / 2
-                        # PyMuPDF doesn't have draw_circle, use draw_oval
-                        rect = fitz.Rect(x, y, x + width, y + height)
-                        page.draw_oval(rect, color=color_rgb, width=stroke_width)
-
-                    elif element_type == 'line':
-                        end_x = element.get('endX', x) / scale_x
-                        end_y = element.get('endY', y) / scale_y
-                        page.draw_line(
-                            fitz.Point(x, y),
-                            fitz.Point(end_x, end_y),
-                            color=color_rgb,
-                            width=stroke_width
-                        )
-
-                    elif element_type == 'arrow':
-                        end_x = element.get('endX', x) / scale_x
-                        end_y = element.get('endY', y) / scale_y
-                        # Draw line
-                        page.draw_line(
-                            fitz.Point(x, y),
-                            fitz.Point(end_x, end_y),
-                            color=color_rgb,
-                            width=stroke_width
-                        )
-                        # Draw arrowhead (simple triangle)
-                        import math
-                        arrow_length = 10
-                        angle = math.atan2(end_y - y, end_x - x)
-                        arrow_angle = math.pi / 6  # 30 degrees
-
-                        # Left arrow point
-                        left_x = end_x - arrow_length * math.cos(angle - arrow_angle)
-                        left_y = end_y - arrow_length * math.sin(angle - arrow_angle)
-                        # Right arrow point
-                        right_x = end_x - arrow_length * math.cos(angle + arrow_angle)
-                        right_y = end_y - arrow_length * math.sin(angle + arrow_angle)
-
-                        page.draw_line(
-                            fitz.Point(end_x, end_y),
-                            fitz.Point(left_x, left_y),
-                            color=color_rgb,
-                            width=stroke_width
-                        )
-                        page.draw_line(
-                            fitz.Point(end_x, end_y),
-                            fitz.Point(right_x, right_y),
-                            color=color_rgb,
-                            width=stroke_width
-                        )
-
-                    elif element_type == 'pen':
-                        points = element.get('points', [])
-                        if len(points) > 1:
-                            for i in range(len(points) - 1):
-                                p1_x = points[i]['x'] / scale_x
-                                p1_y = points[i]['y'] / scale_y
-                                p2_x = points[i + 1]['x'] / scale_x
-                                p2_y = points[i + 1]['y'] / scale_y
-                                page.draw_line(
-                                    fitz.Point(p1_x, p1_y),
-                                    fitz.Point(p2_x, p2_y),
-                                    color=color_rgb,
-                                    width=stroke_width
-                                )
-
-            # Save filled PDF
-            pdf_document.save(temp_output_path)
-            pdf_document.close()
-
-            # Read the filled PDF
-            with open(temp_output_path, 'rb') as f:
-                import base64
-                pdf_data = base64.b64encode(f.read()).decode('utf-8')
-
-            total_annotations = len(request.suggestedFills) + len(request.drawingElements)
-            return {
-                "success": True,
-                "message": "Filled PDF generated successfully",
-                "filledPdf": pdf_data,  # Base64 encoded PDF
-                "fillsRendered": len(request.suggestedFills),
-                "elementsRendered": len(request.drawingElements),
-                "totalAnnotations": total_annotations
-            }
+                    canvas.add_element(element)
+                canvas.commit()
+            metrics.record_page(page_num, stages)
 
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_input_path):
-                os.unlink(temp_input_path)
-            if os.path.exists(temp_output_path):
-                os.unlink(temp_output_path)
+        # Serialize the filled PDF straight from memory
+        pdf_bytes = _pdf_bytes(pdf_document, request.output)
+        pdf_document.close()
+        return pdf_bytes
 
+def _generate_filled_pdf_job(request: GenerateFilledPdfRequest) -> Dict[str, Any]:
+    """
+    JSON form of /generate-filled-pdf with the PDF base64-encoded
+    """
+    pdf_data = base64.b64encode(_render_filled_pdf(request)).decode('utf-8')
+
+    total_annotations = len(request.suggestedFills) + len(request.drawingElements)
+    return {
+        "success": True,
+        "message": "Filled PDF generated successfully",
+        "filledPdf": pdf_data,  # Base64 encoded PDF
+        "fillsRendered": len(request.suggestedFills),
+        "elementsRendered": len(request.drawingElements),
+        "totalAnnotations": total_annotations
+    }
+
+@app.post("/generate-filled-pdf")
+async def generate_filled_pdf(request: GenerateFilledPdfRequest, http_request: Request):
+    """
+    Generate a filled PDF with AI suggested fills and manual drawing annotations
+    """
+    try:
+        if request.output == "pdf":
+            # Range requests for the same output reuse the bytes rendered moments ago
+            rendered = get_rendered_cache()
+            pdf_bytes = await rendered.get_or_render(
+                rendered.fingerprint("generate-filled-pdf", request.model_dump()),
+                lambda: worker_pool.run(_render_filled_pdf, request)
+            )
+            return pdf_response(
+                pdf_bytes,
+                "filled.pdf",
+                http_request.headers.get("range"),
+                http_request.headers.get("if-range"),
+                headers={
+                    "X-Fills-Rendered": str(len(request.suggestedFills)),
+                    "X-Elements-Rendered": str(len(request.drawingElements)),
+                }
+            )
+        return await worker_pool.run(_generate_filled_pdf_job, request)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[generate-filled-pdf] Error: {str(e)}")
         import traceback
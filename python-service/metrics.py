@@ -0,0 +1,217 @@
+"""
+Prometheus metrics for the PDF pipeline, served on /metrics.
+
+Pipeline stages are timed with stage(). Every observation is labeled with the
+endpoint of the request it belongs to, which a middleware stores in a context
+variable that the worker pool carries into its threads.
+
+Page work may run in page pool processes whose metrics would never reach this
+process's registry. So page tasks run inside collect_stages(), which gathers
+that page's stage timings into a plain dict instead of observing them; the dict
+travels back with the page result and record_page() observes it here. Stage
+histograms therefore hold one observation per page (summed when a stage runs
+several times on a page, e.g. OCR over several label bands) or per request for
+request-level stages like download and PDF save.
+
+Stages: page (a page's total), download, render, canny_hough, contours,
+vector_extract, ocr, label_association, form_detection, pdf_save, json.
+
+Timings also feed the current request's profile, if it asked for one (see
+profiling.py).
+
+With WORKER_POOL_KIND=process, jobs run in other processes, so only request,
+byte-out and queue metrics are recorded.
+"""
+import contextlib
+import contextvars
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+import profiling
+
+# Covers sub-millisecond label association up to multi-minute documents
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "pdf_stage_seconds",
+    "Time spent in each pipeline stage, per page for page stages",
+    ["endpoint", "stage"],
+    buckets=BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "pdf_request_seconds",
+    "Request latency until the last body byte is sent, by endpoint",
+    ["endpoint"],
+    buckets=BUCKETS
+)
+REQUESTS = Counter("pdf_requests_total", "Requests by endpoint and status code", ["endpoint", "status"])
+ERRORS = Counter(
+    "pdf_errors_total",
+    "Failed requests: rejected (503 from a full worker queue), client (4xx), server (5xx) or stream (failed mid-stream)",
+    ["endpoint", "kind"]
+)
+PAGES = Counter("pdf_pages_processed_total", "Pages processed; rate() gives pages/sec", ["endpoint"])
+BYTES_IN = Counter("pdf_bytes_in_total", "Bytes of PDF downloaded", ["endpoint"])
+BYTES_OUT = Counter("pdf_bytes_out_total", "Response body bytes sent", ["endpoint"])
+RESULT_CACHE_PAGES = Counter(
+    "pdf_result_cache_pages_total",
+    "Pages served from the detection result cache (hit) or computed (miss)",
+    ["endpoint", "result"]
+)
+
+# Endpoint of the request being served; "other" outside of a request
+ENDPOINT: contextvars.ContextVar = contextvars.ContextVar("metrics_endpoint", default="other")
+
+# Stage timings of the page being processed, when running under collect_stages()
+_page_stages: contextvars.ContextVar = contextvars.ContextVar("metrics_page_stages", default=None)
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a pipeline stage, into the current page's timings or straight into the histogram
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stages = _page_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed
+        else:
+            STAGE_SECONDS.labels(ENDPOINT.get(), name).observe(elapsed)
+            profiling.record_stage(name, elapsed)
+
+@contextlib.contextmanager
+def collect_stages() -> Iterator[Dict[str, float]]:
+    """
+    Gather stage() timings into a dict (picklable, so it can come back from a page worker)
+    """
+    stages: Dict[str, float] = {}
+    token = _page_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _page_stages.reset(token)
+
+def record_page(page_num: int, stages: Dict[str, float]) -> None:
+    """
+    Observe one processed page and its collected stage timings
+    """
+    endpoint = ENDPOINT.get()
+    PAGES.labels(endpoint).inc()
+    for name, seconds in stages.items():
+        STAGE_SECONDS.labels(endpoint, name).observe(seconds)
+    profiling.record_page(page_num, stages)
+
+def record_pages(count: int) -> None:
+    PAGES.labels(ENDPOINT.get()).inc(count)
+
+def record_bytes_in(size: int) -> None:
+    BYTES_IN.labels(ENDPOINT.get()).inc(size)
+
+def record_result_cache(hits: int, misses: int) -> None:
+    endpoint = ENDPOINT.get()
+    RESULT_CACHE_PAGES.labels(endpoint, "hit").inc(hits)
+    RESULT_CACHE_PAGES.labels(endpoint, "miss").inc(misses)
+
+def _record_response(endpoint: str, status: int, seconds: float) -> None:
+    REQUESTS.labels(endpoint, str(status)).inc()
+    REQUEST_SECONDS.labels(endpoint).observe(seconds)
+    if status == 503:
+        ERRORS.labels(endpoint, "rejected").inc()
+    elif status >= 500:
+        ERRORS.labels(endpoint, "server").inc()
+    elif status >= 400:
+        ERRORS.labels(endpoint, "client").inc()
+
+def record_stream_error() -> None:
+    ERRORS.labels(ENDPOINT.get(), "stream").inc()
+
+def _route_template(scope: Dict[str, Any]) -> str:
+    """
+    The path template of the route a request matches (e.g. "/profiles/{profile_id}"), or "other"
+    """
+    from starlette.routing import Match
+
+    template = "other"
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and template == "other":
+            # Right path, wrong method: labelled by the route it would have hit, as the router's 405 is
+            template = route.path
+    return template
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that labels each request with its endpoint and records its
+    status, latency and response bytes.
+
+    Requests are labelled by the template of the route they match, so IDs in
+    paths don't create new series, and paths that aren't routes share the
+    "other" label so scanners can't blow up label cardinality. The label is
+    needed before the router runs (page stages read it), so routes are matched
+    here the same way the router matches them.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        endpoint = _route_template(scope)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_metrics(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                BYTES_OUT.labels(endpoint).inc(len(message.get("body", b"")))
+            await send(message)
+
+        token = ENDPOINT.set(endpoint)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            _record_response(endpoint, status, time.perf_counter() - start)
+            ENDPOINT.reset(token)
+
+class WorkerPoolCollector:
+    """
+    Exposes WorkerPool gauges and counters at scrape time
+    """
+
+    def __init__(self, stats: Callable[[], Dict[str, Any]]):
+        self.stats = stats
+
+    def collect(self):
+        stats = self.stats()
+        yield GaugeMetricFamily("pdf_worker_in_flight", "Jobs running on the worker pool", value=stats["inFlight"])
+        yield GaugeMetricFamily("pdf_worker_queue_depth", "Jobs waiting for a worker", value=stats["queueDepth"])
+        yield GaugeMetricFamily("pdf_worker_capacity", "Worker pool size", value=stats["maxWorkers"])
+        yield CounterMetricFamily("pdf_worker_rejected", "Jobs rejected because the queue was full", value=stats["rejected"])
+
+_worker_collector: Optional[WorkerPoolCollector] = None
+
+def register_worker_pool(stats: Callable[[], Dict[str, Any]]) -> None:
+    global _worker_collector
+    if _worker_collector is None:
+        _worker_collector = WorkerPoolCollector(stats)
+        REGISTRY.register(_worker_collector)
+
+def exposition() -> bytes:
+    """
+    Current metrics in the Prometheus text format (content type CONTENT_TYPE)
+    """
+    return generate_latest(REGISTRY)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
@@ -0,0 +1,173 @@
+"""
+Tesseract OCR kept warm across pages.
+
+pytesseract writes every page to a temp image and forks a new `tesseract`
+process that reloads the language model. When the tesserocr bindings are
+installed, each worker thread/process instead keeps its own initialized
+Tesseract engine and hands it raw pixel buffers directly. Without tesserocr
+the pytesseract CLI path is used with the same settings.
+
+Configuration (environment variables):
+    OCR_LANG       Tesseract language(s), e.g. "eng" or "eng+spa" (default: eng)
+    OCR_PSM        Page segmentation mode (default: 3, fully automatic)
+    OCR_OEM        OCR engine mode (default: 3, default engine)
+    OCR_THREADS    OpenMP threads per Tesseract engine (default: 1; pages are
+                   already parallelized across workers)
+    OCR_TIMEOUT    Per-page timeout in seconds, 0 to disable (default: 30)
+    OCR_TESSDATA   tessdata directory (default: TESSDATA_PREFIX or Tesseract's built-in path)
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+OCR_PSM = int(os.environ.get("OCR_PSM", 3))
+OCR_OEM = int(os.environ.get("OCR_OEM", 3))
+OCR_THREADS = int(os.environ.get("OCR_THREADS", 1))
+OCR_TIMEOUT = float(os.environ.get("OCR_TIMEOUT", 30))
+OCR_TESSDATA = os.environ.get("OCR_TESSDATA") or os.environ.get("TESSDATA_PREFIX")
+
+# Must be set before libtesseract starts OpenMP; also inherited by CLI subprocesses
+os.environ.setdefault("OMP_THREAD_LIMIT", str(OCR_THREADS))
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+import pytesseract
+from PIL import Image
+
+class OcrTimeoutError(RuntimeError):
+    pass
+
+class TesseractEngine:
+    """
+    One initialized Tesseract instance. Not thread-safe, so each worker gets its own.
+    """
+
+    def __init__(self, lang: str, psm: int, oem: int):
+        kwargs: Dict[str, Any] = {"lang": lang, "psm": psm, "oem": oem}
+        if OCR_TESSDATA:
+            kwargs["path"] = OCR_TESSDATA.rstrip("/") + "/"
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+
+    def recognize(self, image: np.ndarray, timeout: float) -> List[Dict[str, Any]]:
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        if bytes_per_pixel == 3:
+            # Color images follow the OpenCV BGR convention; Tesseract wants RGB
+            image = image[:, :, ::-1]
+        pixels = np.ascontiguousarray(image)
+        self.api.SetImageBytes(pixels.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+
+        if not self.api.Recognize(timeout=int(timeout * 1000)):
+            raise OcrTimeoutError(f"Tesseract did not finish within {timeout:g}s")
+
+        words = []
+        iterator = self.api.GetIterator()
+        if iterator is None:
+            return words
+        level = tesserocr.RIL.WORD
+        for word in tesserocr.iterate_level(iterator, level):
+            text = (word.GetUTF8Text(level) or "").strip()
+            box = word.BoundingBox(level)
+            if text and box:
+                x1, y1, x2, y2 = box
+                words.append({
+                    "text": text,
+                    "x": int(x1),
+                    "y": int(y1),
+                    "width": int(x2 - x1),
+                    "height": int(y2 - y1),
+                    "confidence": float(word.Confidence(level))
+                })
+        return words
+
+_local = threading.local()
+
+def backend() -> str:
+    """
+    Name of the OCR backend in use
+    """
+    return "tesserocr" if tesserocr is not None else "pytesseract"
+
+def get_engine(lang: str = OCR_LANG, psm: int = OCR_PSM, oem: int = OCR_OEM) -> TesseractEngine:
+    """
+    Return this thread's warm engine for the given settings, creating it on first use
+    """
+    engines: Dict[Tuple[str, int, int], TesseractEngine] = getattr(_local, "engines", None)
+    if engines is None:
+        engines = _local.engines = {}
+    key = (lang, psm, oem)
+    if key not in engines:
+        engines[key] = TesseractEngine(lang, psm, oem)
+    return engines[key]
+
+def warm_up() -> None:
+    """
+    Load the default engine now so the first page doesn't pay for model loading
+    """
+    if tesserocr is None:
+        return
+    try:
+        get_engine()
+    except Exception as e:
+        print(f"OCR warm-up failed: {str(e)}")
+
+def _recognize_cli(image: np.ndarray, lang: str, psm: int, oem: int, timeout: float) -> List[Dict[str, Any]]:
+    if image.ndim == 3:
+        image = image[:, :, ::-1]
+    try:
+        ocr_data = pytesseract.image_to_data(
+            Image.fromarray(np.ascontiguousarray(image)),
+            lang=lang,
+            config=f"--psm {psm} --oem {oem}",
+            timeout=timeout,
+            output_type=pytesseract.Output.DICT
+        )
+    except RuntimeError as e:
+        if "timeout" in str(e).lower():
+            raise OcrTimeoutError(f"Tesseract did not finish within {timeout:g}s") from e
+        raise
+
+    text_elements = []
+    for i in range(len(ocr_data['text'])):
+        text = ocr_data['text'][i].strip()
+        if text:  # Only include non-empty text
+            text_elements.append({
+                "text": text,
+                "x": int(ocr_data['left'][i]),
+                "y": int(ocr_data['top'][i]),
+                "width": int(ocr_data['width'][i]),
+                "height": int(ocr_data['height'][i]),
+                "confidence": float(ocr_data['conf'][i])
+            })
+    return text_elements
+
+def recognize_words(
+    image: np.ndarray,
+    lang: Optional[str] = None,
+    psm: Optional[int] = None,
+    oem: Optional[int] = None,
+    timeout: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    OCR a grayscale or BGR image into positioned words.
+
+    Returns dicts with text, x, y, width, height (image pixels) and confidence.
+    Raises OcrTimeoutError when recognition exceeds the timeout.
+    """
+    lang = lang or OCR_LANG
+    psm = OCR_PSM if psm is None else psm
+    oem = OCR_OEM if oem is None else oem
+    timeout = OCR_TIMEOUT if timeout is None else timeout
+
+    with metrics.stage("ocr"):
+        if tesserocr is not None:
+            return get_engine(lang, psm, oem).recognize(image, timeout)
+        return _recognize_cli(image, lang, psm, oem, timeout)
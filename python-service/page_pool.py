@@ -0,0 +1,246 @@
+"""
+Page-level fan-out for multi-page detection.
+
+Pages of a document are split into chunks and distributed across a persistent
+process pool. Each worker process opens a given document once and keeps it
+open for every chunk it receives, and results are merged back in page order.
+
+Documents may be given as a path or a document_io.PdfSource. Inline runs
+parse an in-memory source directly; only fanning out to worker processes
+needs the document on disk.
+
+Configuration (environment variables):
+    PAGE_WORKERS              Worker processes for page fan-out (default: CPU count).
+                              Set to 1 to process pages inline.
+    PAGE_PARALLEL_MIN_PAGES   Documents with fewer pages are processed inline
+                              (default: 2)
+"""
+import collections
+import math
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Collection, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+
+import metrics
+import ocr
+import profiling
+from detection import PAGE_TASKS
+from document_io import PdfSource
+
+DocumentInput = Union[str, PdfSource]
+
+PAGE_WORKERS = int(os.environ.get("PAGE_WORKERS", os.cpu_count() or 1))
+PAGE_PARALLEL_MIN_PAGES = int(os.environ.get("PAGE_PARALLEL_MIN_PAGES", 2))
+
+# Chunks handed out per worker; more than one keeps workers busy when pages vary in cost
+CHUNKS_PER_WORKER = 4
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+
+# Worker-process state: the document this process currently has open
+_worker_document: Optional[Tuple[Tuple[str, int, int], fitz.Document]] = None
+
+def _document_key(pdf_path: str) -> Tuple[str, int, int]:
+    # Temp file names can be reused, so include size and mtime in the identity
+    stat = os.stat(pdf_path)
+    return (pdf_path, stat.st_size, stat.st_mtime_ns)
+
+def _open_worker_document(pdf_path: str) -> fitz.Document:
+    """
+    Open pdf_path in this worker process, reusing the handle across chunks
+    """
+    global _worker_document
+    key = _document_key(pdf_path)
+    if _worker_document is None or _worker_document[0] != key:
+        if _worker_document is not None:
+            _worker_document[1].close()
+        _worker_document = (key, fitz.open(pdf_path))
+    return _worker_document[1]
+
+def _init_worker() -> None:
+    # Load the OCR model once per worker process instead of on its first page
+    ocr.warm_up()
+
+def _run_page(document: fitz.Document, task: str, page_num: int, params: Dict[str, Any]) -> Tuple[Any, Dict[str, float]]:
+    """
+    Run a page task, returning its result and the page's stage timings
+    """
+    with metrics.collect_stages() as stages, metrics.stage("page"):
+        result = PAGE_TASKS[task](document[page_num], page_num, params)
+    return result, stages
+
+def _process_page_chunk(
+    pdf_path: str,
+    task: str,
+    page_numbers: List[int],
+    params: Dict[str, Any]
+) -> List[Tuple[int, Any, Dict[str, float]]]:
+    """
+    Run a page task over a chunk of pages inside a worker process
+    """
+    document = _open_worker_document(pdf_path)
+    return [(page_num, *_run_page(document, task, page_num, params)) for page_num in page_numbers]
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Return the shared page pool, recreating it if the worker count changed
+    """
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        # spawn avoids forking a parent that already runs uvicorn and worker threads
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        _executor_workers = workers
+    return _executor
+
+def shutdown() -> None:
+    global _executor, _executor_workers
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor_workers = 0
+
+def _open_document(source: DocumentInput) -> fitz.Document:
+    return source.open() if isinstance(source, PdfSource) else fitz.open(source)
+
+def _document_path(source: DocumentInput) -> str:
+    # Worker processes open documents by path, so in-memory sources are written out here
+    return source.path() if isinstance(source, PdfSource) else source
+
+def _worker_count(workers: Optional[int]) -> int:
+    if profiling.active() is not None:
+        # cProfile only sees the job thread, so profiled requests process pages inline
+        return 1
+    return workers or PAGE_WORKERS
+
+def chunk_pages(total_pages: int, workers: int, skip: Collection[int] = ()) -> List[List[int]]:
+    """
+    Split page indices (except those in skip) into contiguous chunks for distribution across workers
+    """
+    page_numbers = [page_num for page_num in range(total_pages) if page_num not in skip]
+    chunk_size = max(1, math.ceil(len(page_numbers) / (workers * CHUNKS_PER_WORKER)))
+    return [
+        page_numbers[start:start + chunk_size]
+        for start in range(0, len(page_numbers), chunk_size)
+    ]
+
+def map_pages(
+    source: DocumentInput,
+    task: str,
+    params: Optional[Dict[str, Any]] = None,
+    workers: Optional[int] = None,
+    skip: Collection[int] = ()
+) -> Tuple[int, List[Any]]:
+    """
+    Run a per-page detection task over every page of a PDF.
+
+    Args:
+        source: Path to the PDF on local disk, or a PdfSource
+        task: Name of a processor in detection.PAGE_TASKS
+        params: Keyword parameters passed through to the processor
+        workers: Worker processes to use (defaults to PAGE_WORKERS)
+        skip: Page indices not to process (e.g. already cached)
+
+    Returns:
+        (total_pages, results) where results[i] holds the output for page i,
+        or None for skipped pages
+    """
+    if task not in PAGE_TASKS:
+        raise ValueError(f"Unknown page task: {task}")
+    params = params or {}
+    workers = _worker_count(workers)
+
+    with _open_document(source) as document:
+        total_pages = len(document)
+        results: List[Any] = [None] * total_pages
+        page_numbers = [page_num for page_num in range(total_pages) if page_num not in skip]
+        if workers <= 1 or len(page_numbers) < max(2, PAGE_PARALLEL_MIN_PAGES):
+            for page_num in page_numbers:
+                page_result, stages = _run_page(document, task, page_num, params)
+                metrics.record_page(page_num, stages)
+                results[page_num] = page_result
+            return total_pages, results
+
+    pdf_path = _document_path(source)
+    executor = get_executor(workers)
+    futures = [
+        executor.submit(_process_page_chunk, pdf_path, task, chunk, params)
+        for chunk in chunk_pages(total_pages, workers, skip)
+    ]
+
+    # Merge back in page order regardless of completion order
+    for future in futures:
+        for page_num, page_result, stages in future.result():
+            metrics.record_page(page_num, stages)
+            results[page_num] = page_result
+
+    return total_pages, results
+
+def _iter_inline(source: DocumentInput, task: str, params: Dict[str, Any], page_numbers: List[int]) -> Iterator[Tuple[int, Any]]:
+    with _open_document(source) as document:
+        for page_num in page_numbers:
+            page_result, stages = _run_page(document, task, page_num, params)
+            metrics.record_page(page_num, stages)
+            yield page_num, page_result
+
+def _iter_parallel(
+    pdf_path: str,
+    task: str,
+    params: Dict[str, Any],
+    page_numbers: List[int],
+    workers: int
+) -> Iterator[Tuple[int, Any]]:
+    executor = get_executor(workers)
+    # Only a fixed window of single-page chunks is in flight, so buffered results stay bounded
+    window = workers * CHUNKS_PER_WORKER
+    pending: Deque[Future] = collections.deque()
+    next_index = 0
+    try:
+        while next_index < len(page_numbers) or pending:
+            while next_index < len(page_numbers) and len(pending) < window:
+                pending.append(executor.submit(_process_page_chunk, pdf_path, task, [page_numbers[next_index]], params))
+                next_index += 1
+            for page_num, page_result, stages in pending.popleft().result():
+                metrics.record_page(page_num, stages)
+                yield page_num, page_result
+    finally:
+        # Consumer stopped early (client went away or a page failed): drop queued pages
+        for future in pending:
+            future.cancel()
+
+def iter_pages(
+    source: DocumentInput,
+    task: str,
+    params: Optional[Dict[str, Any]] = None,
+    workers: Optional[int] = None,
+    skip: Collection[int] = ()
+) -> Tuple[int, Iterator[Tuple[int, Any]]]:
+    """
+    Like map_pages, but yield (page_num, result) in page order as each page finishes.
+
+    Pages are dispatched one at a time through a fixed-size window, so the
+    first result arrives after about one page's work regardless of document
+    length. Pages in skip are not processed or yielded. Close the iterator to
+    cancel pages that haven't started.
+    """
+    if task not in PAGE_TASKS:
+        raise ValueError(f"Unknown page task: {task}")
+    params = params or {}
+    workers = _worker_count(workers)
+
+    with _open_document(source) as document:
+        total_pages = len(document)
+    page_numbers = [page_num for page_num in range(total_pages) if page_num not in skip]
+
+    if workers <= 1 or len(page_numbers) < max(2, PAGE_PARALLEL_MIN_PAGES):
+        return total_pages, _iter_inline(source, task, params, page_numbers)
+    return total_pages, _iter_parallel(_document_path(source), task, params, page_numbers, workers)
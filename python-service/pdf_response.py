@@ -0,0 +1,213 @@
+"""
+Binary application/pdf responses for the PDF-producing endpoints.
+
+The rendered document is streamed in chunks from a memoryview over the bytes
+PyMuPDF returned, so the body is never base64-encoded or copied as a whole. Single
+byte ranges (Range: bytes=...) are answered with 206 Partial Content so large
+outputs can be fetched in pieces or resumed; If-Range is checked against a
+strong ETag of the bytes.
+
+Each ranged fetch is a new POST, so rendered documents are kept in memory for
+a short while keyed by the request that produced them. The follow-up range
+requests for the same output reuse those bytes, and so does a burst of
+parallel ranges, which waits on the first render, instead of downloading,
+drawing and saving the PDF again. Within the TTL a changed source PDF at the
+same URL isn't picked up, which keeps every range of one download consistent.
+
+Configuration (environment variables):
+    RENDERED_PDF_CACHE_TTL         Seconds a rendered PDF is kept for repeat requests
+                                   (default: 60; 0 disables)
+    RENDERED_PDF_CACHE_MAX_BYTES   Memory cap for kept PDFs, oldest evicted first
+                                   (default: 64 MiB)
+"""
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+RENDERED_PDF_CACHE_TTL = float(os.environ.get("RENDERED_PDF_CACHE_TTL", 60))
+RENDERED_PDF_CACHE_MAX_BYTES = int(os.environ.get("RENDERED_PDF_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+class RenderedPdfCache:
+    """
+    Recently rendered PDFs by request fingerprint, with concurrent renders of one request shared
+    """
+
+    def __init__(self, ttl: float = RENDERED_PDF_CACHE_TTL, max_bytes: int = RENDERED_PDF_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # fingerprint -> (expiry, bytes), oldest first
+        self._entries: "collections.OrderedDict[str, Tuple[float, bytes]]" = collections.OrderedDict()
+        self._size = 0
+        self._in_flight: Dict[str, "asyncio.Future[bytes]"] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def fingerprint(endpoint: str, request: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps({"endpoint": endpoint, "request": request}, sort_keys=True).encode()).hexdigest()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return None
+            return entry[1]
+
+    def _drop(self, key: str) -> None:
+        _, data = self._entries.pop(key)
+        self._size -= len(data)
+
+    def _put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            now = time.monotonic()
+            expired = [name for name, (expiry, _) in self._entries.items() if expiry < now]
+            for name in expired:
+                self._drop(name)
+            while self._entries and self._size + len(data) > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+            self._entries[key] = (now + self.ttl, data)
+            self._size += len(data)
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        The PDF rendered for key, rendering it (once, however many requests are waiting) if it isn't kept
+        """
+        if self.ttl <= 0:
+            return await render()
+        data = self._get(key)
+        if data is not None:
+            self._counters["hits"] += 1
+            return data
+        pending = self._in_flight.get(key)
+        if pending is None:
+            self._counters["misses"] += 1
+            # Its own task, so the render finishes for the other waiters if the request that started it goes away
+            pending = asyncio.ensure_future(self._render(key, render))
+            self._in_flight[key] = pending
+        else:
+            self._counters["hits"] += 1
+        return await asyncio.shield(pending)
+
+    async def _render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        try:
+            data = await render()
+        finally:
+            self._in_flight.pop(key, None)
+        self._put(key, data)
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = len(self._entries), self._size
+        return {**self._counters, "entries": entries, "sizeBytes": size, "maxBytes": self.max_bytes, "ttlSeconds": self.ttl}
+
+_rendered_cache: Optional[RenderedPdfCache] = None
+_rendered_cache_lock = threading.Lock()
+
+def get_rendered_cache() -> RenderedPdfCache:
+    """
+    Return the process-wide rendered PDF cache
+    """
+    global _rendered_cache
+    with _rendered_cache_lock:
+        if _rendered_cache is None:
+            _rendered_cache = RenderedPdfCache()
+        return _rendered_cache
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a Range header into an inclusive (start, end) byte range.
+
+    Returns None when the whole body should be sent (no header, a
+    non-byte unit, multiple ranges or malformed syntax, all of which servers
+    may ignore). Raises HTTPException(416) when the range can't be satisfied.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.strip().partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_text, dash, end_text = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(0, size - suffix), size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+async def _chunks(view: memoryview) -> AsyncIterator[bytes]:
+    # Async so Starlette doesn't hop to a thread per chunk; only one chunk is copied at a time
+    for offset in range(0, len(view), CHUNK_SIZE):
+        yield bytes(view[offset:offset + CHUNK_SIZE])
+
+def pdf_response(
+    data: bytes,
+    filename: str,
+    range_header: Optional[str] = None,
+    if_range: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """
+    Stream data as application/pdf, honoring a single byte Range
+    """
+    size = len(data)
+    etag = f'"{hashlib.sha256(data).hexdigest()}"'
+    response_headers = {
+        **(headers or {}),
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f'inline; filename="{filename}"',
+    }
+
+    # A stale If-Range means the client's partial copy is of different bytes, so send everything
+    byte_range = parse_range(range_header, size) if not if_range or if_range == etag else None
+    view = memoryview(data)
+    if byte_range is None:
+        response_headers["Content-Length"] = str(size)
+        return StreamingResponse(_chunks(view), media_type="application/pdf", headers=response_headers)
+
+    start, end = byte_range
+    response_headers["Content-Length"] = str(end - start + 1)
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        _chunks(view[start:end + 1]),
+        status_code=206,
+        media_type="application/pdf",
+        headers=response_headers
+    )
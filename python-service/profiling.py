@@ -0,0 +1,228 @@
+"""
+Opt-in profiling of individual requests.
+
+When PROFILING_ENABLED is set, a request sent with an X-Profile header (or a
+?profile= query parameter) runs its blocking work under cProfile. The response
+carries an X-Profile-Id header, and once the response has been sent the
+profile is saved under PROFILE_DIR:
+
+    <id>.prof   pstats dump (python -m pstats, snakeviz, ...)
+    <id>.json   summary: request-level stage timings, a per-page stage
+                breakdown and the slowest functions by cumulative time
+
+Both are served by GET /profiles/{id} (add ?format=pstats for the dump).
+Stage timings are the ones metrics.stage() records, so pages show where
+render, Canny/Hough, OCR, label association and drawing time went.
+
+cProfile only sees the thread it runs in, so profiled requests process their
+pages inline in the job thread instead of fanning out to the page pool. Their
+wall time is therefore not comparable with unprofiled requests; the per-page
+breakdown is. Requests on a WORKER_POOL_KIND=process pool aren't profiled.
+
+Configuration (environment variables):
+    PROFILING_ENABLED   "1" to honor profiling requests (default: disabled)
+    PROFILE_TOKEN       If set, the header/query value must equal it
+    PROFILE_DIR         Where profiles are stored (default: <tmp>/pdf-profiles)
+    PROFILE_KEEP        Profiles kept before the oldest are deleted (default: 50)
+    PROFILE_TOP         Functions listed in the JSON summary (default: 30)
+"""
+import asyncio
+import contextvars
+import cProfile
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "pdf-profiles")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 50))
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", 30))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY = "profile"
+
+_PROFILE_ID = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+class RequestProfile:
+    """
+    cProfile stats and stage timings gathered for one request
+    """
+
+    def __init__(self, endpoint: str, method: str):
+        self.id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        self.endpoint = endpoint
+        self.method = method
+        self.status: Optional[int] = None
+        self.profiler = cProfile.Profile()
+        self.stages: Dict[str, float] = {}
+        self.pages: Dict[int, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._created = time.time()
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # Steps of one request run one at a time, so the profiler is never enabled twice
+        self.profiler.enable()
+        try:
+            return fn(*args)
+        finally:
+            self.profiler.disable()
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_page(self, page_num: int, stages: Dict[str, float]) -> None:
+        with self._lock:
+            page = self.pages.setdefault(page_num, {})
+            for name, seconds in stages.items():
+                page[name] = page.get(name, 0.0) + seconds
+
+    def summary(self) -> Dict[str, Any]:
+        page_totals: Dict[str, float] = {}
+        for stages in self.pages.values():
+            for name, seconds in stages.items():
+                page_totals[name] = page_totals.get(name, 0.0) + seconds
+
+        # Raw snapshot rather than pstats.Stats, which refuses a profile that never ran
+        self.profiler.create_stats()
+        rows = sorted(self.profiler.stats.items(), key=lambda item: item[1][3], reverse=True)
+        functions = [
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "totalSeconds": round(total, 6),
+                "cumulativeSeconds": round(cumulative, 6),
+            }
+            for (filename, line, name), (_, calls, total, cumulative, _) in rows[:PROFILE_TOP]
+        ]
+
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "status": self.status,
+            "createdAt": self._created,
+            "wallSeconds": round(time.perf_counter() - self._start, 6),
+            "stages": _rounded(self.stages),
+            "pageTotals": _rounded(page_totals),
+            "pages": [
+                {"page": page_num + 1, "stages": _rounded(stages)}
+                for page_num, stages in sorted(self.pages.items())
+            ],
+            "functions": functions,
+        }
+
+    def save(self) -> None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.id)
+        self.profiler.dump_stats(base + ".prof")
+        with open(base + ".json", "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        _prune()
+
+def _rounded(stages: Dict[str, float]) -> Dict[str, float]:
+    return {name: round(seconds, 6) for name, seconds in stages.items()}
+
+def _prune() -> None:
+    """
+    Delete the oldest profiles beyond PROFILE_KEEP
+    """
+    ids = sorted(
+        (name[:-len(".json")] for name in os.listdir(PROFILE_DIR) if name.endswith(".json")),
+        key=lambda profile_id: int(profile_id.split("-")[0])
+    )
+    for profile_id in ids[:max(0, len(ids) - PROFILE_KEEP)]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+# Profile of the request being served, if it asked for one
+_current: contextvars.ContextVar = contextvars.ContextVar("request_profile", default=None)
+
+def active() -> Optional[RequestProfile]:
+    return _current.get()
+
+def run(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Call fn(*args), under the current request's profiler if it has one
+    """
+    profile = _current.get()
+    if profile is None:
+        return fn(*args)
+    return profile.run(fn, *args)
+
+def record_stage(name: str, seconds: float) -> None:
+    profile = _current.get()
+    if profile is not None:
+        profile.add_stage(name, seconds)
+
+def record_page(page_num: int, stages: Dict[str, float]) -> None:
+    profile = _current.get()
+    if profile is not None:
+        profile.add_page(page_num, stages)
+
+def _requested(scope: Dict[str, Any]) -> bool:
+    value = None
+    for name, header_value in scope.get("headers", []):
+        if name == PROFILE_HEADER:
+            value = header_value.decode("latin-1")
+    if value is None:
+        values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(PROFILE_QUERY)
+        value = values[0] if values else None
+    if not value:
+        return False
+    if PROFILE_TOKEN:
+        return value == PROFILE_TOKEN
+    return value.lower() in ("1", "true", "yes")
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles requests asking for it, when PROFILING_ENABLED is set
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not PROFILING_ENABLED or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["path"], scope["method"])
+
+        async def send_with_profile_id(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _current.reset(token)
+            try:
+                # Writing the stats and JSON is file I/O; keep it off the event loop
+                await asyncio.to_thread(profile.save)
+                print(f"[profiling] Saved profile {profile.id} for {profile.method} {profile.endpoint}")
+            except Exception as e:
+                print(f"[profiling] Could not save profile {profile.id}: {str(e)}")
+
+def profile_path(profile_id: str, suffix: str) -> Optional[str]:
+    """
+    Path of a stored profile file (".json" or ".prof"), or None if there is no such profile
+    """
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + suffix)
+    return path if os.path.exists(path) else None
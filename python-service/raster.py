@@ -0,0 +1,103 @@
+"""
+Page rasterization for the CV/OCR detectors.
+
+Pages are rendered straight to a grayscale (or RGB) pixmap and the pixmap's
+sample buffer is wrapped as a NumPy array without copying, instead of
+PNG-encoding the render and decoding it again with OpenCV.
+
+Each detector can render at its own DPI. All detector output is still
+reported in the 2x (144 DPI) pixel space the rest of the service uses, so
+results are rescaled when a detector runs at a different DPI.
+
+Configuration (environment variables):
+    RENDER_DPI_LINES   DPI for horizontal line detection (default: 144)
+    RENDER_DPI_CELLS   DPI for table cell detection (default: 144)
+    RENDER_DPI_TEXT    DPI for OCR (default: 144)
+"""
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+import metrics
+from coordinates import DETECTION_DPI
+
+DETECTOR_DPI = {
+    "lines": int(os.environ.get("RENDER_DPI_LINES", DETECTION_DPI)),
+    "cells": int(os.environ.get("RENDER_DPI_CELLS", DETECTION_DPI)),
+    "text": int(os.environ.get("RENDER_DPI_TEXT", DETECTION_DPI)),
+}
+
+class Raster:
+    """
+    A rendered page with its pixels exposed as a zero-copy NumPy view.
+
+    The array borrows the pixmap's memory, so it is only valid while this
+    object (which holds the pixmap) is alive.
+    """
+
+    def __init__(self, pixmap: fitz.Pixmap, dpi: int):
+        self.pixmap = pixmap
+        self.dpi = dpi
+        if pixmap.n == 1:
+            shape: Tuple[int, ...] = (pixmap.height, pixmap.width)
+            strides: Tuple[int, ...] = (pixmap.stride, 1)
+        else:
+            shape = (pixmap.height, pixmap.width, pixmap.n)
+            strides = (pixmap.stride, pixmap.n, 1)
+        self.array = np.ndarray(shape=shape, dtype=np.uint8, buffer=pixmap.samples_mv, strides=strides)
+
+    @property
+    def to_detection(self) -> float:
+        """
+        Factor that converts this raster's pixels to detection pixels
+        """
+        return DETECTION_DPI / self.dpi
+
+def render(page: fitz.Page, dpi: int = DETECTION_DPI, colorspace: str = "gray") -> Raster:
+    """
+    Render a page at dpi into a grayscale ("gray") or "rgb" raster
+    """
+    zoom = dpi / 72
+    with metrics.stage("render"):
+        pixmap = page.get_pixmap(
+            matrix=fitz.Matrix(zoom, zoom),
+            colorspace=fitz.csGRAY if colorspace == "gray" else fitz.csRGB,
+            alpha=False
+        )
+    return Raster(pixmap, dpi)
+
+class PageRasters:
+    """
+    Lazily renders one page for several detectors, at most once per DPI and colorspace
+    """
+
+    def __init__(self, page: fitz.Page):
+        self.page = page
+        self._rasters: Dict[Tuple[int, str], Raster] = {}
+
+    def get(self, dpi: int = DETECTION_DPI, colorspace: str = "gray") -> Raster:
+        key = (dpi, colorspace)
+        if key not in self._rasters:
+            # Rendering applies /Rotate itself, so the page is used as is
+            self._rasters[key] = render(self.page, dpi, colorspace)
+        return self._rasters[key]
+
+    def for_detector(self, detector: str) -> Raster:
+        return self.get(DETECTOR_DPI[detector])
+
+def to_detection_space(
+    items: List[Dict[str, Any]],
+    raster: Raster,
+    keys: Iterable[str] = ("x", "y", "width", "height")
+) -> List[Dict[str, Any]]:
+    """
+    Rescale detector output from raster pixels to detection pixels in place
+    """
+    factor = raster.to_detection
+    if factor != 1:
+        for item in items:
+            for key in keys:
+                item[key] = int(round(item[key] * factor))
+    return items
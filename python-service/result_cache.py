@@ -0,0 +1,223 @@
+"""
+Persistent cache of per-page detection results.
+
+Users reopen the same documents and the frontend asks for detection again
+each time. Page results from /analyze, /detect-fillable-areas,
+/detect-table-cells and /detect-text are stored in a local SQLite database
+keyed by:
+
+- the PDF's SHA-256 (so the same bytes from any URL share results),
+- the page task parameters (result sets, Canny/Hough tuning, engine, OCR mode),
+- detection.result_settings(): the code version and service settings that
+  change output (default engine, render DPIs, OCR language, ...).
+
+Entries are per page, so a document that is only partly cached (e.g. a
+stream the client abandoned halfway) only computes its missing pages.
+Entries expire after a TTL, and total stored size is capped with least
+recently used entries evicted first.
+
+Responses carry the outcome in X-Result-Cache (hit, partial, miss or bypass)
+and X-Result-Cache-Pages (<cached>/<total>).
+
+Configuration (environment variables):
+    RESULT_CACHE_ENABLED     "0" to disable (default: enabled)
+    RESULT_CACHE_DIR         Cache directory (default: <tmp>/pdf-result-cache)
+    RESULT_CACHE_MAX_BYTES   Size cap for stored results (default: 256 MiB)
+    RESULT_CACHE_TTL         Seconds a result stays valid (default: 7 days)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+import metrics
+
+class ResultCache:
+    """
+    Per-page result store with TTL expiry and LRU eviction
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024, ttl: float = 7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.index_path = os.path.join(cache_dir, "results.sqlite3")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "pageHits": 0,
+            "pageMisses": 0,
+            "expired": 0,
+            "evictions": 0,
+        }
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " document TEXT NOT NULL, fingerprint TEXT NOT NULL, page INTEGER NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL, value BLOB NOT NULL,"
+                " PRIMARY KEY (document, fingerprint, page))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    @staticmethod
+    def fingerprint(task: str, params: Dict[str, Any], settings: Dict[str, Any]) -> str:
+        """
+        Stable key for a page task run with params under settings
+        """
+        canonical = json.dumps({"task": task, "params": params, "settings": settings}, sort_keys=True)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get_pages(self, document: str, fingerprint: str) -> Dict[int, Any]:
+        """
+        Unexpired cached results for a document, by page index
+        """
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT page, created, value FROM results WHERE document = ? AND fingerprint = ?",
+                (document, fingerprint)
+            ).fetchall()
+            pages = {page: json.loads(zlib.decompress(value)) for page, created, value in rows if now - created <= self.ttl}
+            if pages:
+                conn.execute(
+                    "UPDATE results SET last_used = ? WHERE document = ? AND fingerprint = ?",
+                    (now, document, fingerprint)
+                )
+        return pages
+
+    def put_pages(self, document: str, fingerprint: str, results: Dict[int, Any]) -> None:
+        """
+        Store page results (by page index), then evict down to max_bytes
+        """
+        if not results:
+            return
+        now = time.time()
+        rows = []
+        for page, result in results.items():
+            value = zlib.compress(json.dumps(result).encode(), 1)
+            rows.append((document, fingerprint, page, len(value), now, now, value))
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (document, fingerprint, page, size, created, last_used, value)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        self._evict(now)
+
+    def record_lookup(self, hits: int, misses: int) -> None:
+        self._count("pageHits", hits)
+        self._count("pageMisses", misses)
+        metrics.record_result_cache(hits, misses)
+
+    def _evict(self, now: float) -> None:
+        """
+        Drop expired entries, then least recently used ones until the cache fits under max_bytes
+        """
+        with self._connect() as conn:
+            expired = conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            evicted = 0
+            if total > self.max_bytes:
+                for rowid, size in conn.execute(
+                    "SELECT rowid, size FROM results ORDER BY last_used ASC"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM results WHERE rowid = ?", (rowid,))
+                    total -= size
+                    evicted += 1
+        if expired:
+            self._count("expired", expired)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Page hit/miss counters plus current cache occupancy
+        """
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, "entries": entries, "sizeBytes": size, "maxBytes": self.max_bytes, "ttlSeconds": self.ttl}
+
+class DocumentResults:
+    """
+    One page task's cached results for one document: what was found, and where new pages go
+    """
+
+    def __init__(self, cache: ResultCache, document: str, fingerprint: str):
+        self.cache = cache
+        self.document = document
+        self.fingerprint = fingerprint
+        self.cached = cache.get_pages(document, fingerprint)
+
+    def store(self, results: Dict[int, Any]) -> None:
+        self.cache.put_pages(self.document, self.fingerprint, results)
+
+    def record(self, total_pages: int) -> None:
+        """
+        Count this lookup's page hits and misses
+        """
+        self.cache.record_lookup(len(self.cached), total_pages - len(self.cached))
+
+def open_results(document: str, task: str, params: Dict[str, Any], settings: Dict[str, Any]) -> Optional[DocumentResults]:
+    """
+    Cached results of task over the document with this digest, or None when caching is disabled
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+    return DocumentResults(cache, document, cache.fingerprint(task, params, settings))
+
+def status_headers(cached: Optional[int], total: int) -> Dict[str, str]:
+    """
+    X-Result-Cache headers for a response; cached is None when the cache wasn't used
+    """
+    if cached is None:
+        return {"X-Result-Cache": "bypass"}
+    if total and cached == total:
+        status = "hit"
+    elif cached:
+        status = "partial"
+    else:
+        status = "miss"
+    return {"X-Result-Cache": status, "X-Result-Cache-Pages": f"{cached}/{total}"}
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Optional[ResultCache]:
+    """
+    Return the process-wide result cache, or None when caching is disabled
+    """
+    global _cache
+    if os.environ.get("RESULT_CACHE_ENABLED", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                cache_dir=os.environ.get(
+                    "RESULT_CACHE_DIR",
+                    os.path.join(tempfile.gettempdir(), "pdf-result-cache")
+                ),
+                max_bytes=int(os.environ.get("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+                ttl=float(os.environ.get("RESULT_CACHE_TTL", 7 * 24 * 3600)),
+            )
+        return _cache
@@ -0,0 +1,396 @@
+"""
+Interactive line detection tuning sessions.
+
+DetectFieldsRequest's line parameters exist so users can tune detection, but
+every request downloads, renders and OCRs the whole document again. A tuning
+session opens the document once and keeps, for each page it has run on:
+
+- the grayscale raster line detection runs on (raster engine pages),
+- the Canny edge maps computed so far, keyed by (canny_low, canny_high),
+- the line segments read from the page's drawings (vector engine pages),
+- the page's words and their label index.
+
+A page is prepared the first time a run includes it. After that, new Hough or
+width parameters only repeat HoughLinesP, overlap removal and label
+association, and new Canny thresholds add a single Canny pass.
+
+Sessions live in the server process and are dropped once they have sat idle
+for TUNING_IDLE_TIMEOUT seconds, or when deleted. Like main.py, this module
+only imports the detection engine once a session needs it.
+
+sweep_page() (the "sweep" page task) applies the same reuse to a whole grid
+of parameter sets in one request: one render per page, one Canny pass per
+distinct pair of thresholds, and the Hough runs spread over threads.
+
+Configuration (environment variables):
+    TUNING_IDLE_TIMEOUT   Seconds an unused session is kept (default: 600)
+    TUNING_MAX_SESSIONS   Sessions open at once (default: 8)
+    TUNING_EDGE_MAPS      Canny edge maps kept per page, least recently used
+                          dropped first (default: 4)
+    SWEEP_MAX_PARAM_SETS  Parameter sets one sweep may evaluate (default: 512)
+"""
+import collections
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import metrics
+from document_io import PdfSource
+
+if TYPE_CHECKING:
+    import fitz  # PyMuPDF
+    import numpy as np
+
+    import raster
+
+TUNING_IDLE_TIMEOUT = float(os.environ.get("TUNING_IDLE_TIMEOUT", 600))
+TUNING_MAX_SESSIONS = int(os.environ.get("TUNING_MAX_SESSIONS", 8))
+TUNING_EDGE_MAPS = int(os.environ.get("TUNING_EDGE_MAPS", 4))
+SWEEP_MAX_PARAM_SETS = int(os.environ.get("SWEEP_MAX_PARAM_SETS", 512))
+
+class SessionLimitError(RuntimeError):
+    pass
+
+class TuningPage:
+    """
+    The parts of one page's line detection that don't depend on the line parameters.
+
+    With labels=False the page's words are never read and fields come back unlabelled.
+    """
+
+    def __init__(self, page: "fitz.Page", page_num: int, engine: Optional[str] = None, labels: bool = True):
+        import detection
+        import raster
+        import vector_engine
+
+        self.page_num = page_num
+        self.engine = vector_engine.select_engine(page, engine or detection.DEFAULT_ENGINE)
+        self.labels = labels
+        self.lines_raster: Optional["raster.Raster"] = None
+        self.segments: List[Tuple[float, float, float, float]] = []
+        self.text_elements: List[Dict[str, Any]] = []
+        self._edges: "collections.OrderedDict[Tuple[int, int], np.ndarray]" = collections.OrderedDict()
+
+        if self.engine == "vector":
+            with metrics.stage("vector_extract"):
+                self.segments = vector_engine.line_segments(page)
+                if labels:
+                    self.text_elements = vector_engine.extract_text_with_positions(page)
+        else:
+            rasters = raster.PageRasters(page)
+            self.lines_raster = rasters.for_detector("lines")
+            if labels:
+                # Fields move as parameters change, so OCR the whole page once instead of label bands
+                text_raster = rasters.for_detector("text")
+                self.text_elements = raster.to_detection_space(
+                    detection.extract_text_with_positions(text_raster.array),
+                    text_raster
+                )
+        self.label_index = detection.LabelIndex(self.text_elements)
+
+    def canny_key(self, params: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        """
+        The (canny_low, canny_high) edge map params needs, or None on vector pages
+        """
+        if self.engine == "vector":
+            return None
+        return (params.get("canny_low", 115), params.get("canny_high", 175))
+
+    def edges(self, key: Tuple[int, int]) -> Tuple["np.ndarray", bool]:
+        """
+        The resident edge map for these Canny thresholds, and whether it was already there
+        """
+        import detection
+
+        edges = self._edges.get(key)
+        if edges is not None:
+            self._edges.move_to_end(key)
+            return edges, True
+        edges = detection.edge_map(self.lines_raster.array, *key)
+        self._edges[key] = edges
+        while len(self._edges) > TUNING_EDGE_MAPS:
+            self._edges.popitem(last=False)
+        return edges, False
+
+    def detect(self, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[bool]]:
+        """
+        Line fields for params, and whether the edge map was reused (None on vector pages)
+        """
+        key = self.canny_key(params)
+        if key is None:
+            return self.lines(params), None
+        with metrics.stage("canny_hough"):
+            edges, edges_cached = self.edges(key)
+        return self.lines(params, edges), edges_cached
+
+    def lines(self, params: Dict[str, Any], edges: Optional["np.ndarray"] = None) -> List[Dict[str, Any]]:
+        """
+        Line fields for params, searched for in edges (the canny_key(params) edge map) on raster pages.
+
+        Doesn't touch the resident edge maps, so several threads can call it at once.
+        """
+        import detection
+        import raster
+        import vector_engine
+
+        if self.engine == "vector":
+            with metrics.stage("vector_extract"):
+                lines = detection.remove_overlapping_lines(
+                    vector_engine.lines_from_segments(self.segments, **detection.line_kwargs(params))
+                )
+        else:
+            kwargs = detection.line_kwargs(params, 1 / self.lines_raster.to_detection)
+            kwargs.pop("canny_low", None)
+            kwargs.pop("canny_high", None)
+            with metrics.stage("canny_hough"):
+                lines = detection.lines_from_edges(edges, **kwargs)
+            lines = raster.to_detection_space(lines, self.lines_raster, keys=("x", "y", "width"))
+
+        if self.labels:
+            with metrics.stage("label_association"):
+                lines = detection.associate_labels_with_fields(self.text_elements, lines, self.label_index)
+        for line in lines:
+            line['page'] = self.page_num + 1
+        return lines
+
+def sweep_threads(page_count: int) -> int:
+    """
+    Threads each page of a sweep over page_count pages can use without
+    oversubscribing the page pool's worker processes
+    """
+    import page_pool
+
+    if page_count < max(2, page_pool.PAGE_PARALLEL_MIN_PAGES):
+        concurrent_pages = 1
+    else:
+        concurrent_pages = min(page_count, page_pool.PAGE_WORKERS)
+    return max(1, (os.cpu_count() or 1) // concurrent_pages)
+
+def sweep_page(page: "fitz.Page", page_num: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Line fields on one page for every entry of params["param_sets"].
+
+    The page is prepared once (labels only with params["labels"]), then every
+    distinct edge map is computed, then every parameter set's Hough run;
+    each phase is spread over params["threads"] threads, which run in
+    parallel because OpenCV releases the GIL.
+
+    Returns {"fields": one field list per parameter set, "edgeMaps": edge maps computed}.
+    """
+    import detection
+
+    tuning_page = TuningPage(page, page_num, params.get("engine"), labels=params.get("labels", False))
+    param_sets = params["param_sets"]
+    keys = [tuning_page.canny_key(param_set) for param_set in param_sets]
+    distinct_keys = [key for key in dict.fromkeys(keys) if key is not None]
+
+    def edge_map(key: Tuple[int, int]) -> "np.ndarray":
+        with metrics.stage("canny_hough"):
+            return detection.edge_map(tuning_page.lines_raster.array, *key)
+
+    def lines(index: int) -> List[Dict[str, Any]]:
+        return tuning_page.lines(param_sets[index], edge_maps.get(keys[index]))
+
+    threads = params.get("threads", 1)
+    if threads <= 1:
+        edge_maps = {key: edge_map(key) for key in distinct_keys}
+        fields = [lines(index) for index in range(len(param_sets))]
+    else:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="pdf-sweep") as executor:
+            # Each task gets its own context copy so stage timings still reach this page's collector
+            edge_maps = dict(zip(distinct_keys, [
+                future.result() for future in
+                [executor.submit(contextvars.copy_context().run, edge_map, key) for key in distinct_keys]
+            ]))
+            fields = [
+                future.result() for future in
+                [executor.submit(contextvars.copy_context().run, lines, index) for index in range(len(param_sets))]
+            ]
+
+    print(f"Page {page_num + 1}: Swept {len(param_sets)} parameter sets over {len(distinct_keys)} edge maps via {tuning_page.engine} engine")
+    return {"fields": fields, "edgeMaps": len(distinct_keys)}
+
+class TuningSession:
+    """
+    An open document whose pages keep their prepared detection inputs between runs
+    """
+
+    def __init__(self, source: PdfSource, engine: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.engine = engine
+        self.source = source
+        self.document = source.open()
+        self.total_pages = len(self.document)
+        self.pages: Dict[int, TuningPage] = {}
+        self.last_used = time.monotonic()
+        self.closed = False
+        # Runs on one session are serialized; they share its pages and edge maps
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, params: Dict[str, Any], page_numbers: Optional[List[int]] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Detect line fields with params on the given pages (0-based, default all).
+
+        Returns the fields and a per-page summary of what the run reused.
+        """
+        if page_numbers is None:
+            page_numbers = list(range(self.total_pages))
+        for page_num in page_numbers:
+            if not 0 <= page_num < self.total_pages:
+                raise ValueError(f"Page {page_num + 1} is out of range (1-{self.total_pages})")
+
+        fields: List[Dict[str, Any]] = []
+        summaries: List[Dict[str, Any]] = []
+        with self._lock:
+            if self.closed:
+                raise KeyError(self.id)
+            try:
+                self._run_pages(params, page_numbers, fields, summaries)
+            finally:
+                self.last_used = time.monotonic()
+                if self.closed:
+                    self._release()
+        return fields, summaries
+
+    def _run_pages(
+        self,
+        params: Dict[str, Any],
+        page_numbers: List[int],
+        fields: List[Dict[str, Any]],
+        summaries: List[Dict[str, Any]]
+    ) -> None:
+        for page_num in page_numbers:
+            with metrics.collect_stages() as stages, metrics.stage("page"):
+                prepared = page_num not in self.pages
+                if prepared:
+                    self.pages[page_num] = TuningPage(self.document[page_num], page_num, self.engine)
+                tuning_page = self.pages[page_num]
+                lines, edges_cached = tuning_page.detect(params)
+            metrics.record_page(page_num, stages)
+            fields.extend(lines)
+            summaries.append({
+                "page": page_num + 1,
+                "engine": tuning_page.engine,
+                "fieldsDetected": len(lines),
+                "prepared": prepared,
+                "edgeMapCached": edges_cached,
+                "timeMs": round(stages["page"] * 1000, 1),
+            })
+
+    def close(self) -> None:
+        """
+        Release the session without waiting; a run in progress finishes first and releases it on its way out
+        """
+        self.closed = True
+        if self._lock.acquire(blocking=False):
+            try:
+                self._release()
+            finally:
+                self._lock.release()
+
+    def _release(self) -> None:
+        if self.document is not None:
+            self.document.close()
+            self.document = None
+        self.pages.clear()
+        self.source.close()
+
+class TuningSessions:
+    """
+    Open tuning sessions by id, closed after idle_timeout seconds without a run
+    """
+
+    def __init__(self, idle_timeout: float = 600, max_sessions: int = 8):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: Dict[str, TuningSession] = {}
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._expired = 0
+
+    def _take_expired(self) -> List[TuningSession]:
+        # Caller holds _lock; sessions are closed after it is released
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [session for session in self._sessions.values() if session.last_used < cutoff and not session.busy]
+        for session in expired:
+            del self._sessions[session.id]
+        self._expired += len(expired)
+        return expired
+
+    def sweep(self) -> None:
+        """
+        Close sessions that have been idle for longer than idle_timeout
+        """
+        with self._lock:
+            expired = self._take_expired()
+        for session in expired:
+            session.close()
+
+    def open(self, source: PdfSource, engine: Optional[str] = None) -> TuningSession:
+        """
+        Start a session over source, which the session then owns.
+
+        Raises SessionLimitError when max_sessions are already open.
+        """
+        self.sweep()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                source.close()
+                raise SessionLimitError(f"{self.max_sessions} tuning sessions are already open")
+            session = TuningSession(source, engine)
+            self._sessions[session.id] = session
+            self._opened += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[TuningSession]:
+        self.sweep()
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        self.sweep()
+        with self._lock:
+            return {
+                "open": len(self._sessions),
+                "maxSessions": self.max_sessions,
+                "idleTimeoutSeconds": self.idle_timeout,
+                "opened": self._opened,
+                "expired": self._expired,
+                "preparedPages": sum(len(session.pages) for session in self._sessions.values()),
+            }
+
+    def close_all(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+_sessions: Optional[TuningSessions] = None
+_sessions_lock = threading.Lock()
+
+def get_sessions() -> TuningSessions:
+    """
+    Return the process-wide tuning session registry
+    """
+    global _sessions
+    with _sessions_lock:
+        if _sessions is None:
+            _sessions = TuningSessions(idle_timeout=TUNING_IDLE_TIMEOUT, max_sessions=TUNING_MAX_SESSIONS)
+        return _sessions
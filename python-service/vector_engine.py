@@ -0,0 +1,259 @@
+"""
+Vector detection engine for born-digital PDFs.
+
+Instead of rasterizing the page and running Canny/Hough, contours and
+Tesseract, fields are read from the page's drawing commands and labels from
+its embedded text layer. Results use the same 2x pixel coordinate space as the
+raster engine in detection.py so callers can't tell the engines apart.
+
+Scanned pages have no usable drawings or text layer, so select_engine() sends
+those back to the raster path.
+"""
+import re
+from typing import Any, Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+from coordinates import DETECTION_DPI, to_detection_matrix
+
+# Pages where a single image covers at least this fraction are treated as scans
+SCANNED_IMAGE_COVERAGE = 0.5
+
+# Same tolerances the raster engine applies to Hough segments, in pixels
+HORIZONTAL_TOLERANCE = 10
+LINE_FIELD_HEIGHT = 20
+
+# Same size filter detect_table_cells applies to contours, in pixels
+MIN_CELL_WIDTH = 50
+MIN_CELL_HEIGHT = 15
+MAX_CELL_WIDTH_RATIO = 0.9
+
+UNDERSCORE_RUN = re.compile(r"_{3,}")
+
+Segment = Tuple[float, float, float, float]
+
+def select_engine(page: fitz.Page, requested: str = "auto") -> str:
+    """
+    Pick "vector" or "raster" for a page.
+
+    "auto" uses the vector engine whenever the page has an embedded text layer
+    and is not dominated by a full-page image (i.e. it isn't a scan).
+    """
+    if requested in ("vector", "raster"):
+        return requested
+
+    if not page.get_text("words"):
+        return "raster"
+
+    page_area = abs(page.rect)
+    for image in page.get_image_info():
+        image_rect = fitz.Rect(image["bbox"]) * page.rotation_matrix
+        if page_area and abs(image_rect & page.rect) / page_area >= SCANNED_IMAGE_COVERAGE:
+            return "raster"
+
+    return "vector"
+
+def _drawing_segments(page: fitz.Page, matrix: fitz.Matrix) -> Tuple[List[Segment], List[fitz.Rect]]:
+    """
+    Collect straight segments and rectangles from the page's drawings, in detection pixels
+    """
+    segments: List[Segment] = []
+    rects: List[fitz.Rect] = []
+    for path in page.get_drawings():
+        for item in path["items"]:
+            kind = item[0]
+            if kind == "l":
+                p1 = item[1] * matrix
+                p2 = item[2] * matrix
+                segments.append((p1.x, p1.y, p2.x, p2.y))
+            elif kind == "re":
+                rects.append((item[1] * matrix).normalize())
+            elif kind == "qu":
+                quad = item[1]
+                if quad.is_rectangular:
+                    rects.append((quad.rect * matrix).normalize())
+    return segments, rects
+
+def _underscore_segments(page: fitz.Page, matrix: fitz.Matrix) -> List[Segment]:
+    """
+    Typed "_____" runs render as underlines, so treat them as horizontal segments
+    """
+    segments: List[Segment] = []
+    text = page.get_text("rawdict")
+    for block in text["blocks"]:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                chars = span["chars"]
+                text_run = "".join(c["c"] for c in chars)
+                for match in UNDERSCORE_RUN.finditer(text_run):
+                    first = chars[match.start()]
+                    last = chars[match.end() - 1]
+                    # Underscores are drawn just below the baseline
+                    y = first["origin"][1] + 1
+                    p1 = fitz.Point(first["bbox"][0], y) * matrix
+                    p2 = fitz.Point(last["bbox"][2], y) * matrix
+                    segments.append((p1.x, p1.y, p2.x, p2.y))
+    return segments
+
+def _merge_collinear(segments: List[Segment], max_line_gap: int) -> List[Segment]:
+    """
+    Join horizontal segments on the same row separated by at most max_line_gap,
+    as HoughLinesP does for adjacent box edges and split rules
+    """
+    horizontal = sorted(
+        ((min(x1, x2), (y1 + y2) / 2, max(x1, x2))
+         for x1, y1, x2, y2 in segments
+         if abs(y2 - y1) < HORIZONTAL_TOLERANCE),
+        key=lambda s: (round(s[1]), s[0])
+    )
+
+    merged: List[List[float]] = []
+    for x0, y, x1 in horizontal:
+        last = merged[-1] if merged else None
+        if last is not None and abs(last[1] - y) <= 2 and x0 <= last[2] + max_line_gap:
+            last[2] = max(last[2], x1)
+        else:
+            merged.append([x0, y, x1])
+    return [(x0, y, x1, y) for x0, y, x1 in merged]
+
+def detect_horizontal_lines(
+    page: fitz.Page,
+    min_line_length: int = 100,
+    max_line_gap: int = 7,
+    min_width: int = 60,
+    **_raster_params: Any
+) -> List[Dict[str, Any]]:
+    """
+    Find underline fields from drawn lines, rectangle edges and underscore runs.
+
+    Returns candidate lines in the raster engine's format; overlap removal is
+    left to the caller. Collinear pieces closer than max_line_gap are joined
+    as Hough would; the Canny/Hough threshold parameters are ignored.
+    """
+    return lines_from_segments(line_segments(page), min_line_length, max_line_gap, min_width)
+
+def line_segments(page: fitz.Page) -> List[Segment]:
+    """
+    Every horizontal line candidate on the page, in detection pixels, before
+    any tuning parameter is applied
+    """
+    matrix = to_detection_matrix(page)
+    segments, rects = _drawing_segments(page, matrix)
+
+    for rect in rects:
+        if rect.height < HORIZONTAL_TOLERANCE:
+            # Thin filled bars are how many generators draw rules
+            mid_y = (rect.y0 + rect.y1) / 2
+            segments.append((rect.x0, mid_y, rect.x1, mid_y))
+        else:
+            # Hough picks up the top and bottom edges of drawn boxes
+            segments.append((rect.x0, rect.y0, rect.x1, rect.y0))
+            segments.append((rect.x0, rect.y1, rect.x1, rect.y1))
+
+    segments.extend(_underscore_segments(page, matrix))
+    return segments
+
+def lines_from_segments(
+    segments: List[Segment],
+    min_line_length: int = 100,
+    max_line_gap: int = 7,
+    min_width: int = 60,
+    **_raster_params: Any
+) -> List[Dict[str, Any]]:
+    """
+    Join and filter line_segments() output into line fields; like
+    detect_horizontal_lines, Canny/Hough thresholds are ignored
+    """
+    horizontal_lines = []
+    for x1, y1, x2, y2 in _merge_collinear(segments, max_line_gap):
+        length = abs(x2 - x1)
+        # Same horizontal/width rules the raster engine applies to Hough output
+        if abs(y2 - y1) < HORIZONTAL_TOLERANCE and length > min_width and length >= min_line_length:
+            horizontal_lines.append({
+                "type": "line",
+                "x": int(round(min(x1, x2))),
+                "y": int(round(min(y1, y2))),
+                "width": int(round(length)),
+                "height": LINE_FIELD_HEIGHT
+            })
+
+    return horizontal_lines
+
+def _grid_cells(segments: List[Segment]) -> List[fitz.Rect]:
+    """
+    Recover table cells from a grid of separately drawn horizontal and vertical lines
+    """
+    horizontals = [(min(y1, y2), min(x1, x2), max(x1, x2))
+                   for x1, y1, x2, y2 in segments if abs(y2 - y1) < 1]
+    verticals = [(min(x1, x2), min(y1, y2), max(y1, y2))
+                 for x1, y1, x2, y2 in segments if abs(x2 - x1) < 1]
+    if len(horizontals) < 2 or len(verticals) < 2:
+        return []
+
+    tolerance = 2
+    ys = sorted({round(y) for y, _, _ in horizontals})
+
+    def covered_horizontally(y: float, x0: float, x1: float) -> bool:
+        return any(abs(hy - y) <= tolerance and hx0 <= x0 + tolerance and hx1 >= x1 - tolerance
+                   for hy, hx0, hx1 in horizontals)
+
+    cells = []
+    for top, bottom in zip(ys, ys[1:]):
+        # Vertical rules spanning this row band delimit its cells
+        xs = sorted({round(x) for x, vy0, vy1 in verticals
+                     if vy0 <= top + tolerance and vy1 >= bottom - tolerance})
+        for left, right in zip(xs, xs[1:]):
+            if covered_horizontally(top, left, right) and covered_horizontally(bottom, left, right):
+                cells.append(fitz.Rect(left, top, right, bottom))
+    return cells
+
+def detect_table_cells(page: fitz.Page) -> List[Dict[str, Any]]:
+    """
+    Find box fields and table cells from drawn rectangles and ruled grids
+    """
+    matrix = to_detection_matrix(page)
+    segments, rects = _drawing_segments(page, matrix)
+    # page.rect is the displayed (rotated) page, like the raster engine's render
+    page_width = page.rect.width * DETECTION_DPI / 72
+
+    cells = []
+    seen = set()
+    for rect in rects + _grid_cells(segments):
+        key = (int(round(rect.x0)), int(round(rect.y0)), int(round(rect.width)), int(round(rect.height)))
+        if key in seen:
+            continue
+        seen.add(key)
+        x, y, w, h = key
+        # Same size filter the raster engine applies to contour bounding boxes
+        if w > MIN_CELL_WIDTH and h > MIN_CELL_HEIGHT and w < page_width * MAX_CELL_WIDTH_RATIO:
+            cells.append({
+                "type": "cell",
+                "x": x,
+                "y": y,
+                "width": w,
+                "height": h
+            })
+
+    return cells
+
+def extract_text_with_positions(page: fitz.Page) -> List[Dict[str, Any]]:
+    """
+    Read positioned words from the embedded text layer in OCR output format
+    """
+    matrix = to_detection_matrix(page)
+    text_elements = []
+    for x0, y0, x1, y1, word, *_ in page.get_text("words"):
+        # Underscore runs are fields, not label text
+        text = UNDERSCORE_RUN.sub("", word).strip()
+        if not text:
+            continue
+        rect = (fitz.Rect(x0, y0, x1, y1) * matrix).normalize()
+        text_elements.append({
+            "text": text,
+            "x": int(round(rect.x0)),
+            "y": int(round(rect.y0)),
+            "width": int(round(rect.width)),
+            "height": int(round(rect.height)),
+            "confidence": 100.0
+        })
+    return text_elements
@@ -0,0 +1,218 @@
+"""
+Execution layer for blocking PDF work.
+
+FastAPI endpoints are async, but downloading, rendering, OpenCV and Tesseract
+are all blocking calls. Endpoints hand that work to a WorkerPool, which runs it
+on a thread or process pool and applies admission control so a burst of large
+uploads can't pile up unbounded work (or starve /health) on a single instance.
+
+Configuration (environment variables):
+    WORKER_POOL_KIND     "thread" (default) or "process"
+    WORKER_POOL_SIZE     Number of concurrent jobs (default: CPU count)
+    WORKER_QUEUE_SIZE    Jobs allowed to wait for a free worker (default: 16)
+    WORKER_RETRY_AFTER   Seconds advertised in Retry-After when full (default: 5)
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from fastapi import HTTPException
+
+import profiling
+
+# Returned by next() on the worker thread once a streamed generator is exhausted
+_EXHAUSTED = object()
+
+class WorkerPool:
+    """
+    Bounded pool that runs blocking callables off the event loop.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more may
+    wait for a slot. Anything beyond that is rejected immediately with a 503
+    and a Retry-After header instead of being queued.
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        max_workers: int = 4,
+        max_queue: int = 16,
+        retry_after: int = 5
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown worker pool kind: {kind}")
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+
+        self._executor: Optional[Executor] = None
+        self._stream_executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._queued = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so importing this module never spawns processes
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="pdf-worker"
+                )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._slots
+
+    async def _admit(self) -> asyncio.Semaphore:
+        """
+        Take a worker slot, waiting in the admission queue if needed.
+
+        Raises HTTPException(503) with Retry-After when the pool and its
+        admission queue are both full.
+        """
+        if self._in_flight + self._queued >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy processing other documents, please retry shortly",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        slots = self._get_slots()
+        self._queued += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._queued -= 1
+        return slots
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run fn(*args, **kwargs) on the pool and return its result.
+
+        Raises HTTPException(503) with Retry-After when the pool and its
+        admission queue are both full.
+        """
+        call = functools.partial(fn, *args, **kwargs)
+        if self.kind == "thread":
+            # run_in_executor doesn't carry context variables (e.g. the metrics endpoint label)
+            call = functools.partial(contextvars.copy_context().run, profiling.run, call)
+        return await self._submit(self._get_executor(), call)
+
+    async def run_local(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Like run(), but always on a thread of this process, for jobs that use
+        state the server process holds (e.g. tuning sessions). Admission is
+        shared with run().
+        """
+        call = functools.partial(contextvars.copy_context().run, profiling.run, functools.partial(fn, *args, **kwargs))
+        return await self._submit(self._get_thread_executor(), call)
+
+    async def _submit(self, executor: Executor, call: Callable[[], Any]) -> Any:
+        slots = await self._admit()
+        self._in_flight += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(executor, call)
+            self._completed += 1
+            return result
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            slots.release()
+
+    def _get_thread_executor(self) -> Executor:
+        # Generators can't be resumed across processes, so process pools stream from threads
+        if self.kind == "thread":
+            return self._get_executor()
+        if self._stream_executor is None:
+            self._stream_executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="pdf-stream"
+            )
+        return self._stream_executor
+
+    async def stream(self, fn: Callable[..., Iterator[Any]], *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        """
+        Run the blocking generator fn(*args, **kwargs) on the pool, yielding its items as they are produced.
+
+        Admission works as in run() and happens on the first iteration. The
+        worker slot is held until the generator is exhausted or this iterator
+        is closed; closing it (e.g. on client disconnect) also closes the
+        generator on a worker thread so its cleanup runs.
+        """
+        slots = await self._admit()
+        self._in_flight += 1
+        executor = self._get_thread_executor()
+        iterator = fn(*args, **kwargs)
+        # The generator runs in the caller's context, one step at a time
+        context = contextvars.copy_context()
+        pending: Optional[Future] = None
+        try:
+            while True:
+                pending = executor.submit(context.run, profiling.run, next, iterator, _EXHAUSTED)
+                item = await asyncio.wrap_future(pending)
+                pending = None
+                if item is _EXHAUSTED:
+                    break
+                yield item
+            self._completed += 1
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            # No awaits here: on disconnect this runs inside an already-cancelled scope
+            self._in_flight -= 1
+            slots.release()
+            if pending is None:
+                executor.submit(context.run, iterator.close)
+            else:
+                # A page can't be interrupted mid-way; close the generator once it returns
+                pending.add_done_callback(lambda _: context.run(iterator.close))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Current gauges and counters for health/metrics reporting
+        """
+        return {
+            "kind": self.kind,
+            "maxWorkers": self.max_workers,
+            "maxQueue": self.max_queue,
+            "inFlight": self._in_flight,
+            "queueDepth": self._queued,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._stream_executor is not None:
+            self._stream_executor.shutdown(wait=False, cancel_futures=True)
+            self._stream_executor = None
+
+def pool_from_env() -> WorkerPool:
+    """
+    Build the service worker pool from environment variables
+    """
+    return WorkerPool(
+        kind=os.environ.get("WORKER_POOL_KIND", "thread").lower(),
+        max_workers=int(os.environ.get("WORKER_POOL_SIZE", os.cpu_count() or 2)),
+        max_queue=int(os.environ.get("WORKER_QUEUE_SIZE", 16)),
+        retry_after=int(os.environ.get("WORKER_RETRY_AFTER", 5)),
+    )